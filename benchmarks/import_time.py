@@ -0,0 +1,86 @@
+"""
+Measure cold import and first client construction times in fresh interpreters, e.g.
+python -m benchmarks.import_time --runs 10 --output import_results.json
+The supabase row is the import the services used to pay before their sub-clients were loaded lazily.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# name -> code run in a fresh interpreter, timed from its first statement to its end
+TARGETS = {
+    "supabase (full client package)": "import supabase",
+    "supabase_service.database": "import supabase_service.database",
+    "supabase_service.storage": "import supabase_service.storage",
+    "supabase_service.auth": "import supabase_service.auth",
+    "SupabaseDatabase()": "from supabase_service.database import SupabaseDatabase\nSupabaseDatabase()",
+    "SupabaseDatabase() + postgrest": "from supabase_service.database import SupabaseDatabase\n"
+                                      "SupabaseDatabase()._get_client.postgrest",
+    "SupabaseStorage() + storage3": "from supabase_service.storage import SupabaseStorage\n"
+                                    "SupabaseStorage()._get_client.storage",
+    "SupabaseAuth() + gotrue": "from supabase_service.auth import SupabaseAuth\nSupabaseAuth()._get_client.auth",
+}
+
+# modules reported as loaded after each target, to show what a service drags in
+HEAVY_MODULES = ("httpx", "postgrest", "storage3", "gotrue", "realtime", "supabase", "pydantic")
+
+_TIMER = """
+import time
+_started = time.perf_counter()
+exec(compile({code!r}, "<target>", "exec"))
+_elapsed = time.perf_counter() - _started
+import json, sys
+print(json.dumps({{"seconds": _elapsed, "modules": [name for name in {modules!r} if name in sys.modules]}}))
+"""
+
+
+def measure(code: str, runs: int) -> dict:
+    """
+    :param code: str, python source
+    :param runs: int, fresh interpreters started
+    :return: dict, median/min/max milliseconds and the heavy modules loaded
+    """
+    environment = dict(os.environ, SUPABASE_URL=os.environ.get("SUPABASE_URL", "http://127.0.0.1:54321"),
+                       SUPABASE_KEY=os.environ.get("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.x"))
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), environment.get("PYTHONPATH")]))
+    samples = []
+    modules = []
+
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _TIMER.format(code=code, modules=HEAVY_MODULES)],
+                                capture_output=True, text=True, check=True, env=environment).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"] * 1000)
+        modules = result["modules"]
+
+    return {"median_ms": round(statistics.median(samples), 1), "min_ms": round(min(samples), 1),
+            "max_ms": round(max(samples), 1), "modules": modules}
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold import time of supabase_service")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'target':<34} {'median':>9} {'min':>9}  loaded")
+
+    for name, code in TARGETS.items():
+        results[name] = measure(code, args.runs)
+        print(f"{name:<34} {results[name]['median_ms']:>7.1f}ms {results[name]['min_ms']:>7.1f}ms  "
+              f"{', '.join(results[name]['modules']) or '-'}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"runs": args.runs, "python": sys.version.split()[0], "targets": results}, file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+
+from aiohttp import web
+
+# secret the stand-in auth server signs its HS256 access tokens with
+JWT_SECRET = "benchmark-jwt-secret"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def sign_token(claims: dict, secret: str = JWT_SECRET) -> str:
+    """
+    :param claims: dict
+    :param secret: str
+    :return: str, HS256 JWT
+    """
+    signing_input = f"{_b64encode(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())}." \
+                    f"{_b64encode(json.dumps(claims).encode())}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+
+    return f"{signing_input}.{_b64encode(signature)}"
+
+
+class MockSupabase:
+    """
+    One local HTTP server standing in for the PostgREST (/rest/v1), Storage (/storage/v1) and GoTrue (/auth/v1)
+    endpoints the services call, with a configurable delay on every response and configurable payload sizes.
+    /realtime/v1/websocket speaks enough of the Phoenix protocol to join postgres_changes channels, whose events
+    are pushed with realtime_change().
+    It runs on its own event loop thread, so the synchronous services can be driven from the caller's thread.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rows: int = 1, row_bytes: int = 100,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        :param latency: float seconds added to every response
+        :param jitter: float seconds, a uniform random delay up to jitter is added to latency
+        :param rows: int, rows returned by a select without an id filter
+        :param row_bytes: int, approximate size of a returned row
+        :param host: str
+        :param port: int, 0 picks a free port
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rows = rows
+        self.row_bytes = row_bytes
+        self.host = host
+        self.port = port
+        self.url = None
+        self.requests = 0
+        self.objects = {}
+        self.public_buckets = set()
+        self.__channels = {}
+        self.__loop = None
+        self.__runner = None
+        self.__thread = None
+        self.__started = threading.Event()
+
+    def start(self) -> "MockSupabase":
+        self.__thread = threading.Thread(target=self.__run, name="mock-supabase", daemon=True)
+        self.__thread.start()
+        self.__started.wait()
+
+        return self
+
+    def stop(self):
+        if self.__loop is not None:
+            asyncio.run_coroutine_threadsafe(self.__runner.cleanup(), self.__loop).result()
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join()
+
+    def realtime_change(self, table: str, type: str, record: dict = None, old_record: dict = None,
+                        schema: str = "public"):
+        """
+        Push a postgres_changes event to every channel joined on table.
+        :param table: str
+        :param type: str, "INSERT", "UPDATE" or "DELETE"
+        :param record: dict, the new row
+        :param old_record: dict, the old row, at least its primary key for UPDATE and DELETE
+        :param schema: str
+        """
+        commit_timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()) + f".{int(time.time() % 1 * 1000):03d}Z"
+        data = {"schema": schema, "table": table, "type": type, "commit_timestamp": commit_timestamp,
+                "record": record or {}, "old_record": old_record or {}, "columns": [], "errors": None}
+
+        async def push():
+            for (socket, topic), bindings in list(self.__channels.items()):
+                ids = [binding["id"] for binding in bindings
+                       if binding.get("table") in (table, "*") and binding.get("schema") == schema]
+
+                if ids and not socket.closed:
+                    await socket.send_json({"topic": topic, "event": "postgres_changes", "ref": None,
+                                            "payload": {"ids": ids, "data": data}})
+
+        asyncio.run_coroutine_threadsafe(push(), self.__loop).result()
+
+    def drop_realtime(self):
+        """
+        Close every realtime connection, as a server restart or network cut would.
+        """
+        async def close():
+            for socket in {socket for socket, _ in self.__channels}:
+                await socket.close()
+
+            self.__channels.clear()
+
+        asyncio.run_coroutine_threadsafe(close(), self.__loop).result()
+
+    def __enter__(self) -> "MockSupabase":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __run(self):
+        self.__loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_until_complete(self.__serve())
+        self.__started.set()
+        self.__loop.run_forever()
+
+    async def __serve(self):
+        app = web.Application(middlewares=[self.__delay], client_max_size=1024 ** 3)
+        app.add_routes([
+            web.get("/rest/v1/{table}", self.__select),
+            web.post("/rest/v1/{table}", self.__insert),
+            web.patch("/rest/v1/{table}", self.__update),
+            web.delete("/rest/v1/{table}", self.__update),
+            web.get("/storage/v1/bucket/{bucket}", self.__bucket),
+            web.post("/storage/v1/object/list/{bucket}", self.__list),
+            web.post("/storage/v1/object/sign/{bucket}", self.__sign),
+            web.post("/storage/v1/object/{bucket}/{path:.+}", self.__upload),
+            web.put("/storage/v1/object/{bucket}/{path:.+}", self.__upload),
+            web.get("/storage/v1/object/{bucket}/{path:.+}", self.__download),
+            web.post("/auth/v1/token", self.__token),
+            web.get("/auth/v1/user", self.__user),
+            web.post("/auth/v1/logout", self.__logout),
+            web.get("/realtime/v1/websocket", self.__realtime),
+        ])
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, self.host, self.port)
+        await site.start()
+        self.port = self.__runner.addresses[0][1]
+        self.url = f"http://{self.host}:{self.port}"
+
+    @web.middleware
+    async def __delay(self, request, handler):
+        self.requests += 1
+        delay = self.latency + random.uniform(0, self.jitter) if self.jitter else self.latency
+
+        if delay:
+            await asyncio.sleep(delay)
+
+        return await handler(request)
+
+    def __row(self, id) -> dict:
+        return {"id": id, "name": f"row-{id}", "payload": "x" * max(self.row_bytes - 40, 0)}
+
+    async def __select(self, request):
+        id_filter = request.query.get("id", "")
+
+        if id_filter.startswith("eq."):
+            rows = [self.__row(id_filter[3:])]
+        elif id_filter.startswith("in.("):
+            rows = [self.__row(id) for id in id_filter[4:-1].split(",") if id]
+        else:
+            # keyset pages: id=gt.<last id> with limit
+            start = int(id_filter[3:]) + 1 if id_filter.startswith("gt.") else 1
+            end = min(self.rows, start + int(request.query.get("limit", self.rows)) - 1)
+            rows = [self.__row(id) for id in range(start, end + 1)]
+
+        headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{len(rows)}"}
+
+        if request.headers.get("Accept") == "text/csv":
+            lines = ["id,name,payload"] + [f"{row['id']},{row['name']},{row['payload']}" for row in rows]
+
+            return web.Response(text="\n".join(lines), content_type="text/csv", headers=headers)
+
+        return web.json_response(rows, headers=headers)
+
+    async def __insert(self, request):
+        body = await request.json()
+
+        if "return=minimal" in request.headers.get("Prefer", ""):
+            return web.Response(status=201)
+
+        return web.json_response(body if isinstance(body, list) else [body], status=201)
+
+    async def __update(self, request):
+        body = await request.read()
+
+        return web.json_response(json.loads(body) if body else [], status=200)
+
+    async def __bucket(self, request):
+        bucket = request.match_info["bucket"]
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+        return web.json_response({"id": bucket, "name": bucket, "owner": "", "public": bucket in self.public_buckets,
+                                  "created_at": now, "updated_at": now, "file_size_limit": None,
+                                  "allowed_mime_types": None})
+
+    async def __list(self, request):
+        bucket = request.match_info["bucket"]
+        body = await request.json()
+        prefix = body.get("prefix", "").strip("/")
+        children = {}
+
+        for bucket_id, path in self.objects:
+            if bucket_id == bucket and (not prefix or path.startswith(prefix + "/")):
+                name, _, rest = path[len(prefix) + 1 if prefix else 0:].partition("/")
+                children[name] = None if rest else len(self.objects[(bucket_id, path)])
+
+        entries = [{"name": name, "id": None, "metadata": None} if size is None else
+                   {"name": name, "id": str(uuid.uuid5(uuid.NAMESPACE_URL, name)),
+                    "updated_at": "2024-01-01T00:00:00Z", "metadata": {"size": size}}
+                   for name, size in sorted(children.items())]
+        offset, limit = body.get("offset", 0), body.get("limit", 100)
+
+        return web.json_response(entries[offset:offset + limit])
+
+    async def __sign(self, request):
+        bucket = request.match_info["bucket"]
+        body = await request.json()
+
+        return web.json_response([{"path": path, "error": None,
+                                   "signedURL": f"/object/sign/{bucket}/{path}?token={uuid.uuid4().hex}"}
+                                  for path in body["paths"]])
+
+    async def __upload(self, request):
+        key = (request.match_info["bucket"], request.match_info["path"])
+
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            part = await reader.next()
+            self.objects[key] = await part.read() if part is not None else b""
+        else:
+            self.objects[key] = await request.read()
+
+        return web.json_response({"Key": f"{key[0]}/{key[1]}", "Id": str(uuid.uuid4())})
+
+    async def __download(self, request):
+        body = self.objects.get((request.match_info["bucket"], request.match_info["path"]))
+
+        if body is None:
+            return web.json_response({"statusCode": "404", "error": "not_found", "message": "Object not found"},
+                                     status=400)
+
+        return web.Response(body=body, content_type="application/octet-stream")
+
+    def __session(self, user_id: str) -> dict:
+        now = int(time.time())
+        claims = {"sub": user_id, "aud": "authenticated", "role": "authenticated", "iss": f"{self.url}/auth/v1",
+                  "iat": now, "exp": now + 3600, "email": f"{user_id}@example.com"}
+
+        return {"access_token": sign_token(claims), "refresh_token": uuid.uuid4().hex, "expires_in": 3600,
+                "expires_at": now + 3600, "token_type": "bearer", "user": self.__user_json(user_id)}
+
+    @staticmethod
+    def __user_json(user_id: str) -> dict:
+        return {"id": user_id, "aud": "authenticated", "role": "authenticated", "email": f"{user_id}@example.com",
+                "app_metadata": {"provider": "email"}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z"}
+
+    async def __token(self, request):
+        return web.json_response(self.__session(str(uuid.uuid5(uuid.NAMESPACE_URL, "benchmark-user"))))
+
+    async def __realtime(self, request):
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+
+        async for message in socket:
+            if message.type != web.WSMsgType.TEXT:
+                continue
+
+            message = json.loads(message.data)
+            topic, event, payload = message["topic"], message["event"], message.get("payload") or {}
+            response = {}
+
+            if event == "phx_join":
+                bindings = [{"id": index + 1, **binding} for index, binding in
+                            enumerate(payload.get("config", {}).get("postgres_changes", []))]
+                self.__channels[(socket, topic)] = bindings
+                response = {"postgres_changes": bindings}
+            elif event == "phx_leave":
+                self.__channels.pop((socket, topic), None)
+
+            await socket.send_json({"topic": topic, "event": "phx_reply", "ref": message.get("ref"),
+                                    "payload": {"status": "ok", "response": response}})
+
+        for key in [key for key in self.__channels if key[0] is socket]:
+            del self.__channels[key]
+
+        return socket
+
+    async def __logout(self, request):
+        return web.Response(status=204)
+
+    async def __user(self, request):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(token.split(".")[1] + "=="))
+        except (ValueError, IndexError):
+            return web.json_response({"code": 401, "msg": "invalid JWT"}, status=401)
+
+        return web.json_response(self.__user_json(claims["sub"]))
@@ -0,0 +1,234 @@
+"""
+Benchmark the services against local stand-in servers, e.g.
+python -m benchmarks.run --latency 0.002 --iterations 500 --output bench_results.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_servers import JWT_SECRET, MockSupabase, sign_token
+from supabase_service.metrics import Histogram
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on macOS, kilobytes elsewhere
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_scenario(name: str, operation, iterations: int, concurrency: int = 1, warmup: int = 5) -> dict:
+    """
+    :param name: str
+    :param operation: Callable[[int], GenericResponse], called with the iteration number
+    :param iterations: int
+    :param concurrency: int, threads calling operation at once
+    :param warmup: int, calls made before measuring
+    :return: dict, ops/s, latency percentiles in milliseconds, errors and peak RSS
+    """
+    for index in range(warmup):
+        operation(-index - 1)
+
+    # 5% wide buckets from 1 microsecond to about 2 minutes
+    latency = Histogram(buckets=tuple(1e-6 * 1.05 ** exponent for exponent in range(390)))
+    errors = []
+    lock = threading.Lock()
+
+    def timed(index: int):
+        started = time.perf_counter()
+        response = operation(index)
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            latency.observe(elapsed)
+
+        status = getattr(response, "status", 200)
+
+        if isinstance(status, int) and status >= 400 or response is False:
+            errors.append(getattr(response, "message", str(response)))
+
+    started = time.perf_counter()
+
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(iterations)))
+    else:
+        for index in range(iterations):
+            timed(index)
+
+    seconds = time.perf_counter() - started
+    result = {"iterations": iterations, "concurrency": concurrency, "seconds": round(seconds, 4),
+              "ops_per_second": round(iterations / seconds, 2) if seconds else 0.0,
+              "latency_ms": {"p50": round(latency.percentile(0.5) * 1000, 3),
+                             "p95": round(latency.percentile(0.95) * 1000, 3),
+                             "p99": round(latency.percentile(0.99) * 1000, 3),
+                             "max": round(latency.max * 1000, 3)},
+              "errors": len(errors), "peak_rss_mb": peak_rss_mb()}
+
+    if errors:
+        result["first_error"] = errors[0]
+
+    print(f"{name:<32} {result['ops_per_second']:>10.1f} ops/s  p50 {result['latency_ms']['p50']:>8.3f} ms  "
+          f"p99 {result['latency_ms']['p99']:>8.3f} ms  errors {len(errors)}", flush=True)
+
+    return result
+
+
+def scenarios(args, server: MockSupabase, workdir: str) -> dict:
+    # imported once the environment points at the stand-in servers
+    from supabase_service.auth import SupabaseAuth
+    from supabase_service.database import SupabaseDatabase
+    from supabase_service.decoding import RowDecoder, row_type
+    from supabase_service.query import Query
+    from supabase_service.storage import SupabaseStorage
+
+    database = SupabaseDatabase()
+    storage = SupabaseStorage()
+    auth = SupabaseAuth()
+    row_decoder = RowDecoder(row_type("BenchRow", ["id", "name", "payload"]))
+    results = {}
+
+    def run(name: str, operation, iterations: int = args.iterations, concurrency: int = 1):
+        results[name] = run_scenario(name, operation, iterations, concurrency=concurrency, warmup=args.warmup)
+
+    run("select_by_id", lambda i: database.select_by_id(table_name="bench", id=abs(i) + 1))
+    run(f"select_by_id_x{args.concurrency}", lambda i: database.select_by_id(table_name="bench", id=abs(i) + 1),
+        concurrency=args.concurrency)
+    run("select_all", lambda i: database.select_all(table_name="bench", count=None))
+    run("select_all_raw", lambda i: database.select_all(table_name="bench", count=None, raw=True))
+    run("select_all_decoder", lambda i: database.select_all(table_name="bench", count=None, decoder=row_decoder))
+    run("select_query", lambda i: database.select_all(table_name="bench", count=None,
+                                                      where=Query().gte("id", abs(i) % 10).order("id").limit(10)))
+
+    with database.replica("bench") as replica:
+        run("replica_get", lambda i: replica.get(abs(i) % max(args.rows, 1) + 1))
+
+    rows = [{"id": index, "name": f"row-{index}", "payload": "x" * args.row_bytes} for index in range(args.bulk_rows)]
+    run(f"insert_many_{args.bulk_rows}",
+        lambda i: database.insert_many(table_name="bench", values=rows, batch_size=args.batch_size),
+        iterations=max(args.iterations // 10, 1))
+
+    for size_kb in args.file_sizes:
+        local_file_path = os.path.join(workdir, f"upload-{size_kb}kb.bin")
+
+        with open(local_file_path, "wb") as file:
+            file.write(os.urandom(size_kb * 1024))
+
+        iterations = max(min(args.iterations, args.iterations * 64 // max(size_kb, 1)), 5)
+        run(f"upload_file_{size_kb}kb",
+            lambda i: storage.upload_file(bucket_id="bench", bucket_path="files", local_file_path=local_file_path,
+                                          file_name=f"{size_kb}kb-{i}.bin"),
+            iterations=iterations)
+        run(f"download_file_{size_kb}kb",
+            lambda i: storage.download_file(bucket_id="bench", bucket_path="files", file_name=f"{size_kb}kb-0.bin"),
+            iterations=iterations)
+
+    paths = [f"files/thumb-{index}.jpg" for index in range(100)]
+    run("signed_urls_100", lambda i: storage.signed_urls(bucket_id="bench", paths=[f"{i}/{path}" for path in paths]))
+    run("signed_urls_100_cached", lambda i: storage.signed_urls(bucket_id="bench", paths=paths))
+
+    run("walk_files", lambda i: sum(1 for _ in storage.walk_files(bucket_id="bench", prefix="files").data),
+        iterations=max(args.iterations // 10, 1))
+
+    session = auth.sign_in(email="bench@example.com", password="password", options={})
+    access_token = session.data["access_token"] if session.status == 200 else \
+        sign_token({"sub": "bench", "aud": "authenticated", "exp": int(time.time()) + 3600,
+                    "iss": f"{server.url}/auth/v1"})
+
+    run("sign_in", lambda i: auth.sign_in(email="bench@example.com", password="password", options={}),
+        iterations=max(args.iterations // 10, 1))
+    run("is_logged_in_local", lambda i: auth.is_logged_in(access_token))
+    run("is_logged_in_network", lambda i: auth.is_logged_in(access_token, check_revocation=True))
+
+    # drops the session and its auto refresh timer, which would otherwise keep the interpreter alive
+    auth.sign_out(options={"scope": "local"})
+
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> list:
+    """
+    :return: list[str], scenarios whose ops/s dropped by more than threshold against the baseline file
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)["scenarios"]
+
+    regressions = []
+    print(f"\n{'scenario':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+
+    for name, result in results.items():
+        if name not in baseline or not baseline[name]["ops_per_second"]:
+            continue
+
+        change = result["ops_per_second"] / baseline[name]["ops_per_second"] - 1
+        print(f"{name:<32} {baseline[name]['ops_per_second']:>10.1f} {result['ops_per_second']:>10.1f} "
+              f"{change:>+8.1%}")
+
+        if change < -threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark supabase_service against local stand-in servers")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds up to this value")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16, help="threads of the concurrent select scenario")
+    parser.add_argument("--rows", type=int, default=100, help="rows returned by select_all")
+    parser.add_argument("--row-bytes", type=int, default=200, help="approximate size of a row")
+    parser.add_argument("--bulk-rows", type=int, default=5000, help="rows written per insert_many")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--file-sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[1, 1024, 10 * 1024], help="comma separated file sizes in KB")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier output file to compare ops/s with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="exit with 1 when a scenario is this much slower than in --compare")
+    args = parser.parse_args(argv)
+
+    with MockSupabase(latency=args.latency, jitter=args.jitter, rows=args.rows, row_bytes=args.row_bytes) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        os.environ["SUPABASE_URL"] = server.url
+        os.environ["SUPABASE_KEY"] = sign_token({"role": "anon", "iss": "supabase"})
+        os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+        os.environ.pop("SUPABASE_JWT_ISSUER", None)
+
+        results = scenarios(args, server, workdir)
+
+    output = {"meta": {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+              "scenarios": results}
+
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+
+    print(f"\nresults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
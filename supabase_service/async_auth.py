@@ -0,0 +1,195 @@
+from typing import TYPE_CHECKING, Literal
+
+from supabase_service.config import AsyncSupabaseClient, PoolOptions, SupabaseClientRegistry
+from supabase_service.metrics import instrument
+from supabase_service.sessions import AsyncSessionManager
+from supabase_service.tokens import TokenError, TokenUnverifiable, TokenVerifier, unverified_claims
+from supabase_service.types import GenericResponse
+
+if TYPE_CHECKING:
+    from gotrue import AuthResponse, SignUpWithEmailAndPasswordCredentialsOptions, \
+        SignInWithPasswordCredentialsOptions, SignOutOptions, ResendEmailCredentialsOptions
+
+
+class AsyncSupabaseAuth(AsyncSupabaseClient):
+
+    _namespace = "auth"
+
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None,
+                 concurrency: int = 100, verifier: TokenVerifier = None):
+        """
+        :param pool_options: PoolOptions
+        :param registry: SupabaseClientRegistry
+        :param concurrency: int, max calls in flight through gather()
+        :param verifier: TokenVerifier checking access tokens locally, TokenVerifier.from_env() when None
+        """
+        super().__init__(pool_options=pool_options, registry=registry, concurrency=concurrency)
+        self.verifier = verifier or TokenVerifier.from_env()
+
+    @property
+    def __client_auth(self):
+        # built on first use
+        return self._get_client.auth
+
+    @instrument()
+    async def sign_in(self, email: str, password: str,
+                      options: "SignInWithPasswordCredentialsOptions") -> GenericResponse:
+        """
+        :param email: str
+        :param password: str
+        :param options: SignInWithPasswordCredentialsOptions
+        :return:
+        """
+        if not email or not email.strip():
+            return GenericResponse(status=400, message="Email is required")
+
+        if not password or not password.strip():
+            return GenericResponse(status=400, message="Password is required")
+
+        try:
+            auth_response: AuthResponse = await self.__client_auth.sign_in_with_password(
+                credentials={"email": email, "password": password, "options": options})
+            return GenericResponse(status=200, message="Sign in successful", data={
+                "user_id": auth_response.user.id,
+                "access_token": auth_response.session.access_token,
+                "refresh_token": auth_response.session.refresh_token,
+                "expires_in": auth_response.session.expires_in,
+                "token_type": auth_response.session.token_type,
+                "status": 200
+            })
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+    @instrument()
+    async def sign_up(self, email: str, password: str,
+                      options: "SignUpWithEmailAndPasswordCredentialsOptions") -> GenericResponse:
+        """
+        :param email: str
+        :param password: str
+        :param options: SignUpWithEmailAndPasswordCredentialsOptions
+        :return: AuthResponse | str
+        """
+        if not email or not email.strip():
+            return GenericResponse(status=400, message="Email is required")
+
+        if not password or not password.strip():
+            return GenericResponse(status=400, message="Password is required")
+
+        try:
+            sign_up_response = await self.__client_auth.sign_up(
+                credentials={"email": email, "password": password, "options": options})
+
+            return GenericResponse(status=201, message="Sign up successful", data=sign_up_response)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+    @instrument()
+    async def sign_out(self, options: "SignOutOptions", access_token: str = None):
+        """
+        :param options: SignOutOptions
+        :param access_token: str, session to revoke, the auth client keeps no session of its own to sign out
+        :return: None
+        """
+        if access_token:
+            await self.__client_auth.admin.sign_out(access_token, (options or {}).get("scope", "global"))
+        else:
+            await self.__client_auth.sign_out(options=options)
+
+    @instrument()
+    async def get_user(self, access_token: str) -> GenericResponse:
+        """
+        :param access_token: str
+        :return: UserResponse | str
+        """
+
+        if not access_token or not access_token.strip():
+            return GenericResponse(status=400, message="Access token is required")
+
+        try:
+            user = await self.__client_auth.get_user(jwt=access_token)
+
+            return GenericResponse(status=200, message="User retrieved successfully", data=user)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument()
+    async def resend_mail(self, email: str, type: Literal["signup", "email_change"],
+                          options: "ResendEmailCredentialsOptions") -> GenericResponse:
+        """
+        :param email: str
+        :param type: str
+        :param options: ResendEmailCredentialsOptions
+        :return:
+        """
+        if not email or not email.strip():
+            return GenericResponse(status=400, message="Email is required")
+
+        resend_mail = await self.__client_auth.resend(email=email, type=type, options=options)
+
+        return GenericResponse(status=200, message="Email sent successfully", data=resend_mail)
+
+    @instrument()
+    async def refresh_token(self, refresh_token: str) -> GenericResponse:
+        """
+        :param refresh_token: str
+        :return: GenericResponse
+        """
+        if not refresh_token or not refresh_token.strip():
+            return GenericResponse(status=400, message="Refresh token is required")
+        try:
+            refresh_session = await self.__client_auth.refresh_session(refresh_token=refresh_token)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+        return GenericResponse(status=200, message="Session refreshed successfully", data=refresh_session)
+
+    def session_manager(self, margin: float = 60.0, retry_interval: float = 5.0) -> AsyncSessionManager:
+        """
+        :param margin: float seconds before expiry a tracked session is refreshed
+        :param retry_interval: float seconds between attempts after a failed refresh
+        :return: AsyncSessionManager, refreshing the sessions it tracks in the background through this service
+        """
+        return AsyncSessionManager(self, margin=margin, retry_interval=retry_interval)
+
+    @instrument()
+    async def verify_token(self, access_token: str, network: bool = False) -> GenericResponse:
+        """
+        Check an access token without a request to the auth server: signature, expiry, audience and issuer.
+        Tokens that cannot be checked locally (no JWT secret, unknown signing key) are sent to the auth server.
+        :param access_token: str
+        :param network: bool, always ask the auth server, which also catches revoked sessions and deleted users
+        :return: GenericResponse, data holds the token claims
+        """
+        if not access_token or not access_token.strip():
+            return GenericResponse(status=400, message="Access token is required")
+
+        if not network:
+            try:
+                claims = await self.verifier.averify(access_token)
+
+                return GenericResponse(status=200, message="Token verified", data=claims)
+            except TokenUnverifiable:
+                pass
+            except TokenError as e:
+                return GenericResponse(status=401, message=str(e))
+
+        user = await self.get_user(access_token=access_token)
+
+        if user.status != 200:
+            self.verifier.invalidate(access_token)
+            return GenericResponse(status=401, message=user.message)
+
+        return GenericResponse(status=200, message="Token verified", data=unverified_claims(access_token))
+
+    async def is_logged_in(self, access_token: str, check_revocation: bool = False) -> bool:
+        """
+        :param access_token: str
+        :param check_revocation: bool, confirm with the auth server instead of trusting a valid signature
+        :return: bool
+        """
+        if not access_token or not access_token.strip():
+            return False
+
+        token = await self.verify_token(access_token=access_token, network=check_revocation)
+
+        return token.status == 200
@@ -0,0 +1,504 @@
+import asyncio
+from typing import TYPE_CHECKING, AsyncIterator, Iterable
+
+from supabase_service.cache import QueryCache
+from supabase_service.config import AsyncSupabaseClient, PoolOptions, SupabaseClientRegistry
+from supabase_service.decoding import RowDecoder, afetch_body, fast_loads
+from supabase_service.export import EXPORT_FORMATS, TableExport
+from supabase_service.loader import AsyncBatchLoader
+from supabase_service.metrics import instrument
+from supabase_service.query import Query, apply_filters, select_builder
+from supabase_service.replica import TableReplica
+from supabase_service.types import GenericResponse
+from supabase_service.utils import aggregate_batches, batch_rows, database_error_status, join_strings
+from supabase_service.writebehind import AsyncWriteBehindBuffer
+
+if TYPE_CHECKING:
+    from postgrest.types import CountMethod
+
+
+class AsyncSupabaseDatabase(AsyncSupabaseClient):
+
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None,
+                 concurrency: int = 100, cache: QueryCache = None):
+        super().__init__(pool_options=pool_options, registry=registry, concurrency=concurrency)
+        self.__client_database = self._get_client
+        self.cache = cache
+
+    @instrument(target="table_name")
+    async def select_all(self, table_name: str, table_columns: list = ['*'],
+                         count: "CountMethod" = "exact", where: dict = None, raw: bool = False,
+                         decoder: RowDecoder = None) -> GenericResponse:
+        """
+        :param table_name: str
+        :param table_columns: str, may embed resources, see query.embed
+        :param count: CountMethod = "exact", with a limit the count is still the number of matching rows
+        :param where: dict | Query, equality filters, or a Query with operators, order and limits
+        :param raw: bool, data is the response body as bytes, no Python object is built for the rows
+        :param decoder: RowDecoder | None, decodes the body instead of postgrest, e.g. with orjson into
+        __slots__ rows, ignored when raw
+        :return: GenericResponse
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if not table_columns or not table_columns:
+            return GenericResponse(status=400, message="Table columns are required")
+
+        body = "raw" if raw else decoder.name if decoder is not None else None
+        decode = None if raw else decoder.decode if decoder is not None else fast_loads
+        cache_key = None
+
+        if self.cache is not None:
+            options = {"count": count} if body is None else {"count": count, "body": body}
+            cache_key = self.cache.key(table_name, table_columns, where, **options)
+            cached = self.cache.get_result(cache_key, decode)
+
+            if cached is not None:
+                return GenericResponse(status=200, message="Select successful", data=cached[0], count=cached[1])
+
+        try:
+            query = self.__query(table_name, table_columns, where, count=count)
+
+            if body is None and cache_key is None:
+                response = await query.execute()
+                data, total = response.data, response.count
+            else:
+                # a cached result keeps the body, every hit decodes its own rows from it
+                content, total = await afetch_body(query)
+                data = content if decode is None else decode(content)
+
+                if cache_key is not None:
+                    self.cache.set_result(cache_key, table_name, data, total, body=content)
+
+            return GenericResponse(status=200, message="Select successful", data=data, count=total)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+    async def select_by_id(self, table_name: str, table_columns: list = ['*'], id: int = None) -> GenericResponse:
+        """
+        :param table_name: str
+        :param table_columns: list
+        :param id: int
+        :return: GenericResponse
+        """
+        if not id:
+            return GenericResponse(status=400, message="ID is required")
+
+        return await self.select_all(table_name=table_name, table_columns=table_columns,
+                                     count=None, where={"id": id})
+
+    @instrument(target="table_name")
+    async def select_by_ids(self, table_name: str, ids: list, table_columns: list = ['*'], id_column: str = "id",
+                          chunk_size: int = 200) -> GenericResponse:
+        """
+        Fetch many rows by id with one in_ filter per chunk of ids instead of one request per id.
+        :param table_name: str
+        :param ids: list, duplicates are requested once
+        :param table_columns: list
+        :param id_column: str
+        :param chunk_size: int, max ids per request, keeps the query string short
+        :return: GenericResponse, rows come back in database order
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if not table_columns:
+            return GenericResponse(status=400, message="Table columns are required")
+
+        if not ids:
+            return GenericResponse(status=400, message="IDs are required")
+
+        if chunk_size < 1:
+            return GenericResponse(status=400, message="Chunk size must be positive")
+
+        ids = list(dict.fromkeys(ids))
+        rows = []
+
+        try:
+            for start in range(0, len(ids), chunk_size):
+                query = self.__query(table_name, table_columns, None).in_(id_column, ids[start:start + chunk_size])
+                rows.extend((await query.execute()).data)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+        return GenericResponse(status=200, message="Select successful", data=rows, count=len(rows))
+
+    def loader(self, table_name: str, table_columns: list = ['*'], id_column: str = "id", window: float = 0.0,
+               max_batch: int = 200) -> AsyncBatchLoader:
+        """
+        :param table_name: str
+        :param table_columns: list
+        :param id_column: str
+        :param window: float seconds select_by_id calls are collected before one select_by_ids is sent,
+                       0 collects the calls made in the same loop iteration
+        :param max_batch: int, a full batch is sent without waiting for the window
+        :return: AsyncBatchLoader
+        """
+        return AsyncBatchLoader(self, table_name, table_columns=table_columns, id_column=id_column, window=window,
+                                max_batch=max_batch)
+
+    @instrument(target="table_name")
+    async def select_iter(self, table_name: str, table_columns: list = ['*'], where: dict = None,
+                          order_by: str = "id", page_size: int = 1000, keyset: bool = True, pages: bool = False,
+                          count: "CountMethod" = None, prefetch: bool = False) -> GenericResponse:
+        """
+        Async counterpart of SupabaseDatabase.select_iter, data is an async iterator.
+        :param table_name: str
+        :param table_columns: list, must contain order_by when keyset is True
+        :param where: dict | Query, filters only, the pages are ordered and limited here
+        :param order_by: str, unique column the pages are ordered by
+        :param page_size: int
+        :param keyset: bool, paginate with gt(order_by, last value) when True, with range() otherwise
+        :param pages: bool, yield lists of rows instead of single rows
+        :param count: CountMethod | None, the count is only requested when given
+        :param prefetch: bool, fetch the next page in a background task while the current one is consumed
+        :return: GenericResponse with an async iterator as data
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if not table_columns:
+            return GenericResponse(status=400, message="Table columns are required")
+
+        if not order_by or not order_by.strip():
+            return GenericResponse(status=400, message="Order by is required")
+
+        if page_size < 1:
+            return GenericResponse(status=400, message="Page size must be positive")
+
+        if keyset and "*" not in table_columns and order_by not in table_columns:
+            return GenericResponse(status=400, message="Order by column must be selected for keyset pagination")
+
+        if isinstance(where, Query) and (where.ordering or where.pages):
+            return GenericResponse(status=400, message="Where cannot order or limit an iterator")
+
+        total = None
+
+        if count:
+            try:
+                total = (await self.__query(table_name, table_columns, where, count=count).limit(1).execute()).count
+            except Exception as e:
+                return GenericResponse(status=500, message=str(e))
+
+        page_iterator = self.__iter_pages(table_name, table_columns, where, order_by, page_size, keyset, prefetch)
+
+        if not pages:
+            page_iterator = (row async for page in page_iterator for row in page)
+
+        return GenericResponse(status=200, message="Select iterator ready", data=page_iterator, count=total)
+
+    def __query(self, table_name: str, table_columns: list, where: dict, count: "CountMethod" = None):
+        query = select_builder(self.__client_database.postgrest, table_name, join_strings(strings=table_columns),
+                               count=count)
+
+        return apply_filters(query, where)
+
+    async def __iter_pages(self, table_name: str, table_columns: list, where: dict, order_by: str,
+                           page_size: int, keyset: bool, prefetch: bool) -> AsyncIterator[list]:
+
+        async def fetch(cursor) -> list:
+            query = self.__query(table_name, table_columns, where)
+
+            if keyset:
+                if cursor is not None:
+                    query = query.gt(order_by, cursor)
+                query = query.order(order_by).limit(page_size)
+            else:
+                query = query.order(order_by).range(cursor, cursor + page_size - 1)
+
+            return (await query.execute()).data
+
+        def next_cursor(cursor, page: list):
+            return page[-1][order_by] if keyset else cursor + len(page)
+
+        cursor = None if keyset else 0
+        page = await fetch(cursor)
+
+        while page:
+            cursor = next_cursor(cursor, page)
+
+            if not prefetch:
+                yield page
+                page = await fetch(cursor)
+                continue
+
+            next_page = asyncio.ensure_future(fetch(cursor))
+
+            try:
+                yield page
+            except BaseException:
+                next_page.cancel()
+                raise
+
+            page = await next_page
+
+    @instrument(target="table_name")
+    async def export(self, table_name: str, destination: str, format: str = "csv", table_columns: list = ['*'],
+                     where: dict = None, order_by: str = "id", page_size: int = 10_000,
+                     memory_limit: int = 32 * 1024 * 1024, progress=None, compression: str = "snappy",
+                     schema=None) -> GenericResponse:
+        """
+        SupabaseDatabase.export, pages are fetched on the event loop and written to the file synchronously.
+        :return: GenericResponse with rows, pages, bytes, seconds, rows_per_second and mb_per_second as data
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if not destination:
+            return GenericResponse(status=400, message="Destination is required")
+
+        if format not in EXPORT_FORMATS:
+            return GenericResponse(status=400, message=f"Format must be one of {', '.join(EXPORT_FORMATS)}")
+
+        if not table_columns:
+            return GenericResponse(status=400, message="Table columns are required")
+
+        if not order_by or not order_by.strip():
+            return GenericResponse(status=400, message="Order by is required")
+
+        if page_size < 1:
+            return GenericResponse(status=400, message="Page size must be positive")
+
+        if "*" not in table_columns and order_by not in table_columns:
+            return GenericResponse(status=400, message="Order by column must be exported")
+
+        if isinstance(where, Query) and (where.ordering or where.pages):
+            return GenericResponse(status=400, message="Where cannot order or limit an export")
+
+        try:
+            export = TableExport(table_name, destination, format=format, order_by=order_by, page_size=page_size,
+                                 memory_limit=memory_limit, progress=progress, compression=compression,
+                                 schema=schema)
+        except (ImportError, OSError) as e:
+            return GenericResponse(status=500, message=str(e))
+
+        try:
+            while True:
+                body, _ = await afetch_body(export.query(self.__query(table_name, table_columns, where)))
+
+                if not export.consume(body):
+                    break
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e), data=export.report.as_dict(),
+                                   count=export.report.rows)
+        finally:
+            export.close()
+
+        return export.report.response()
+
+    async def replica(self, table_name: str, primary_key: str = "id", indexes: tuple = (),
+                      table_columns: list = ['*'], schema: str = "public", timeout: float = 10.0) -> TableReplica:
+        """
+        In-memory copy of a small, read-heavy table (feature flags, price lists, ...) kept current through a
+        realtime channel, its get(), find() and select() read no network. Stop it with await replica.astop().
+        :param table_name: str, the table must be in the supabase_realtime publication
+        :param primary_key: str
+        :param indexes: tuple[str], columns with a secondary index
+        :param table_columns: list
+        :param schema: str
+        :param timeout: float seconds to wait for the first load
+        :return: TableReplica, started
+        """
+        replica = TableReplica(self, table_name, primary_key=primary_key, indexes=indexes,
+                               table_columns=table_columns, schema=schema)
+
+        return await replica.astart(timeout)
+
+    def write_behind(self, interval: float = 1.0, max_rows: int = 1000, max_bytes: int = 8 * 1024 * 1024,
+                     batch_size: int = 1000, block_timeout: float = 30.0, max_attempts: int = 3,
+                     max_backoff: float = 30.0) -> AsyncWriteBehindBuffer:
+        """
+        Opt-in write-behind mode: update() calls on the buffer are merged per (table, where) and flushed as
+        batched upserts on the where columns.
+        :param interval: float seconds between two flushes
+        :param max_rows: int, pending rows that trigger a flush without waiting for the interval
+        :param max_bytes: int, buffered JSON bytes above which update() waits for a flush
+        :param batch_size: int, max rows per upsert request
+        :param block_timeout: float seconds update() waits for room before failing with 503
+        :param max_attempts: int | None, flushes the database may reject a row in before it is dropped
+        :param max_backoff: float, max seconds between two flushes while the database is unavailable
+        :return: AsyncWriteBehindBuffer
+        """
+        return AsyncWriteBehindBuffer(self, interval=interval, max_rows=max_rows, max_bytes=max_bytes,
+                                      batch_size=batch_size, block_timeout=block_timeout,
+                                      max_attempts=max_attempts, max_backoff=max_backoff)
+
+    @instrument(target="table_name")
+    async def update(self, table_name: str, set: dict[str, str], where: dict) -> GenericResponse:
+        """
+        :param table_name: str
+        :param set: dict
+        :param where: dict | Query, filters only
+        :return: GenericResponse, 400 when the database rejects the update, 503 when it is worth retrying later
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if not set or not set:
+            return GenericResponse(status=400, message="Set is required")
+
+        invalid = self.__validate_where(where)
+
+        if invalid is not None:
+            return invalid
+
+        try:
+            query = (self.__client_database.from_(table_name)
+                     .update(json=set))
+
+            response = await apply_filters(query, where).execute()
+
+            return GenericResponse(status=200, message="Update successful", data=response)
+        except Exception as e:
+            return GenericResponse(status=database_error_status(e), message=str(e))
+        finally:
+            self.__invalidate(table_name)
+
+    @instrument(target="table_name")
+    async def insert(self, table_name: str, values: dict) -> GenericResponse:
+        """
+        :param table_name: str
+        :param values: dict
+        :return: GenericResponse
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if not values or not values:
+            return GenericResponse(status=400, message="Values are required")
+
+        try:
+            query = (self.__client_database.from_(table_name)
+                     .insert(json=values))
+
+            response = await query.execute()
+
+            return GenericResponse(status=201, message="Insert successful", data=response)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+        finally:
+            self.__invalidate(table_name)
+
+    @instrument(target="table_name")
+    async def insert_many(self, table_name: str, values: Iterable[dict], batch_size: int = 1000,
+                          max_batch_bytes: int = 1024 * 1024, parallelism: int = 4, returning: bool = False,
+                          default_to_null: bool = True) -> GenericResponse:
+        """
+        Async counterpart of SupabaseDatabase.insert_many.
+        :param table_name: str
+        :param values: Iterable[dict], a generator is consumed lazily
+        :param batch_size: int, max rows per request
+        :param max_batch_bytes: int, max JSON bytes per request
+        :param parallelism: int, max requests in flight
+        :param returning: bool, echo the inserted rows back (return=representation) instead of return=minimal
+        :param default_to_null: bool, missing keys become null instead of the column default
+        :return: GenericResponse, data holds one result per batch
+        """
+        return await self.__write_many(table_name, values, batch_size, max_batch_bytes, parallelism, returning,
+                                       "insert", {"default_to_null": default_to_null})
+
+    @instrument(target="table_name")
+    async def upsert_many(self, table_name: str, values: Iterable[dict], on_conflict: str = "",
+                          ignore_duplicates: bool = False, batch_size: int = 1000,
+                          max_batch_bytes: int = 1024 * 1024, parallelism: int = 4, returning: bool = False,
+                          default_to_null: bool = True) -> GenericResponse:
+        """
+        Async counterpart of SupabaseDatabase.upsert_many.
+        :param table_name: str
+        :param values: Iterable[dict]
+        :param on_conflict: str, comma separated columns of the UNIQUE constraint to resolve on
+        :param ignore_duplicates: bool, keep the existing row instead of merging
+        :param batch_size: int
+        :param max_batch_bytes: int
+        :param parallelism: int
+        :param returning: bool
+        :param default_to_null: bool
+        :return: GenericResponse, data holds one result per batch
+        """
+        return await self.__write_many(table_name, values, batch_size, max_batch_bytes, parallelism, returning,
+                                       "upsert", {"on_conflict": on_conflict, "ignore_duplicates": ignore_duplicates,
+                                                  "default_to_null": default_to_null})
+
+    async def __write_many(self, table_name: str, values: Iterable[dict], batch_size: int, max_batch_bytes: int,
+                           parallelism: int, returning: bool, operation: str, options: dict) -> GenericResponse:
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        if values is None:
+            return GenericResponse(status=400, message="Values are required")
+
+        if batch_size < 1 or parallelism < 1:
+            return GenericResponse(status=400, message="Batch size and parallelism must be positive")
+
+        from postgrest.types import ReturnMethod
+
+        returning_method = ReturnMethod.representation if returning else ReturnMethod.minimal
+
+        async def send(index: int, batch: list) -> dict:
+            try:
+                query = getattr(self.__client_database.from_(table_name), operation)
+                response = await query(json=batch, returning=returning_method, **options).execute()
+                return {"batch": index, "rows": len(batch), "status": 201,
+                        "data": response.data if returning else None, "error": None}
+            except Exception as e:
+                return {"batch": index, "rows": len(batch), "status": database_error_status(e), "data": None,
+                        "error": str(e)}
+
+        results = []
+        in_flight = set()
+
+        for index, batch in enumerate(batch_rows(values, max_rows=batch_size, max_bytes=max_batch_bytes)):
+            if len(in_flight) >= parallelism:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                results.extend(task.result() for task in done)
+
+            in_flight.add(asyncio.ensure_future(send(index, batch)))
+
+        if in_flight:
+            results.extend(task.result() for task in (await asyncio.wait(in_flight))[0])
+
+        self.__invalidate(table_name)
+
+        return aggregate_batches(results, operation)
+
+    def __invalidate(self, table_name: str):
+        if self.cache is not None:
+            self.cache.invalidate(table_name)
+
+    @staticmethod
+    def __validate_where(where) -> GenericResponse:
+        if not where or isinstance(where, Query) and not where.filters:
+            return GenericResponse(status=400, message="Where is required")
+
+        if isinstance(where, Query) and (where.ordering or where.pages):
+            return GenericResponse(status=400, message="Where cannot order or limit an update or delete")
+
+        return None
+
+    @instrument(target="table_name")
+    async def delete(self, table_name: str, where: dict) -> GenericResponse:
+        """
+        :param table_name: str
+        :param where: dict | Query, filters only
+        :return: GenericResponse
+        """
+        if not table_name or not table_name.strip():
+            return GenericResponse(status=400, message="Table name is required")
+
+        invalid = self.__validate_where(where)
+
+        if invalid is not None:
+            return invalid
+
+        try:
+            query = (self.__client_database.from_(table_name)
+                     .delete())
+
+            response = await apply_filters(query, where).execute()
+
+            return GenericResponse(status=200, message="Delete successful", data=response)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+        finally:
+            self.__invalidate(table_name)
@@ -0,0 +1,427 @@
+import os
+import time
+
+from supabase_service.cache import bucket_cache, signed_url_cache
+from supabase_service.config import AsyncSupabaseClient, PoolOptions, SupabaseClientRegistry
+from supabase_service.listing import async_walk_bucket, file_filter
+from supabase_service.metrics import instrument
+from supabase_service.signing import SIGN_CHUNK_SIZE, SignedUrlBatch
+from supabase_service.types import GenericResponse
+from supabase_service.utils import storage_error_status
+
+
+class AsyncSupabaseStorage(AsyncSupabaseClient):
+
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None,
+                 concurrency: int = 100, bucket_ttl: float = 300.0, trust_bucket_id: bool = False,
+                 signed_url_margin: float = 60.0):
+        """
+        :param pool_options: PoolOptions
+        :param registry: SupabaseClientRegistry
+        :param concurrency: int, max calls in flight through gather()
+        :param bucket_ttl: float seconds get_bucket results are cached, 0 disables the cache
+        :param trust_bucket_id: bool, file operations skip the bucket lookup and address the bucket id directly
+        :param signed_url_margin: float seconds before its expiry a cached signed URL stops being reused
+        """
+        super().__init__(pool_options=pool_options, registry=registry, concurrency=concurrency)
+        self.bucket_ttl = bucket_ttl
+        self.trust_bucket_id = trust_bucket_id
+        self.signed_url_margin = signed_url_margin
+
+    @property
+    def __client_storage(self):
+        # built on first use
+        return self._get_client.storage
+
+    @property
+    def __buckets(self):
+        return bucket_cache(self.__client_storage)
+
+    @property
+    def __signed_urls(self):
+        return signed_url_cache(self.__client_storage)
+
+    @instrument()
+    async def list_buckets(self) -> GenericResponse:
+        """
+        :return: list[AsyncBucket]
+        """
+        try:
+            buckets = await self.__client_storage.list_buckets()
+            return GenericResponse(status=200, message="Buckets retrieved successfully", data=buckets)
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def create_bucket(self, bucket_id: str, bucket_name: str, public: bool = False) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :param bucket_name: str
+        :return: dict[str,str] | str
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not bucket_name or not bucket_name.strip():
+            return GenericResponse(status=400, message="Bucket name is required")
+
+        try:
+            bucket_created = await self.__client_storage.create_bucket(id=bucket_id, name=bucket_name,
+                                                                       options={"public": public})
+        except Exception as e:
+            if storage_error_status(e) == 409:
+                return GenericResponse(status=400, message="Bucket already exists")
+
+            return GenericResponse(status=500, message=str(e))
+        finally:
+            self.invalidate_bucket(bucket_id)
+
+        return GenericResponse(status=201, message="Bucket created successfully", data=bucket_created)
+
+    @instrument(target="bucket_id")
+    async def delete_bucket(self, bucket_id: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :return: dict[str, str] | None
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        try:
+            bucket_removed = await self.__client_storage.delete_bucket(id=bucket_id)
+        except Exception as e:
+            if storage_error_status(e) == 404:
+                return GenericResponse(status=400, message="Bucket not found")
+
+            return GenericResponse(status=400, message=str(e))
+        finally:
+            self.invalidate_bucket(bucket_id)
+
+        return GenericResponse(status=200, message="Bucket removed!", data=bucket_removed)
+
+    @instrument(target="bucket_id")
+    async def get_bucket(self, bucket_id: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :return: AsyncBucket | None
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        bucket = self.__buckets.get(bucket_id) if self.bucket_ttl else None
+
+        if bucket is not None:
+            return GenericResponse(status=200, message="Bucket retrieved successfully", data=bucket)
+
+        try:
+            bucket = await self.__client_storage.get_bucket(id=bucket_id)
+
+            if self.bucket_ttl:
+                self.__buckets.set(bucket_id, bucket, ttl=self.bucket_ttl)
+
+            return GenericResponse(status=200, message="Bucket retrieved successfully", data=bucket)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    def invalidate_bucket(self, bucket_id: str = None):
+        """
+        Forget the cached metadata of bucket_id, of every bucket when None.
+        :param bucket_id: str | None
+        :return: None
+        """
+        if bucket_id is None:
+            self.__buckets.clear()
+        else:
+            self.__buckets.delete(bucket_id)
+
+    @instrument(target="bucket_id")
+    async def list_files(self, bucket_id: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :return: list
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            files = await bucket.data.list()
+
+            return GenericResponse(status=200, message="Files retrieved successfully", data=files)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def walk_files(self, bucket_id: str, prefix: str = "", recursive: bool = True, page_size: int = 1000,
+                         workers: int = 4, extensions: list = None, min_size: int = None, max_size: int = None,
+                         modified_since=None) -> GenericResponse:
+        """
+        Enumerate the files under prefix page by page, descending into folders. Pages are only requested while
+        the async iterator in data is consumed, errors raised by a later page propagate from the iterator.
+        :param bucket_id: str
+        :param prefix: str, folder to start from, the bucket root when empty
+        :param recursive: bool, descend into sub folders
+        :param page_size: int, entries per list request
+        :param workers: int, list requests in flight across folders
+        :param extensions: list[str], only files with one of these extensions
+        :param min_size: int bytes
+        :param max_size: int bytes
+        :param modified_since: datetime | str, only files updated at or after this time
+        :return: GenericResponse with an async iterator of list entries as data, each with its full path under "path"
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if page_size < 1:
+            return GenericResponse(status=400, message="Page size must be positive")
+
+        if workers < 1:
+            return GenericResponse(status=400, message="Workers must be positive")
+
+        try:
+            accept = file_filter(extensions=extensions, min_size=min_size, max_size=max_size,
+                                 modified_since=modified_since)
+        except (TypeError, ValueError) as e:
+            return GenericResponse(status=400, message=str(e))
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        files = async_walk_bucket(bucket.data, prefix=prefix, recursive=recursive, page_size=page_size,
+                                  workers=workers, accept=accept)
+
+        return GenericResponse(status=200, message="File iterator ready", data=files)
+
+    @instrument(target="bucket_id")
+    async def upload_file(self, bucket_id: str, bucket_path: str, local_file_path: str,
+                          file_name: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :param bucket_path: str | None
+        :param local_file_path: str
+        :param file_name: str
+        :return: Response | str
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not local_file_path or not local_file_path.strip():
+            return GenericResponse(status=400, message="Local file path is required")
+
+        if not file_name or not file_name.strip():
+            return GenericResponse(status=400, message="File name is required")
+
+        if os.path.exists(local_file_path) and not os.path.isfile(local_file_path):
+            return GenericResponse(status=400, message="Local file path is not a file")
+
+        path = self.__join_path(bucket_path, file_name)
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            file_uploaded = await bucket.data.upload(path=path, file=local_file_path, file_options=None)
+
+            return GenericResponse(status=201, message="File uploaded successfully", data=file_uploaded)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def download_file(self, bucket_id: str, bucket_path: str, file_name: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :param bucket_path: str | None
+        :param file_name: str
+        :return: Response | str
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not file_name or not file_name.strip():
+            return GenericResponse(status=400, message="File name is required")
+
+        path = self.__join_path(bucket_path, file_name)
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            file_downloader = await bucket.data.download(path=path)
+
+            return GenericResponse(status=200, message="File downloaded successfully", data=file_downloader)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def update_file(self, bucket_id: str, bucket_path: str, local_file_path: str,
+                          file_name: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :param bucket_path: str | None
+        :param local_file_path: str
+        :param file_name: str
+        :return: Response | str
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not local_file_path or not local_file_path.strip():
+            return GenericResponse(status=400, message="Local file path is required")
+
+        if not file_name or not file_name.strip():
+            return GenericResponse(status=400, message="File name is required")
+
+        if os.path.exists(local_file_path) and not os.path.isfile(local_file_path):
+            return GenericResponse(status=400, message="Local file path is not a file")
+
+        path = self.__join_path(bucket_path, file_name)
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            file_updated = await bucket.data.update(path=path, file=local_file_path, file_options=None)
+
+            return GenericResponse(status=200, message="File updated successfully", data=file_updated)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def copy_file(self, bucket_id: str, from_path: str, to_path: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :param from_path: str
+        :param to_path: str
+        :return: dict[str, str] | str
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not from_path or not from_path.strip():
+            return GenericResponse(status=400, message="From path is required")
+
+        if not to_path or not to_path.strip():
+            return GenericResponse(status=400, message="To path is required")
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            file_copied = await bucket.data.copy(from_path=from_path, to_path=to_path)
+
+            return GenericResponse(status=200, message="File copied successfully", data=file_copied)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def move_file(self, bucket_id: str, from_path: str, to_path: str) -> GenericResponse:
+        """
+        :param bucket_id: str
+        :param from_path: str
+        :param to_path: str
+        :return: dict[str, str] | str
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not from_path or not from_path.strip():
+            return GenericResponse(status=400, message="From path is required")
+
+        if not to_path or not to_path.strip():
+            return GenericResponse(status=400, message="To path is required")
+
+        bucket = await self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            file_moved = await bucket.data.move(from_path=from_path, to_path=to_path)
+
+            return GenericResponse(status=200, message="File moved successfully", data=file_moved)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    async def signed_urls(self, bucket_id: str, paths: list, expires_in: int = 3600, download=None,
+                          public: bool = None, chunk_size: int = SIGN_CHUNK_SIZE) -> GenericResponse:
+        """
+        URLs of many files with at most one sign request per chunk_size paths. Signed URLs are reused until
+        signed_url_margin seconds before they expire, public bucket URLs are built without any request.
+        :param bucket_id: str
+        :param paths: list[str], object paths in the bucket
+        :param expires_in: int seconds the signed URLs stay valid
+        :param download: bool | str, the URLs download the file, under this name when a str
+        :param public: bool, True builds public URLs, False signs them, None follows the bucket (signs when the
+        bucket id is trusted)
+        :param chunk_size: int, paths per sign request
+        :return: GenericResponse, data maps every path to its URL, None for the paths that could not be signed
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if chunk_size < 1:
+            return GenericResponse(status=400, message="Chunk size must be positive")
+
+        try:
+            batch = SignedUrlBatch(self.__signed_urls, bucket_id, paths, expires_in, download=download,
+                                   margin=self.signed_url_margin)
+        except (TypeError, ValueError) as e:
+            return GenericResponse(status=400, message=str(e))
+
+        if public is None and not self.trust_bucket_id:
+            bucket = await self.get_bucket(bucket_id=bucket_id)
+
+            if bucket.status not in [200]:
+                return GenericResponse(status=400, message="Bucket not found")
+
+            public = bucket.data.public
+
+        session = self.__client_storage.session
+
+        if public:
+            return batch.public(session.base_url)
+
+        try:
+            for body in batch.pending(chunk_size):
+                requested_at = time.monotonic()
+                response = await session.post(f"object/sign/{bucket_id}", json=body)
+                response.raise_for_status()
+                batch.add(session.base_url, response.json(), requested_at)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+        return batch.response()
+
+    async def __bucket(self, bucket_id: str) -> GenericResponse:
+        """
+        Bucket handle for file operations, from_(bucket_id) without any request when the id is trusted.
+        :param bucket_id: str
+        :return: GenericResponse
+        """
+        if self.trust_bucket_id:
+            return GenericResponse(status=200, message="Bucket retrieved successfully",
+                                   data=self.__client_storage.from_(bucket_id))
+
+        return await self.get_bucket(bucket_id=bucket_id)
+
+    @staticmethod
+    def __join_path(bucket_path: str, file_name: str) -> str:
+        if bucket_path and not bucket_path.endswith("/"):
+            bucket_path += "/"
+
+        return bucket_path + file_name if bucket_path else file_name
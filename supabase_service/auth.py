@@ -1,19 +1,37 @@
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
-from gotrue import AuthResponse, SignUpWithEmailAndPasswordCredentialsOptions, SignInWithPasswordCredentialsOptions, \
-    SignOutOptions, ResendEmailCredentialsOptions
-
-from supabase_service.config import SupabaseClient
+from supabase_service.config import SupabaseClient, PoolOptions, SupabaseClientRegistry
+from supabase_service.metrics import instrument
+from supabase_service.sessions import SessionManager
+from supabase_service.tokens import TokenError, TokenUnverifiable, TokenVerifier, unverified_claims
 from supabase_service.types import GenericResponse
 
+if TYPE_CHECKING:
+    from gotrue import AuthResponse, SignUpWithEmailAndPasswordCredentialsOptions, \
+        SignInWithPasswordCredentialsOptions, SignOutOptions, ResendEmailCredentialsOptions
+
 
 class SupabaseAuth(SupabaseClient):
 
-    def __init__(self):
-        super().__init__()
-        self.__client_auth = self._get_client
+    _namespace = "auth"
+
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None,
+                 verifier: TokenVerifier = None):
+        """
+        :param pool_options: PoolOptions
+        :param registry: SupabaseClientRegistry
+        :param verifier: TokenVerifier checking access tokens locally, TokenVerifier.from_env() when None
+        """
+        super().__init__(pool_options=pool_options, registry=registry)
+        self.verifier = verifier or TokenVerifier.from_env()
+
+    @property
+    def __client_auth(self):
+        # built on first use
+        return self._get_client.auth
 
-    def sign_in(self, email: str, password: str, options: SignInWithPasswordCredentialsOptions) -> GenericResponse:
+    @instrument()
+    def sign_in(self, email: str, password: str, options: "SignInWithPasswordCredentialsOptions") -> GenericResponse:
         """
         :param email: str
         :param password: str
@@ -40,8 +58,9 @@ class SupabaseAuth(SupabaseClient):
         except Exception as e:
             return GenericResponse(status=500, message=str(e))
 
+    @instrument()
     def sign_up(self, email: str, password: str,
-                options: SignUpWithEmailAndPasswordCredentialsOptions) -> GenericResponse:
+                options: "SignUpWithEmailAndPasswordCredentialsOptions") -> GenericResponse:
         """
         :param email: str
         :param password: str
@@ -62,13 +81,19 @@ class SupabaseAuth(SupabaseClient):
         except Exception as e:
             return GenericResponse(status=500, message=str(e))
 
-    def sign_out(self, options: SignOutOptions):
+    @instrument()
+    def sign_out(self, options: "SignOutOptions", access_token: str = None):
         """
         :param options: SignOutOptions
+        :param access_token: str, session to revoke, the auth client keeps no session of its own to sign out
         :return: None
         """
-        self.__client_auth.sign_out(options=options)
+        if access_token:
+            self.__client_auth.admin.sign_out(access_token, (options or {}).get("scope", "global"))
+        else:
+            self.__client_auth.sign_out(options=options)
 
+    @instrument()
     def get_user(self, access_token: str) -> GenericResponse:
         """
         :param access_token: str
@@ -85,8 +110,9 @@ class SupabaseAuth(SupabaseClient):
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
 
+    @instrument()
     def resend_mail(self, email: str, type: Literal["signup", "email_change"],
-                    options: ResendEmailCredentialsOptions) -> GenericResponse:
+                    options: "ResendEmailCredentialsOptions") -> GenericResponse:
         """
         :param email: str
         :param type: str
@@ -100,6 +126,7 @@ class SupabaseAuth(SupabaseClient):
 
         return GenericResponse(status=200, message="Email sent successfully", data=resend_mail)
 
+    @instrument()
     def refresh_token(self, refresh_token: str) -> GenericResponse:
         """
         :param refresh_token: str
@@ -114,14 +141,54 @@ class SupabaseAuth(SupabaseClient):
 
         return GenericResponse(status=200, message="Session refreshed successfully", data=refresh_session)
 
-    def is_logged_in(self, access_token: str) -> bool:
+    def session_manager(self, margin: float = 60.0, retry_interval: float = 5.0, workers: int = 4) -> SessionManager:
+        """
+        :param margin: float seconds before expiry a tracked session is refreshed
+        :param retry_interval: float seconds between attempts after a failed refresh
+        :param workers: int, refreshes running at once in the background
+        :return: SessionManager, refreshing the sessions it tracks in the background through this service
+        """
+        return SessionManager(self, margin=margin, retry_interval=retry_interval, workers=workers)
+
+    @instrument()
+    def verify_token(self, access_token: str, network: bool = False) -> GenericResponse:
+        """
+        Check an access token without a request to the auth server: signature, expiry, audience and issuer.
+        Tokens that cannot be checked locally (no JWT secret, unknown signing key) are sent to the auth server.
+        :param access_token: str
+        :param network: bool, always ask the auth server, which also catches revoked sessions and deleted users
+        :return: GenericResponse, data holds the token claims
+        """
+        if not access_token or not access_token.strip():
+            return GenericResponse(status=400, message="Access token is required")
+
+        if not network:
+            try:
+                claims = self.verifier.verify(access_token)
+
+                return GenericResponse(status=200, message="Token verified", data=claims)
+            except TokenUnverifiable:
+                pass
+            except TokenError as e:
+                return GenericResponse(status=401, message=str(e))
+
+        user = self.get_user(access_token=access_token)
+
+        if user.status != 200:
+            self.verifier.invalidate(access_token)
+            return GenericResponse(status=401, message=user.message)
+
+        return GenericResponse(status=200, message="Token verified", data=unverified_claims(access_token))
+
+    def is_logged_in(self, access_token: str, check_revocation: bool = False) -> bool:
         """
         :param access_token: str
+        :param check_revocation: bool, confirm with the auth server instead of trusting a valid signature
         :return: bool
         """
         if not access_token or not access_token.strip():
             return False
 
-        user = self.get_user(access_token=access_token)
+        token = self.verify_token(access_token=access_token, network=check_revocation)
 
-        return user is not None
+        return token.status == 200
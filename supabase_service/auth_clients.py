@@ -0,0 +1,41 @@
+import httpx
+from gotrue import AsyncGoTrueClient, AsyncMemoryStorage, SyncGoTrueClient, SyncMemoryStorage
+from gotrue.http_clients import SyncClient as GoTrueHttpClient
+
+
+class StatelessGoTrueClient(SyncGoTrueClient):
+    """
+    Hands sessions back without keeping them, so the shared client never refreshes (and so consumes) the refresh
+    token of a user signed in through it. SessionManager is the one refreshing tracked sessions.
+    """
+
+    def _save_session(self, session):
+        pass
+
+
+class StatelessAsyncGoTrueClient(AsyncGoTrueClient):
+
+    async def _save_session(self, session):
+        pass
+
+
+def build_client(supabase_url: str, headers: dict, pool_options, asynchronous: bool = False):
+    """
+    GoTrue client shared by every SupabaseAuth of the process, on a pooled session. Unlike the one of
+    supabase.Client it neither keeps nor refreshes the signed in session: services sign in many users, whose tokens
+    go back to the caller (and to a SessionManager when they should be kept fresh).
+    :param supabase_url: str
+    :param headers: dict, apikey and authorization headers
+    :param pool_options: PoolOptions
+    :param asynchronous: bool
+    :return: StatelessGoTrueClient | StatelessAsyncGoTrueClient
+    """
+    if asynchronous:
+        return StatelessAsyncGoTrueClient(url=f"{supabase_url}/auth/v1", headers=headers,
+                                          storage=AsyncMemoryStorage(), auto_refresh_token=False,
+                                          persist_session=False, flow_type="implicit",
+                                          http_client=pool_options.build_session(httpx.AsyncClient, None))
+
+    return StatelessGoTrueClient(url=f"{supabase_url}/auth/v1", headers=headers, storage=SyncMemoryStorage(),
+                                 auto_refresh_token=False, persist_session=False, flow_type="implicit",
+                                 http_client=pool_options.build_session(GoTrueHttpClient, None))
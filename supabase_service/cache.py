@@ -0,0 +1,278 @@
+import copy
+import json
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from supabase_service.query import Query
+
+
+class CacheBackend:
+    """
+    Storage used by QueryCache. Subclass it to keep entries in a store shared between processes.
+    """
+
+    def get(self, key: str):
+        """
+        :param key: str
+        :return: the stored value, None when missing or expired
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float = None, size: int = 0):
+        """
+        :param key: str
+        :param value: object
+        :param ttl: float | None, seconds before the entry expires, never when None
+        :param size: int, approximate size in bytes of value
+        :return: None
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU bounded by an approximate memory budget, entries expire after their ttl.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 100_000):
+        """
+        :param max_bytes: int
+        :param max_entries: int
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires_at, size = entry
+
+            if expires_at is not None and expires_at <= time.monotonic():
+                self.__remove(key)
+                self.expirations += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float = None, size: int = 0):
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+
+            self.__entries[key] = (value, expires_at, size)
+            self.__bytes += size
+
+            while self.__entries and (self.__bytes > self.max_bytes or len(self.__entries) > self.max_entries):
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self.__entries), "bytes": self.__bytes, "evictions": self.evictions,
+                "expirations": self.expirations}
+
+    def __remove(self, key: str):
+        self.__bytes -= self.__entries.pop(key)[2]
+
+
+class QueryCache:
+    """
+    Read-through cache of select results keyed on the normalized query.
+    Every table has a generation token that is part of the key; invalidating a table replaces its token,
+    so stale entries become unreachable and age out of the backend on their own.
+    Results are kept as their response body when there is one and decoded again on every hit, other rows are
+    copied, so callers may change what they get.
+    """
+
+    def __init__(self, backend: CacheBackend = None, default_ttl: float = 60.0, table_ttls: dict = None):
+        """
+        :param backend: CacheBackend, MemoryCache() when None
+        :param default_ttl: float seconds
+        :param table_ttls: dict[str, float], per table ttl, 0 disables caching for that table
+        """
+        self.backend = backend or MemoryCache()
+        self.default_ttl = default_ttl
+        self.table_ttls = table_ttls or {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def ttl(self, table_name: str) -> float:
+        return self.table_ttls.get(table_name, self.default_ttl)
+
+    def key(self, table_name: str, table_columns: list, where: dict = None, **options) -> str:
+        """
+        :param table_name: str
+        :param table_columns: list
+        :param where: dict | Query
+        :param options: any other argument changing the result, e.g. count
+        :return: str
+        """
+        filters = repr(where) if isinstance(where, Query) else sorted((where or {}).items())
+        query = json.dumps([sorted(table_columns), filters, sorted(options.items())], default=str,
+                           separators=(",", ":"))
+
+        return f"query:{table_name}:{self.__generation(table_name)}:{query}"
+
+    def get(self, key: str):
+        value = self.backend.get(key)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return value
+
+    def set(self, key: str, table_name: str, value, size: int = None):
+        """
+        :param size: int | None, approximate bytes of value, estimated from its first rows when None
+        """
+        ttl = self.ttl(table_name)
+
+        if not ttl:
+            return
+
+        self.backend.set(key, value, ttl=ttl, size=_estimated_size(value) if size is None else size)
+
+    def get_result(self, key: str, decode=None) -> tuple:
+        """
+        :param key: str
+        :param decode: callable | None, turns a cached response body into the data, None hands the body out as is
+        :return: tuple | None, (data, count) of a select cached with set_result, data belongs to this caller
+        """
+        value = self.get(key)
+
+        if value is None:
+            return None
+
+        data, total, is_body = value
+
+        if is_body:
+            return (data if decode is None else decode(data)), total
+
+        return [copy.copy(row) for row in data], total
+
+    def set_result(self, key: str, table_name: str, data, total: int, body: bytes = None):
+        """
+        Cache a select result, as its response body when there is one: its length is the size, and every hit
+        decodes its own rows.
+        :param key: str
+        :param table_name: str
+        :param data: list, the rows, ignored when body is given
+        :param total: int | None, the count
+        :param body: bytes | None
+        :return: None
+        """
+        if body is not None:
+            self.set(key, table_name, (bytes(body), total, True), size=len(body))
+        else:
+            self.set(key, table_name, (data, total, False))
+
+    def invalidate(self, table_name: str):
+        """
+        Drop every cached query of table_name.
+        :param table_name: str
+        :return: None
+        """
+        self.backend.set(f"generation:{table_name}", uuid.uuid4().hex)
+        self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                **self.backend.stats()}
+
+    def __generation(self, table_name: str) -> str:
+        generation = self.backend.get(f"generation:{table_name}")
+
+        if generation is None:
+            generation = uuid.uuid4().hex
+            self.backend.set(f"generation:{table_name}", generation)
+
+        return generation
+
+
+def _estimated_size(value) -> int:
+    """
+    JSON size of value extrapolated from its first rows, encoding every result would cost about as much as
+    decoding it.
+    """
+    rows = value[0] if isinstance(value, tuple) and value and isinstance(value[0], list) else value
+
+    if not isinstance(rows, list) or len(rows) <= 8:
+        return len(json.dumps(value, default=str))
+
+    return len(json.dumps(rows[:8], default=str)) * len(rows) // 8
+
+
+_bucket_caches = weakref.WeakKeyDictionary()
+_signed_url_caches = weakref.WeakKeyDictionary()
+_client_caches_lock = threading.Lock()
+
+
+def bucket_cache(storage_client) -> MemoryCache:
+    """
+    Bucket metadata cache of a storage client, shared by every service built on that client.
+    :param storage_client: SyncStorageClient | AsyncStorageClient
+    :return: MemoryCache
+    """
+    return _client_cache(_bucket_caches, storage_client, max_entries=10_000)
+
+
+def signed_url_cache(storage_client) -> MemoryCache:
+    """
+    Signed URL cache of a storage client, shared by every service built on that client.
+    :param storage_client: SyncStorageClient | AsyncStorageClient
+    :return: MemoryCache
+    """
+    return _client_cache(_signed_url_caches, storage_client, max_bytes=16 * 1024 * 1024)
+
+
+def _client_cache(caches: weakref.WeakKeyDictionary, storage_client, **options) -> MemoryCache:
+    with _client_caches_lock:
+        cache = caches.get(storage_client)
+
+        if cache is None:
+            cache = MemoryCache(**options)
+            caches[storage_client] = cache
+
+        return cache
@@ -1,26 +1,565 @@
+import asyncio
+import atexit
+import importlib
 import os
+import re
+import threading
+import weakref
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
-from supabase import create_client
+from supabase_service.metrics import http_event_hooks, metrics
+from supabase_service.utils import gather_limited
 
-load_dotenv()
+if TYPE_CHECKING:
+    import httpx
 
+    from supabase_service.limits import Limiter
+    from supabase_service.resilience import ResiliencePolicy
 
-# create a class and create client
+# module building each sub-client, imported the first time a service needs that sub-client
+SUB_CLIENT_MODULES = {"postgrest": "supabase_service.postgrest_clients",
+                      "storage": "supabase_service.storage_clients",
+                      "auth": "supabase_service.auth_clients"}
 
-class SupabaseClient:
+_env_loaded = False
+
+
+def load_env():
+    """
+    Load the .env file into os.environ, once, when the first service or PoolOptions is built rather than when
+    the package is imported.
+    :return: None
+    """
+    global _env_loaded
+
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+class PoolOptions:
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, http2: bool = True, timeout: float = None,
+                 policy: "ResiliencePolicy" = None, limiter: "Limiter" = None):
+        """
+        :param max_connections: int
+        :param max_keepalive_connections: int
+        :param keepalive_expiry: float seconds an idle connection is kept open
+        :param http2: bool
+        :param timeout: float | None, default timeout of the sub-client when None
+        :param policy: ResiliencePolicy | None, retries, hedging and circuit breakers of every session,
+        ResiliencePolicy() when None
+        :param limiter: Limiter | None, rate limits and adaptive concurrency of every session, Limiter.from_env()
+        (shared by the whole process) when None
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.timeout = timeout
+
+        if policy is None:
+            from supabase_service.resilience import ResiliencePolicy
+
+            policy = ResiliencePolicy()
+
+        self.policy = policy
+
+        if limiter is None:
+            from supabase_service.limits import Limiter
+
+            load_env()
+            limiter = Limiter.from_env()
+
+        self.limiter = limiter
+
+    @classmethod
+    def from_env(cls) -> "PoolOptions":
+        """
+        Read SUPABASE_POOL_* variables, the ResiliencePolicy and the Limiter variables, falling back to the
+        defaults.
+        :return: PoolOptions
+        """
+        from supabase_service.resilience import ResiliencePolicy
+
+        load_env()
+        timeout = os.environ.get("SUPABASE_POOL_TIMEOUT")
+
+        return cls(max_connections=int(os.environ.get("SUPABASE_POOL_MAX_CONNECTIONS", 100)),
+                   max_keepalive_connections=int(os.environ.get("SUPABASE_POOL_MAX_KEEPALIVE", 20)),
+                   keepalive_expiry=float(os.environ.get("SUPABASE_POOL_KEEPALIVE_EXPIRY", 30.0)),
+                   http2=os.environ.get("SUPABASE_POOL_HTTP2", "true").lower() not in ("0", "false", "no"),
+                   timeout=float(timeout) if timeout else None,
+                   policy=ResiliencePolicy.from_env())
+
+    @property
+    def key(self) -> tuple:
+        return (self.max_connections, self.max_keepalive_connections, self.keepalive_expiry, self.http2,
+                self.timeout, self.policy.key, self.limiter.key)
+
+    def build_session(self, session_class: type, timeout, verify: bool = True, **kwargs) -> "httpx.Client":
+        """
+        :param session_class: httpx.Client subclass expected by the sub-client
+        :param timeout: timeout requested by the sub-client, overridden by self.timeout
+        :param verify: bool
+        :return: httpx.Client
+        """
+        import httpx
+
+        from supabase_service.transports import AsyncResilientTransport, ResilientTransport
+
+        asynchronous = issubclass(session_class, httpx.AsyncClient)
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_keepalive_connections,
+                              keepalive_expiry=self.keepalive_expiry)
+
+        # the client ignores verify, http2 and limits once it is given a transport, they go to the transport
+        if asynchronous:
+            transport = AsyncResilientTransport(
+                httpx.AsyncHTTPTransport(verify=bool(verify), http2=self.http2, limits=limits), self.policy,
+                self.limiter)
+        else:
+            transport = ResilientTransport(httpx.HTTPTransport(verify=bool(verify), http2=self.http2, limits=limits),
+                                           self.policy, self.limiter)
+
+        return session_class(timeout=self.timeout if self.timeout is not None else timeout,
+                             event_hooks=http_event_hooks(asynchronous=asynchronous),
+                             follow_redirects=True,
+                             transport=transport,
+                             **kwargs)
+
+
+class _PooledClient:
+    """
+    Shared client of the services. Its postgrest, storage and auth sub-clients are imported and built with the
+    connection settings of PoolOptions the first time they are used, so a service only pays for the one it needs.
+    """
+
+    _asynchronous = False
+
+    def __init__(self, supabase_url: str, supabase_key: str, pool_options: PoolOptions):
+        if not supabase_url or not re.match(r"^(https?)://.+", supabase_url):
+            raise ValueError("Invalid URL, set SUPABASE_URL")
+
+        if not supabase_key or not re.match(r"^[A-Za-z0-9-_=]+\.[A-Za-z0-9-_=]+\.?[A-Za-z0-9-_.+/=]*$",
+                                            supabase_key):
+            raise ValueError("Invalid API key, set SUPABASE_KEY")
+
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.pool_options = pool_options
+        self.__sub_clients = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def postgrest(self):
+        return self.__sub_client("postgrest")
+
+    @property
+    def storage(self):
+        return self.__sub_client("storage")
+
+    @property
+    def auth(self):
+        return self.__sub_client("auth")
+
+    def from_(self, table_name: str):
+        return self.postgrest.from_(table_name)
+
+    table = from_
+
+    def rpc(self, fn: str, params: dict = None):
+        return self.postgrest.rpc(fn, params or {})
+
+    def sub_clients(self) -> dict:
+        """
+        :return: dict[str, object], the sub-clients built so far by name
+        """
+        return dict(self.__sub_clients)
+
+    def close(self):
+        for name, sub_client in self.sub_clients().items():
+            if name == "auth":
+                sub_client.close()
+            else:
+                sub_client.session.close()
+
+    def __sub_client(self, name: str):
+        sub_client = self.__sub_clients.get(name)
+
+        if sub_client is None:
+            with self.__lock:
+                sub_client = self.__sub_clients.get(name)
+
+                if sub_client is None:
+                    headers = {"apiKey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}"}
+                    sub_client = importlib.import_module(SUB_CLIENT_MODULES[name]).build_client(
+                        self.supabase_url, headers, self.pool_options, asynchronous=self._asynchronous)
+                    self.__sub_clients[name] = sub_client
+
+        return sub_client
+
+
+class _PooledAsyncClient(_PooledClient):
+    """
+    Async counterpart of _PooledClient, its sessions belong to the event loop they are first used on.
+    """
+
+    _asynchronous = True
+
+    async def aclose(self):
+        for name, sub_client in self.sub_clients().items():
+            if name == "auth":
+                await sub_client.close()
+            else:
+                await sub_client.session.aclose()
+
+
+class SupabaseClientRegistry:
+    """
+    Process-wide registry handing out one lazily built client per (url, key, namespace, pool options).
+    Each get_client counts a reference and release() gives it back, the client staying registered with its warm
+    connections for the next service until close() / close_clients(). Async clients are kept per event loop and
+    closed when the loop shuts down.
+    Clients inherited through fork() are dropped, never closed, so the child opens its own connections.
+    """
 
     def __init__(self):
+        self.__lock = threading.Lock()
+        self.__clients = {}
+        self.__loop_clients = weakref.WeakKeyDictionary()
+        self.__loop_closers = weakref.WeakKeyDictionary()
+        self.__references = {}
+        self.__pid = os.getpid()
+
+    def get_client(self, url: str, key: str, namespace: str = "default", pool_options: PoolOptions = None):
+        """
+        :param url: str
+        :param key: str
+        :param namespace: str, services that change the client auth state use their own namespace
+        :param pool_options: PoolOptions
+        :return: _PooledClient
+        """
+        pool_options = pool_options or PoolOptions.from_env()
+        registry_key = (url, key, namespace, pool_options.key)
+
+        return self.__reference(self.__clients, registry_key, lambda: _PooledClient(url, key, pool_options))
+
+    def get_async_client(self, url: str, key: str, namespace: str = "default", pool_options: PoolOptions = None):
+        """
+        Async clients are shared per event loop, httpx async connections cannot move between loops. They are
+        closed when asyncio.run() (or loop.shutdown_asyncgens()) shuts their loop down, and dropped once it is closed.
+        :param url: str
+        :param key: str
+        :param namespace: str
+        :param pool_options: PoolOptions
+        :return: _PooledAsyncClient
+        """
+        pool_options = pool_options or PoolOptions.from_env()
+        registry_key = (url, key, namespace, pool_options.key, "async")
+
+        def build():
+            return _PooledAsyncClient(url, key, pool_options)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.__reference(self.__clients, registry_key, build)
+
+        self.__reset_after_fork()
+
+        with self.__lock:
+            for closed in [closed for closed in self.__loop_clients if closed.is_closed()]:
+                self.__drop_loop(closed)
+
+            clients = self.__loop_clients.get(loop)
+
+            if clients is None:
+                clients = self.__loop_clients[loop] = {}
+                closer = self.__loop_closers[loop] = self.__close_with_loop(weakref.ref(loop))
+                # the first step registers the generator with the loop, whose shutdown_asyncgens() finishes it
+                asyncio.ensure_future(closer.__anext__())
+
+        return self.__reference(clients, registry_key, build)
+
+    def release(self, client: _PooledClient):
+        """
+        Give back one reference taken by get_client. The client stays open and registered, so the next service
+        reuses its connections, close() closes it.
+        :param client: _PooledClient
+        :return: None
+        """
+        self.__release(client)
+
+    async def arelease(self, client: _PooledAsyncClient):
+        """
+        Give back one reference taken by get_async_client, see release(). The client is closed by aclose() or
+        with its event loop.
+        :param client: _PooledAsyncClient
+        :return: None
+        """
+        self.__release(client)
+
+    def close(self):
+        """
+        Close every sync connection pool opened by this process and drop them from the registry, whatever the
+        services still holding them. Async clients are left to aclose().
+        :return: None
+        """
+        self.__reset_after_fork()
+
+        with self.__lock:
+            clients = [self.__clients.pop(k) for k, client in list(self.__clients.items())
+                       if not isinstance(client, _PooledAsyncClient)]
+
+            for client in clients:
+                self.__references.pop(id(client), None)
+
+        for client in clients:
+            client.close()
+
+    async def aclose(self):
+        """
+        Close every sync connection pool and the async ones of the running loop, and drop them from the registry.
+        Async clients of other loops are left to their loop.
+        :return: None
+        """
+        self.__reset_after_fork()
+
+        with self.__lock:
+            clients = list(self.__clients.values())
+            self.__clients.clear()
+
+            try:
+                loop_clients = self.__loop_clients.get(asyncio.get_running_loop(), {})
+            except RuntimeError:
+                loop_clients = {}
+
+            clients += loop_clients.values()
+            loop_clients.clear()
+
+            for client in clients:
+                self.__references.pop(id(client), None)
+
+        for client in clients:
+            if isinstance(client, _PooledAsyncClient):
+                await client.aclose()
+            else:
+                client.close()
+
+    def __reference(self, clients: dict, registry_key: tuple, build) -> _PooledClient:
+        self.__reset_after_fork()
+
+        with self.__lock:
+            client = clients.get(registry_key)
+
+            if client is None:
+                client = clients[registry_key] = build()
+
+            self.__references[id(client)] = self.__references.get(id(client), 0) + 1
+
+        return client
+
+    def __release(self, client: _PooledClient):
+        self.__reset_after_fork()
+
+        with self.__lock:
+            references = self.__references.get(id(client))
+
+            if references is None:
+                return
+
+            if references > 1:
+                self.__references[id(client)] = references - 1
+            else:
+                del self.__references[id(client)]
+
+    def __drop_loop(self, loop) -> list:
+        """
+        Forget the async clients of a loop, called with the lock held.
+        :return: list[_PooledAsyncClient]
+        """
+        self.__loop_closers.pop(loop, None)
+        clients = list(self.__loop_clients.pop(loop, {}).values())
+
+        for client in clients:
+            self.__references.pop(id(client), None)
+
+        return clients
+
+    async def __close_with_loop(self, loop_ref: weakref.ref):
+        try:
+            yield
+        finally:
+            loop = loop_ref()
+
+            if loop is not None:
+                with self.__lock:
+                    clients = self.__drop_loop(loop)
+
+                for client in clients:
+                    await client.aclose()
+
+    def __reset_after_fork(self):
+        if self.__pid != os.getpid():
+            self.__lock = threading.Lock()
+            self.__clients = {}
+            self.__loop_clients = weakref.WeakKeyDictionary()
+            self.__loop_closers = weakref.WeakKeyDictionary()
+            self.__references = {}
+            self.__pid = os.getpid()
+
+    def __len__(self):
+        return len(self.__clients) + sum(len(clients) for clients in self.__loop_clients.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+
+client_registry = SupabaseClientRegistry()
+
+
+def close_clients():
+    """
+    Close every sync connection pool of the process-wide registry, also run at exit.
+    :return: None
+    """
+    client_registry.close()
+
+
+async def aclose_clients():
+    """
+    Close every connection pool, sync and async, of the process-wide registry.
+    :return: None
+    """
+    await client_registry.aclose()
+
+
+atexit.register(close_clients)
+
+
+# create a class and get the shared client
+
+class SupabaseClient:
+    _namespace = "default"
+
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None):
+        load_env()
         url: str = os.environ.get("SUPABASE_URL")
         key: str = os.environ.get("SUPABASE_KEY")
-        self.__client = create_client(url, key)
+        self.__registry = registry or client_registry
+        self.__client = self.__registry.get_client(url, key, namespace=self._namespace, pool_options=pool_options)
+        self.__released = False
+        self.metrics = metrics
 
     @property
     def _get_client(self):
-        from supabase_service.auth import SupabaseAuth
-        from supabase_service.storage import SupabaseStorage
-        from supabase_service.database import SupabaseDatabase
-        if isinstance(self, (SupabaseAuth, SupabaseStorage, SupabaseDatabase)):
-            return self.__client
-        else:
-            return None
+        return self.__client
+
+    @property
+    def policy(self) -> "ResiliencePolicy":
+        """
+        ResiliencePolicy of the shared client, its stats() and breakers() show retries and circuit states.
+        """
+        return self.__client.pool_options.policy
+
+    @property
+    def limiter(self) -> "Limiter":
+        """
+        Limiter of the shared client, its stats() show the current windows, rate tokens and queue waits per
+        endpoint type, its using() switches between queueing and failing fast.
+        """
+        return self.__client.pool_options.limiter
+
+    def close(self):
+        """
+        Release this service's reference to the shared client, whose connection pools stay open for the next
+        service. close_clients() (run at exit) closes every pool of the process.
+        :return: None
+        """
+        if not self.__released:
+            self.__released = True
+            self.__registry.release(self.__client)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AsyncSupabaseClient:
+    _namespace = "default"
+
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None,
+                 concurrency: int = 100):
+        """
+        :param pool_options: PoolOptions
+        :param registry: SupabaseClientRegistry
+        :param concurrency: int, max calls in flight through gather()
+        """
+        load_env()
+        url: str = os.environ.get("SUPABASE_URL")
+        key: str = os.environ.get("SUPABASE_KEY")
+        self.__registry = registry or client_registry
+        self.__client = self.__registry.get_async_client(url, key, namespace=self._namespace,
+                                                         pool_options=pool_options)
+        self.__released = False
+        self.concurrency = concurrency
+        self.metrics = metrics
+
+    @property
+    def _get_client(self):
+        return self.__client
+
+    @property
+    def policy(self) -> "ResiliencePolicy":
+        """
+        ResiliencePolicy of the shared client, its stats() and breakers() show retries and circuit states.
+        """
+        return self.__client.pool_options.policy
+
+    @property
+    def limiter(self) -> "Limiter":
+        """
+        Limiter of the shared client, its stats() show the current windows, rate tokens and queue waits per
+        endpoint type, its using() switches between queueing and failing fast.
+        """
+        return self.__client.pool_options.limiter
+
+    async def gather(self, *aws, return_exceptions: bool = False) -> list:
+        """
+        asyncio.gather with at most self.concurrency awaitables running at once.
+        :param aws: coroutines, e.g. self.select_by_id(...) calls
+        :param return_exceptions: bool
+        :return: list of results in the order of aws
+        """
+        return await gather_limited(aws, limit=self.concurrency, return_exceptions=return_exceptions)
+
+    async def aclose(self):
+        """
+        Release this service's reference to the shared client, whose connection pools stay open for the next
+        service. aclose_clients() closes every pool of the process, the loop's shutdown the ones of the loop.
+        :return: None
+        """
+        if not self.__released:
+            self.__released = True
+            await self.__registry.arelease(self.__client)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
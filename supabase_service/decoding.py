@@ -0,0 +1,169 @@
+import json
+import keyword
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def fast_loads(body: bytes):
+    """
+    :param body: bytes | memoryview, JSON document
+    :return: decoded document, with orjson when it is installed, the standard json module otherwise
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+
+    return json.loads(bytes(body) if isinstance(body, memoryview) else body)
+
+
+def content_range_count(content_range: str) -> int:
+    """
+    :param content_range: str | None, PostgREST Content-Range header, e.g. "0-24/3573"
+    :return: int | None, the total after the slash, None when it was not requested
+    """
+    if not content_range or "/" not in content_range:
+        return None
+
+    total = content_range.rsplit("/", 1)[1]
+
+    return int(total) if total.isdigit() else None
+
+
+def row_type(name: str, columns: list) -> type:
+    """
+    Build a compact row class: one __slots__ attribute per column, no per-row __dict__.
+    Rows are created with row_class(**row) and turned back into dicts with as_dict().
+    :param name: str, class name
+    :param columns: list[str], column names, each must be a valid identifier
+    :return: type
+    """
+    columns = tuple(columns)
+
+    for column in columns:
+        if not column.isidentifier() or keyword.iskeyword(column):
+            raise ValueError(f"Column {column!r} is not a valid attribute name")
+
+    namespace = {}
+    # generated like collections.namedtuple so building a row is a plain function call
+    source = f"def __init__(self, {', '.join(f'{column}=None' for column in columns)}):\n" + \
+             "".join(f"    self.{column} = {column}\n" for column in columns) + \
+             ("" if columns else "    pass\n")
+    exec(source, namespace)
+
+    def as_dict(self) -> dict:
+        return {column: getattr(self, column) for column in columns}
+
+    def __repr__(self) -> str:
+        return f"{name}({', '.join(f'{column}={getattr(self, column)!r}' for column in columns)})"
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+
+        return all(getattr(self, column) == getattr(other, column) for column in columns)
+
+    return type(name, (), {"__slots__": columns, "__init__": namespace["__init__"], "as_dict": as_dict,
+                           "__repr__": __repr__, "__eq__": __eq__, "__hash__": None, "columns": columns})
+
+
+class RowDecoder:
+    """
+    Decodes a PostgREST JSON array straight from the response body, skipping postgrest's own parsing:
+    - without row_class, rows are dicts decoded by orjson (standard json when orjson is not installed)
+    - with a msgspec.Struct row_class and msgspec installed, the body is decoded into structs in one pass
+    - with any other row_class, e.g. one from row_type(), each row is built with row_class(**row)
+    """
+
+    def __init__(self, row_class: type = None):
+        """
+        :param row_class: type | None, row_type() class, msgspec.Struct subclass or any class taking the
+        columns as keyword arguments
+        """
+        self.row_class = row_class
+        self.__decoder = None
+
+        if row_class is not None and msgspec is not None and isinstance(row_class, type) and \
+                issubclass(row_class, msgspec.Struct):
+            self.__decoder = msgspec.json.Decoder(list[row_class])
+
+    @property
+    def backend(self) -> str:
+        if self.__decoder is not None:
+            return "msgspec"
+
+        return "orjson" if orjson is not None else "json"
+
+    @property
+    def name(self) -> str:
+        """
+        Identifies what decode() returns, e.g. in cache keys.
+        """
+        if self.row_class is None:
+            return "rows:dict"
+
+        return f"rows:{self.row_class.__module__}.{self.row_class.__qualname__}"
+
+    def decode(self, body: bytes) -> list:
+        """
+        :param body: bytes | memoryview, JSON array of rows
+        :return: list of dict or row_class instances
+        """
+        if self.__decoder is not None:
+            return self.__decoder.decode(body)
+
+        rows = fast_loads(body)
+
+        if self.row_class is None:
+            return rows
+
+        row_class = self.row_class
+
+        return [row_class(**row) for row in rows]
+
+
+def _raise_for_error(response):
+    from postgrest.exceptions import APIError, generate_default_error_message
+
+    try:
+        error = response.json()
+    except ValueError:
+        error = generate_default_error_message(response)
+
+    raise APIError(error if isinstance(error, dict) else {"message": str(error)})
+
+
+def fetch_body(query) -> tuple:
+    """
+    Send a built postgrest query and return its body untouched, postgrest never parses it.
+    :param query: SyncQueryRequestBuilder, e.g. client.from_(table).select(...).eq(...)
+    :return: tuple, (bytes body, int | None count from Content-Range)
+    """
+    response = query.session.request(query.http_method, query.path, json=query.json, params=query.params,
+                                     headers=query.headers)
+
+    if not response.is_success:
+        _raise_for_error(response)
+
+    return response.content, content_range_count(response.headers.get("content-range"))
+
+
+async def afetch_body(query) -> tuple:
+    """
+    asyncio counterpart of fetch_body.
+    :param query: AsyncQueryRequestBuilder
+    :return: tuple, (bytes body, int | None count from Content-Range)
+    """
+    response = await query.session.request(query.http_method, query.path, json=query.json, params=query.params,
+                                           headers=query.headers)
+
+    if not response.is_success:
+        _raise_for_error(response)
+
+    return response.content, content_range_count(response.headers.get("content-range"))
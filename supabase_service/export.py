@@ -0,0 +1,230 @@
+import csv
+import io
+import time
+
+from supabase_service.decoding import fast_loads
+from supabase_service.types import GenericResponse
+
+EXPORT_FORMATS = ("csv", "arrow", "parquet")
+
+
+class ExportReport:
+    """
+    Running tally of an export, handed to the progress callback after every page.
+    """
+
+    def __init__(self, table_name: str, destination: str, format: str):
+        self.table_name = table_name
+        self.destination = destination
+        self.format = format
+        self.rows = 0
+        self.pages = 0
+        self.bytes = 0
+        self.page_size = None
+        self.__started = time.perf_counter()
+
+    def page(self, rows: int, size: int, page_size: int):
+        self.rows += rows
+        self.pages += 1
+        self.bytes += size
+        self.page_size = page_size
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.__started
+
+    def as_dict(self) -> dict:
+        seconds = self.seconds
+
+        return {"table": self.table_name, "destination": self.destination, "format": self.format,
+                "rows": self.rows, "pages": self.pages, "bytes": self.bytes, "page_size": self.page_size,
+                "seconds": round(seconds, 3), "rows_per_second": round(self.rows / seconds, 2) if seconds else 0.0,
+                "mb_per_second": round(self.bytes / 1024 / 1024 / seconds, 2) if seconds else 0.0}
+
+    def response(self) -> GenericResponse:
+        return GenericResponse(status=200, message="Export successful", data=self.as_dict(), count=self.rows)
+
+
+class CsvSink:
+    """
+    Appends PostgREST text/csv pages to a file, keeping the header of the first page only.
+    """
+
+    accept = "text/csv"
+
+    def __init__(self, destination: str, order_by: str):
+        self.order_by = order_by
+        self.__file = open(destination, "w", newline="", encoding="utf-8")
+        self.__header = None
+
+    def write(self, body: bytes) -> tuple:
+        """
+        :param body: bytes, CSV page with its header line
+        :return: tuple, (rows in the page, order_by value of the last row)
+        """
+        text = body.decode("utf-8")
+        header, _, records = text.partition("\n")
+
+        if not records.strip():
+            return 0, None
+
+        if self.__header is None:
+            self.__header = next(csv.reader([header]))
+            self.__file.write(header + "\n")
+
+        if self.order_by not in self.__header:
+            raise ValueError(f"Order by column {self.order_by} is not in the exported columns")
+
+        index = self.__header.index(self.order_by)
+        rows = 0
+        last = None
+
+        # the C reader only walks the page to count records and find the last key, fields are not kept
+        for last in csv.reader(io.StringIO(records)):
+            rows += 1
+
+        self.__file.write(records if records.endswith("\n") else records + "\n")
+
+        return rows, last[index]
+
+    def close(self):
+        self.__file.close()
+
+
+class ArrowSink:
+    """
+    Writes JSON pages as record batches of an Arrow IPC file (format "arrow") or row groups of a Parquet file
+    (format "parquet"). The schema is taken from the first page, later pages are cast to it. Needs pyarrow.
+    """
+
+    accept = "application/json"
+
+    def __init__(self, destination: str, order_by: str, format: str = "arrow", compression: str = "snappy",
+                 schema=None):
+        """
+        :param schema: pyarrow.Schema | None, taken from the first page when None, give it when a column may be
+        null on the whole first page
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(f"pyarrow is required to export to {format}, install it with pip install pyarrow")
+
+        self.__pyarrow = pyarrow
+        self.destination = destination
+        self.order_by = order_by
+        self.format = format
+        self.compression = compression
+        self.__schema = schema
+        self.__writer = None
+
+    def write(self, body: bytes) -> tuple:
+        """
+        :param body: bytes, JSON array page
+        :return: tuple, (rows in the page, order_by value of the last row)
+        """
+        rows = fast_loads(body)
+
+        if not rows:
+            return 0, None
+
+        if self.order_by not in rows[-1]:
+            raise ValueError(f"Order by column {self.order_by} is not in the exported columns")
+
+        batch = self.__pyarrow.RecordBatch.from_pylist(rows, schema=self.__schema)
+
+        if self.__writer is None:
+            self.__schema = batch.schema
+            self.__writer = self.__open(batch.schema)
+
+        self.__writer.write_batch(batch)
+
+        return len(rows), rows[-1][self.order_by]
+
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+
+    def __open(self, schema):
+        if self.format == "parquet":
+            import pyarrow.parquet
+
+            return pyarrow.parquet.ParquetWriter(self.destination, schema, compression=self.compression)
+
+        import pyarrow.ipc
+
+        return pyarrow.ipc.new_file(self.destination, schema)
+
+
+class TableExport:
+    """
+    Keyset paginated export of one table into a sink. The services build each page query with query() and
+    hand the raw body to consume() until it returns False, so no page is ever held twice.
+    Pages shrink below page_size when needed to keep a page body under memory_limit, sized with the average
+    row size seen so far.
+    """
+
+    def __init__(self, table_name: str, destination: str, format: str = "csv", order_by: str = "id",
+                 page_size: int = 10_000, memory_limit: int = 32 * 1024 * 1024, progress=None,
+                 compression: str = "snappy", schema=None):
+        """
+        :param table_name: str
+        :param destination: str, file path
+        :param format: str, one of EXPORT_FORMATS
+        :param order_by: str, unique column the pages are ordered by
+        :param page_size: int, max rows per page
+        :param memory_limit: int, target bytes of a page body, 0 keeps page_size
+        :param progress: Callable[[ExportReport], None] | None, called after every page
+        :param compression: str, Parquet compression codec
+        :param schema: pyarrow.Schema | None, arrow and parquet only
+        """
+        if format == "csv":
+            self.sink = CsvSink(destination, order_by)
+        else:
+            self.sink = ArrowSink(destination, order_by, format=format, compression=compression, schema=schema)
+
+        self.report = ExportReport(table_name, destination, format)
+        self.order_by = order_by
+        self.max_page_size = page_size
+        self.page_size = page_size
+        self.memory_limit = memory_limit
+        self.progress = progress
+        self.__cursor = None
+
+    def query(self, query):
+        """
+        :param query: select request builder with the projection and where filters
+        :return: request builder of the next page
+        """
+        if self.__cursor is not None:
+            query = query.gt(self.order_by, self.__cursor)
+
+        query = query.order(self.order_by).limit(self.page_size)
+
+        return query.csv() if self.sink.accept == "text/csv" else query
+
+    def consume(self, body: bytes) -> bool:
+        """
+        :param body: bytes, page returned for the last query()
+        :return: bool, False once the table is exhausted
+        """
+        rows, last = self.sink.write(body)
+
+        # stop on the first empty page only, PostgREST max-rows may cap a page below page_size
+        if not rows:
+            return False
+
+        self.report.page(rows, len(body), self.page_size)
+        self.__cursor = last
+
+        if self.memory_limit:
+            self.page_size = max(1, min(self.max_page_size,
+                                        self.memory_limit * self.report.rows // max(self.report.bytes, 1)))
+
+        if self.progress is not None:
+            self.progress(self.report)
+
+        return True
+
+    def close(self):
+        self.sink.close()
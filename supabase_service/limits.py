@@ -0,0 +1,409 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+from supabase_service.metrics import Histogram
+
+# path prefix -> endpoint type, rate limits and concurrency windows are kept per type
+ENDPOINT_TYPES = (("/rest/v1", "rest"), ("/storage/v1", "storage"), ("/auth/v1", "auth"),
+                  ("/functions/v1", "functions"), ("/realtime/v1", "realtime"))
+
+# statuses telling the server or a proxy in front of it is overloaded
+OVERLOAD_STATUSES = (429, 503, 504)
+
+LIMIT_MODES = ("queue", "fail")
+
+_override = contextvars.ContextVar("supabase_service_limit_mode", default=None)
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def endpoint_type(path: str) -> str:
+    """
+    :param path: str, request path, e.g. /rest/v1/items
+    :return: str, "rest", "storage", "auth", "functions", "realtime" or "other"
+    """
+    for prefix, name in ENDPOINT_TYPES:
+        if path.startswith(prefix):
+            return name
+
+    return "other"
+
+
+def _parse_rates(value: str) -> dict:
+    """
+    :param value: str, e.g. "rest=100/200,auth=5", requests per second and an optional burst after the slash
+    :return: dict[str, tuple[float, float | None]]
+    """
+    rates = {}
+
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, limit = item.partition("=")
+        rate, _, burst = limit.partition("/")
+        rates[name.strip()] = (float(rate), float(burst) if burst else None)
+
+    return rates
+
+
+class TokenBucket:
+    """
+    rate tokens per second, up to burst saved. A queued caller reserves its token ahead, so callers are served
+    in arrival order and the bucket may go negative by the reserved tokens.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        if not rate or rate <= 0 or burst is not None and burst <= 0:
+            raise ValueError(f"Rate and burst must be positive, got {rate}/{burst}")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self.__updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Not thread-safe, the gate holding it locks.
+        :param max_wait: float seconds the caller accepts to wait, 0 for fail-fast
+        :return: float seconds to wait before sending, None when the wait would exceed max_wait
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+        wait = max(0.0, (1.0 - self.tokens) / self.rate)
+
+        if wait > max_wait:
+            return None
+
+        self.tokens -= 1.0
+
+        return wait
+
+
+class _Gate:
+    """
+    Token bucket and AIMD concurrency window of one endpoint type.
+    The window grows by about one slot per window of responses answered within latency_tolerance times the
+    best latency seen, holds while latency is above it, and is multiplied by decrease on 429/503/504 responses
+    and timeouts, at most once per baseline latency so one burst of rejections counts once.
+    """
+
+    def __init__(self, name: str, bucket: TokenBucket, initial: int, min_limit: int, max_limit: int,
+                 decrease: float, latency_tolerance: float):
+        self.name = name
+        self.bucket = bucket
+        self.limit = float(initial) if max_limit else None
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.overloads = 0
+        self.baseline = None
+        self.waits = Histogram()
+        self.condition = threading.Condition()
+        self.__async_waiters = set()
+        self.__decreased_at = 0.0
+
+    def try_acquire(self) -> bool:
+        if self.limit is None or self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+
+        return False
+
+    def release(self, latency: float, overloaded: bool):
+        with self.condition:
+            self.in_flight -= 1
+
+            if self.limit is not None:
+                self.__adjust(latency, overloaded)
+
+            self.condition.notify_all()
+            waiters, self.__async_waiters = self.__async_waiters, set()
+
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def add_async_waiter(self, loop, future):
+        self.__async_waiters.add((loop, future))
+
+    def discard_async_waiter(self, loop, future):
+        self.__async_waiters.discard((loop, future))
+
+    def __adjust(self, latency: float, overloaded: bool):
+        now = time.monotonic()
+
+        if overloaded:
+            self.overloads += 1
+
+            if now - self.__decreased_at >= (self.baseline or 0.0):
+                self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                self.__decreased_at = now
+
+            return
+
+        # the baseline follows the best latency and drifts up slowly, so it adapts when the service slows down
+        self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.01)
+
+        if latency <= self.baseline * self.latency_tolerance:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def as_dict(self) -> dict:
+        return {"rate": self.bucket.rate if self.bucket else None, "burst": self.bucket.burst if self.bucket else None,
+                "tokens": round(self.bucket.tokens, 3) if self.bucket else None,
+                "limit": int(self.limit) if self.limit is not None else None, "in_flight": self.in_flight,
+                "waiting": self.waiting, "acquired": self.acquired, "rejected": self.rejected,
+                "overloads": self.overloads, "latency_baseline": self.baseline,
+                "wait_p50": self.waits.percentile(0.5), "wait_p99": self.waits.percentile(0.99),
+                "wait_max": self.waits.max}
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Permit:
+    """
+    Slot taken by one request attempt, released with the outcome of the attempt.
+    """
+
+    __slots__ = ("gate", "started")
+
+    def __init__(self, gate: _Gate):
+        self.gate = gate
+        self.started = time.monotonic()
+
+    def release(self, status: int = None, timeout: bool = False):
+        """
+        :param status: int | None, response status, None when no response came back
+        :param timeout: bool, the attempt timed out
+        """
+        self.gate.release(time.monotonic() - self.started, timeout or status in OVERLOAD_STATUSES)
+
+
+class Limiter:
+    """
+    Client-side rate limiting and adaptive concurrency applied by the pooled sessions to every request attempt
+    of the services sharing them, per endpoint type (rest, storage, auth, functions, ...):
+    - an optional token bucket per type, requests per second with a burst
+    - an optional AIMD concurrency window per type, from initial up to max_concurrency in flight, off unless
+      max_concurrency is set so fan-out is only bounded by the connection pool
+    A request that cannot go yet waits up to max_wait seconds in "queue" mode, or is rejected at once in "fail"
+    mode; rejected requests raise RateLimitedError, which the services report like any failed call.
+    using() switches the mode for the calls of the current thread or task.
+    """
+
+    def __init__(self, rates: dict = None, initial_concurrency: int = 16, min_concurrency: int = 1,
+                 max_concurrency: int = 0, decrease: float = 0.5, latency_tolerance: float = 2.0,
+                 mode: str = "queue", max_wait: float = 30.0):
+        """
+        :param rates: dict[str, float | tuple[float, float]], endpoint type -> rate or (rate, burst), types left
+        out are not rate limited
+        :param initial_concurrency: int, window of each type before any response
+        :param min_concurrency: int
+        :param max_concurrency: int, upper bound of the concurrency windows, 0 (the default) disables them
+        :param decrease: float, factor the window is multiplied by on overload
+        :param latency_tolerance: float, the window grows while latency stays under this multiple of the best
+        latency seen
+        :param mode: str, "queue" or "fail"
+        :param max_wait: float seconds a queued request waits before it is rejected
+        """
+        if mode not in LIMIT_MODES:
+            raise ValueError(f"Mode must be one of {', '.join(LIMIT_MODES)}")
+
+        self.rates = {name: tuple(rate) if isinstance(rate, (tuple, list)) else (rate, None)
+                      for name, rate in (rates or {}).items()}
+
+        for name, (rate, burst) in self.rates.items():
+            if not rate or rate <= 0 or burst is not None and burst <= 0:
+                raise ValueError(f"Rate of {name} must be positive, got {rate}/{burst}")
+
+        if max_concurrency < 0 or max_concurrency and not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("Concurrency must satisfy 1 <= min <= max")
+        self.initial_concurrency = min(initial_concurrency, max_concurrency) if max_concurrency else initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.mode = mode
+        self.max_wait = max_wait
+        self.__gates = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Limiter":
+        """
+        Read SUPABASE_RATE_LIMITS (e.g. "rest=100/200,storage=20,auth=5"), SUPABASE_CONCURRENCY,
+        SUPABASE_CONCURRENCY_MAX, SUPABASE_LIMIT_MODE and SUPABASE_LIMIT_MAX_WAIT. Limiters built from the same
+        settings are one shared instance, so every service of the process draws from the same buckets.
+        :return: Limiter
+        """
+        limiter = cls(rates=_parse_rates(os.environ.get("SUPABASE_RATE_LIMITS")),
+                      initial_concurrency=int(os.environ.get("SUPABASE_CONCURRENCY", 16)),
+                      max_concurrency=int(os.environ.get("SUPABASE_CONCURRENCY_MAX", 0)),
+                      mode=os.environ.get("SUPABASE_LIMIT_MODE", "queue"),
+                      max_wait=float(os.environ.get("SUPABASE_LIMIT_MAX_WAIT", 30.0)))
+
+        with _shared_lock:
+            return _shared.setdefault(limiter.key, limiter)
+
+    @property
+    def key(self) -> tuple:
+        return (tuple(sorted(self.rates.items())), self.initial_concurrency, self.min_concurrency,
+                self.max_concurrency, self.decrease, self.latency_tolerance, self.mode, self.max_wait)
+
+    @contextlib.contextmanager
+    def using(self, mode: str, max_wait: float = None):
+        """
+        Queue or fail fast for the calls made inside the block by the current thread or task, e.g.
+        with database.limiter.using("fail"): ...
+        :param mode: str, "queue" or "fail"
+        :param max_wait: float seconds, self.max_wait when None
+        """
+        if mode not in LIMIT_MODES:
+            raise ValueError(f"Mode must be one of {', '.join(LIMIT_MODES)}")
+
+        token = _override.set((mode, self.max_wait if max_wait is None else max_wait))
+
+        try:
+            yield self
+        finally:
+            _override.reset(token)
+
+    def gate(self, path: str) -> _Gate:
+        name = endpoint_type(path)
+        gate = self.__gates.get(name)
+
+        if gate is None:
+            with self.__lock:
+                gate = self.__gates.get(name)
+
+                if gate is None:
+                    rate = self.rates.get(name)
+                    gate = self.__gates[name] = _Gate(
+                        name, TokenBucket(*rate) if rate else None, self.initial_concurrency, self.min_concurrency,
+                        self.max_concurrency, self.decrease, self.latency_tolerance)
+
+        return gate
+
+    def acquire(self, path: str) -> Permit:
+        """
+        Wait, in the calling thread, for a token and a slot of the endpoint type of path.
+        :param path: str, request path
+        :return: Permit | None, None when the request is rejected
+        """
+        gate = self.gate(path)
+        max_wait = self.__max_wait()
+        started = time.monotonic()
+        delay = self.__reserve(gate, max_wait)
+
+        if delay is None:
+            return None
+
+        if delay:
+            time.sleep(delay)
+
+        with gate.condition:
+            gate.waiting += 1
+
+            try:
+                acquired = gate.condition.wait_for(gate.try_acquire,
+                                                   timeout=max(max_wait - (time.monotonic() - started), 0.0))
+            finally:
+                gate.waiting -= 1
+
+            return self.__granted(gate, acquired, started)
+
+    async def aacquire(self, path: str) -> Permit:
+        """
+        asyncio counterpart of acquire, waits without blocking the loop.
+        :param path: str, request path
+        :return: Permit | None, None when the request is rejected
+        """
+        gate = self.gate(path)
+        max_wait = self.__max_wait()
+        started = time.monotonic()
+        delay = self.__reserve(gate, max_wait)
+
+        if delay is None:
+            return None
+
+        if delay:
+            await asyncio.sleep(delay)
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            with gate.condition:
+                if gate.try_acquire():
+                    return self.__granted(gate, True, started)
+
+                remaining = max_wait - (time.monotonic() - started)
+
+                if remaining <= 0:
+                    return self.__granted(gate, False, started)
+
+                future = loop.create_future()
+                gate.add_async_waiter(loop, future)
+                gate.waiting += 1
+
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with gate.condition:
+                    gate.waiting -= 1
+                    gate.discard_async_waiter(loop, future)
+
+    def stats(self) -> dict:
+        """
+        :return: dict[str, dict], endpoint type -> rate, burst, tokens, limit (current window), in_flight,
+        waiting, acquired, rejected, overloads, latency_baseline and wait_p50/p99/max seconds
+        """
+        with self.__lock:
+            gates = dict(self.__gates)
+
+        return {name: gate.as_dict() for name, gate in gates.items()}
+
+    def __max_wait(self) -> float:
+        override = _override.get()
+
+        if override is not None:
+            mode, max_wait = override
+        else:
+            mode, max_wait = self.mode, self.max_wait
+
+        return 0.0 if mode == "fail" else max_wait
+
+    @staticmethod
+    def __reserve(gate: _Gate, max_wait: float) -> float:
+        if gate.bucket is None:
+            return 0.0
+
+        with gate.condition:
+            delay = gate.bucket.reserve(max_wait)
+
+            if delay is None:
+                gate.rejected += 1
+
+            return delay
+
+    @staticmethod
+    def __granted(gate: _Gate, acquired: bool, started: float) -> Permit:
+        # called with gate.condition held
+        if not acquired:
+            gate.rejected += 1
+            return None
+
+        gate.acquired += 1
+        gate.waits.observe(time.monotonic() - started)
+
+        return Permit(gate)
@@ -0,0 +1,145 @@
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Iterator
+
+from supabase_service.metrics import submit
+
+
+def _timestamp(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def file_filter(extensions: list = None, min_size: int = None, max_size: int = None,
+                modified_since=None) -> Callable:
+    """
+    :param extensions: list[str], e.g. [".csv", "json"], compared case-insensitively
+    :param min_size: int bytes
+    :param max_size: int bytes
+    :param modified_since: datetime | str, ISO timestamp, naive values are UTC
+    :return: Callable[[dict], bool] accepting list entries, None when no condition is given
+    """
+    suffixes = tuple("." + extension.lower().lstrip(".") for extension in extensions or [])
+    since = _timestamp(modified_since) if modified_since else None
+
+    if not suffixes and min_size is None and max_size is None and since is None:
+        return None
+
+    def accept(entry: dict) -> bool:
+        if suffixes and not entry["name"].lower().endswith(suffixes):
+            return False
+
+        size = (entry.get("metadata") or {}).get("size")
+
+        if min_size is not None and (size is None or size < min_size):
+            return False
+
+        if max_size is not None and (size is None or size > max_size):
+            return False
+
+        if since is not None:
+            modified = entry.get("updated_at") or (entry.get("metadata") or {}).get("lastModified")
+
+            if not modified or _timestamp(modified) < since:
+                return False
+
+        return True
+
+    return accept
+
+
+def _split_page(folder: str, page: list, recursive: bool, accept: Callable, folders: deque) -> list:
+    """
+    :return: list[dict], accepted files of page with their full path under "path", sub folders go to folders
+    """
+    files = []
+
+    for entry in page:
+        path = f"{folder}/{entry['name']}" if folder else entry["name"]
+
+        if entry.get("id") is None:
+            if recursive:
+                folders.append((path, 0))
+        elif accept is None or accept(entry):
+            files.append({**entry, "path": path})
+
+    return files
+
+
+def walk_bucket(bucket, prefix: str = "", recursive: bool = True, page_size: int = 1000, workers: int = 4,
+                accept: Callable = None) -> Iterator[dict]:
+    """
+    List every file under prefix one page at a time, up to workers pages are requested at once across folders.
+    Files are yielded as their page arrives, in no particular order, so only the pages in flight and the folders
+    not listed yet are held in memory.
+    :param bucket: SyncBucket | SyncBucketProxy
+    :param prefix: str, folder to start from, the bucket root when empty
+    :param recursive: bool, descend into sub folders
+    :param page_size: int, entries per list request
+    :param workers: int, list requests in flight
+    :param accept: Callable[[dict], bool], see file_filter
+    :return: Iterator[dict], list entries with their full path in the bucket under "path"
+    """
+    folders = deque([((prefix or "").strip("/"), 0)])
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    try:
+        while folders or in_flight:
+            while folders and len(in_flight) < workers:
+                folder, offset = folders.popleft()
+                future = submit(executor, bucket.list, folder, {"limit": page_size, "offset": offset})
+                in_flight[future] = (folder, offset)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                folder, offset = in_flight.pop(future)
+                page = future.result()
+
+                if len(page) >= page_size:
+                    folders.appendleft((folder, offset + len(page)))
+
+                yield from _split_page(folder, page, recursive, accept, folders)
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+        executor.shutdown(wait=False)
+
+
+async def async_walk_bucket(bucket, prefix: str = "", recursive: bool = True, page_size: int = 1000,
+                            workers: int = 4, accept: Callable = None) -> AsyncIterator[dict]:
+    """
+    asyncio counterpart of walk_bucket.
+    :param bucket: AsyncBucket | AsyncBucketProxy
+    :return: AsyncIterator[dict]
+    """
+    folders = deque([((prefix or "").strip("/"), 0)])
+    in_flight = {}
+
+    try:
+        while folders or in_flight:
+            while folders and len(in_flight) < workers:
+                folder, offset = folders.popleft()
+                task = asyncio.ensure_future(bucket.list(folder, {"limit": page_size, "offset": offset}))
+                in_flight[task] = (folder, offset)
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                folder, offset = in_flight.pop(task)
+                page = task.result()
+
+                if len(page) >= page_size:
+                    folders.appendleft((folder, offset + len(page)))
+
+                for entry in _split_page(folder, page, recursive, accept, folders):
+                    yield entry
+    finally:
+        for task in in_flight:
+            task.cancel()
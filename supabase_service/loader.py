@@ -0,0 +1,231 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from supabase_service.types import GenericResponse
+
+
+def _with_id_column(table_columns: list, id_column: str) -> list:
+    if "*" in table_columns or id_column in table_columns:
+        return table_columns
+
+    return [*table_columns, id_column]
+
+
+def _split_rows(response: GenericResponse, ids: list, id_column: str) -> dict:
+    """
+    :return: dict[str, GenericResponse], one select_by_id-like response per requested id
+    """
+    if response.status != 200:
+        return {key: GenericResponse(status=response.status, message=response.message) for key in ids}
+
+    rows = {}
+
+    for row in response.data:
+        rows.setdefault(str(row[id_column]), []).append(row)
+
+    return {key: GenericResponse(status=200, message="Select successful", data=rows.get(key, []))
+            for key in ids}
+
+
+class BatchLoader:
+    """
+    Coalesces select_by_id calls made from many threads within window seconds into one select_by_ids request.
+    Concurrent loads of the same id share the request that is already pending or in flight.
+    """
+
+    def __init__(self, database, table_name: str, table_columns: list = ['*'], id_column: str = "id",
+                 window: float = 0.002, max_batch: int = 200):
+        """
+        :param database: SupabaseDatabase
+        :param table_name: str
+        :param table_columns: list, id_column is added when missing
+        :param id_column: str
+        :param window: float seconds
+        :param max_batch: int
+        """
+        self.database = database
+        self.table_name = table_name
+        self.table_columns = _with_id_column(table_columns, id_column)
+        self.id_column = id_column
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.__lock = threading.Lock()
+        self.__futures = {}
+        self.__pending = []
+        self.__timer = None
+
+    def load(self, id) -> GenericResponse:
+        """
+        :param id: int | str
+        :return: GenericResponse like SupabaseDatabase.select_by_id
+        """
+        if not id:
+            return GenericResponse(status=400, message="ID is required")
+
+        return self.__submit(id).result()
+
+    def load_many(self, ids: list) -> list:
+        """
+        :param ids: list
+        :return: list[GenericResponse] in the order of ids
+        """
+        futures = [self.__submit(id) for id in ids]
+
+        return [future.result() for future in futures]
+
+    def __submit(self, id) -> Future:
+        key = str(id)
+        dispatch_now = False
+
+        with self.__lock:
+            future = self.__futures.get(key)
+
+            if future is not None:
+                return future
+
+            future = Future()
+            self.__futures[key] = future
+            self.__pending.append(id)
+
+            if len(self.__pending) >= self.max_batch:
+                dispatch_now = True
+            elif self.__timer is None:
+                self.__timer = threading.Timer(self.window, self.__dispatch)
+                self.__timer.daemon = True
+                self.__timer.start()
+
+        if dispatch_now:
+            self.__dispatch()
+
+        return future
+
+    def __dispatch(self):
+        with self.__lock:
+            ids, self.__pending = self.__pending, []
+
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+
+        if not ids:
+            return
+
+        self.batches += 1
+        keys = [str(id) for id in ids]
+
+        try:
+            response = self.database.select_by_ids(table_name=self.table_name, ids=ids,
+                                                   table_columns=self.table_columns, id_column=self.id_column,
+                                                   chunk_size=self.max_batch)
+        except Exception as e:
+            response = GenericResponse(status=500, message=str(e))
+
+        results = _split_rows(response, keys, self.id_column)
+
+        with self.__lock:
+            futures = [self.__futures.pop(key) for key in keys]
+
+        for key, future in zip(keys, futures):
+            future.set_result(results[key])
+
+
+class AsyncBatchLoader:
+    """
+    Coalesces select_by_id calls awaited on one event loop into one select_by_ids request, sent after window
+    seconds or, with window 0, once every task scheduled in the current loop iteration had its turn.
+    Concurrent loads of the same id share the request that is already pending or in flight.
+    """
+
+    def __init__(self, database, table_name: str, table_columns: list = ['*'], id_column: str = "id",
+                 window: float = 0.0, max_batch: int = 200):
+        """
+        :param database: AsyncSupabaseDatabase
+        :param table_name: str
+        :param table_columns: list, id_column is added when missing
+        :param id_column: str
+        :param window: float seconds
+        :param max_batch: int
+        """
+        self.database = database
+        self.table_name = table_name
+        self.table_columns = _with_id_column(table_columns, id_column)
+        self.id_column = id_column
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.__futures = {}
+        self.__pending = []
+        self.__handle = None
+
+    async def load(self, id) -> GenericResponse:
+        """
+        :param id: int | str
+        :return: GenericResponse like AsyncSupabaseDatabase.select_by_id
+        """
+        if not id:
+            return GenericResponse(status=400, message="ID is required")
+
+        return await asyncio.shield(self.__submit(id))
+
+    async def load_many(self, ids: list) -> list:
+        """
+        :param ids: list
+        :return: list[GenericResponse] in the order of ids
+        """
+        return list(await asyncio.gather(*(asyncio.shield(self.__submit(id)) for id in ids)))
+
+    def __submit(self, id) -> asyncio.Future:
+        key = str(id)
+        future = self.__futures.get(key)
+
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__futures[key] = future
+        self.__pending.append(id)
+
+        if len(self.__pending) >= self.max_batch:
+            self.__schedule(loop, now=True)
+        elif self.__handle is None:
+            self.__schedule(loop)
+
+        return future
+
+    def __schedule(self, loop: asyncio.AbstractEventLoop, now: bool = False):
+        if self.__handle is not None:
+            self.__handle.cancel()
+
+        if now or not self.window:
+            self.__handle = loop.call_soon(self.__start_dispatch)
+        else:
+            self.__handle = loop.call_later(self.window, self.__start_dispatch)
+
+    def __start_dispatch(self):
+        ids, self.__pending = self.__pending, []
+        self.__handle = None
+
+        if ids:
+            asyncio.ensure_future(self.__dispatch(ids))
+
+    async def __dispatch(self, ids: list):
+        self.batches += 1
+        keys = [str(id) for id in ids]
+
+        try:
+            response = await self.database.select_by_ids(table_name=self.table_name, ids=ids,
+                                                          table_columns=self.table_columns,
+                                                          id_column=self.id_column, chunk_size=self.max_batch)
+        except Exception as e:
+            response = GenericResponse(status=500, message=str(e))
+
+        results = _split_rows(response, keys, self.id_column)
+
+        for key in keys:
+            future = self.__futures.pop(key)
+
+            if not future.done():
+                future.set_result(results[key])
@@ -0,0 +1,490 @@
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+from supabase_service.types import GenericResponse
+
+# seconds, upper bounds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# calls being timed in the current thread or task, innermost last, HTTP traffic is added to each of them
+_active_calls = contextvars.ContextVar("supabase_service_active_calls", default=())
+
+
+class Histogram:
+    """
+    Fixed bucket histogram, constant memory whatever the number of observations. Percentiles are interpolated
+    inside the bucket they fall in.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: float in [0, 1]
+        :return: float, 0.0 without observations
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+
+            seen += count
+
+        return self.max
+
+
+class Call:
+    """
+    One timed service call, filled in while it runs and handed to post hooks.
+    """
+
+    def __init__(self, service: str, method: str, target: str = None):
+        self.service = service
+        self.method = method
+        self.target = target
+        self.status = None
+        self.elapsed = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.requests = 0
+        self.retries = 0
+        self.error = None
+
+    def finish(self, response):
+        """
+        Take status and retries from the result of the call.
+        :param response: GenericResponse | object
+        :return: None
+        """
+        if isinstance(response, GenericResponse):
+            self.status = response.status
+
+            if isinstance(response.data, dict) and isinstance(response.data.get("retries"), int):
+                self.retries += response.data["retries"]
+
+    def as_dict(self) -> dict:
+        return {"service": self.service, "method": self.method, "target": self.target, "status": self.status,
+                "elapsed": self.elapsed, "request_bytes": self.request_bytes, "response_bytes": self.response_bytes,
+                "requests": self.requests, "retries": self.retries, "error": self.error}
+
+
+class _Series:
+
+    def __init__(self):
+        self.calls = 0
+        self.statuses = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.requests = 0
+        self.retries = 0
+        self.latency = Histogram()
+
+
+class _Timer:
+
+    def __init__(self, metrics: "Metrics", call: Call):
+        self.metrics = metrics
+        self.call = call
+        self.__token = None
+        self.__started = None
+
+    def __enter__(self) -> Call:
+        self.metrics.run_hooks(self.metrics.pre_hooks, self.call)
+        self.__token = _active_calls.set(_active_calls.get() + (self.call,))
+        self.__started = time.perf_counter()
+
+        return self.call
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.call.elapsed = time.perf_counter() - self.__started
+        _active_calls.reset(self.__token)
+
+        if exc_val is not None:
+            self.call.status = 500
+            self.call.error = str(exc_val)
+        elif self.call.status is None:
+            self.call.status = 200
+
+        self.metrics.record(self.call)
+
+
+class _Consumption:
+    """
+    Generator handed out by an instrumented method, its consumption timed as a call of its own,
+    <method>.iteration, from the first step until it is exhausted, fails or is closed. Only the traffic of its
+    steps is added to that call, not the one of the consumer between two steps.
+    """
+
+    def __init__(self, metrics: "Metrics", call: Call, iterator):
+        self.metrics = metrics
+        self.call = call
+        self.iterator = iterator
+        self.__started = None
+        self.__finished = False
+
+    def __getattr__(self, name: str):
+        return getattr(self.iterator, name)
+
+    def __del__(self):
+        # a consumer leaving a for loop early drops the generator without closing it
+        self._finish()
+
+    def _step(self):
+        """
+        :return: contextvars.Token, reset with _active_calls.reset once the step is over
+        """
+        if self.__started is None:
+            self.metrics.run_hooks(self.metrics.pre_hooks, self.call)
+            self.__started = time.perf_counter()
+
+        return _active_calls.set(_active_calls.get() + (self.call,))
+
+    def _finish(self, error: BaseException = None):
+        if self.__started is None or self.__finished:
+            return
+
+        self.__finished = True
+        self.call.elapsed = time.perf_counter() - self.__started
+
+        if error is not None:
+            self.call.status = 500
+            self.call.error = str(error)
+        else:
+            self.call.status = 200
+
+        self.metrics.record(self.call)
+
+
+class _MeteredIterator(_Consumption):
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        token = self._step()
+
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        finally:
+            _active_calls.reset(token)
+
+    def close(self):
+        self.iterator.close()
+        self._finish()
+
+
+class _MeteredAsyncIterator(_Consumption):
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = self._step()
+
+        try:
+            return await self.iterator.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        finally:
+            _active_calls.reset(token)
+
+    async def aclose(self):
+        await self.iterator.aclose()
+        self._finish()
+
+
+class Metrics:
+    """
+    Per service, method and target (table or bucket) call counts, status codes, latency histogram, HTTP request
+    count, request/response bytes and retries. Services record into the module-level metrics instance, set
+    service.metrics to another instance to keep them apart or to None to turn instrumentation off.
+    Bytes are read from Content-Length headers of the pooled HTTP sessions, so chunked bodies are not counted.
+    """
+
+    def __init__(self):
+        self.pre_hooks = []
+        self.post_hooks = []
+        self.__series = {}
+        self.__lock = threading.Lock()
+
+    def add_pre_hook(self, hook):
+        """
+        :param hook: Callable[[Call], None], called before every call, exceptions are ignored
+        :return: None
+        """
+        self.pre_hooks.append(hook)
+
+    def add_post_hook(self, hook):
+        """
+        :param hook: Callable[[Call], None], called after every call with its status, elapsed time, bytes and
+        retries filled in, exceptions are ignored
+        :return: None
+        """
+        self.post_hooks.append(hook)
+
+    def timer(self, service: str, method: str, target: str = None) -> _Timer:
+        """
+        Time a block as one call, e.g. a sequence of service calls or code outside the services:
+        with metrics.timer("jobs", "nightly_export") as call: ...
+        :param service: str
+        :param method: str
+        :param target: str | None, table or bucket
+        :return: context manager yielding the Call, set call.status to record something else than 200
+        """
+        return _Timer(self, Call(service, method, target))
+
+    def record(self, call: Call):
+        key = (call.service, call.method, call.target)
+
+        with self.__lock:
+            series = self.__series.get(key)
+
+            if series is None:
+                series = self.__series[key] = _Series()
+
+            series.calls += 1
+            series.statuses[call.status] = series.statuses.get(call.status, 0) + 1
+            series.request_bytes += call.request_bytes
+            series.response_bytes += call.response_bytes
+            series.requests += call.requests
+            series.retries += call.retries
+            series.latency.observe(call.elapsed or 0.0)
+
+        self.run_hooks(self.post_hooks, call)
+
+    @staticmethod
+    def run_hooks(hooks: list, call: Call):
+        for hook in hooks:
+            try:
+                hook(call)
+            except Exception:
+                pass
+
+    def snapshot(self) -> list:
+        """
+        :return: list[dict], one entry per service, method and target with counts, statuses, bytes, retries
+        and latency p50/p95/p99/max/mean in seconds
+        """
+        with self.__lock:
+            items = sorted(self.__series.items(), key=lambda item: tuple(str(part) for part in item[0]))
+
+            return [{"service": service, "method": method, "target": target, "calls": series.calls,
+                     "statuses": dict(series.statuses), "requests": series.requests,
+                     "request_bytes": series.request_bytes, "response_bytes": series.response_bytes,
+                     "retries": series.retries,
+                     "latency": {"p50": series.latency.percentile(0.5), "p95": series.latency.percentile(0.95),
+                                 "p99": series.latency.percentile(0.99), "max": series.latency.max,
+                                 "mean": series.latency.sum / series.latency.count if series.latency.count else 0.0}}
+                    for (service, method, target), series in items]
+
+    def prometheus(self, prefix: str = "supabase_service") -> str:
+        """
+        :param prefix: str, metric name prefix
+        :return: str, the metrics in the Prometheus text exposition format
+        """
+        families = {"calls_total": "counter", "latency_seconds": "histogram", "http_requests_total": "counter",
+                    "request_bytes_total": "counter", "response_bytes_total": "counter", "retries_total": "counter"}
+        samples = {family: [] for family in families}
+
+        with self.__lock:
+            for (service, method, target), series in sorted(self.__series.items(),
+                                                            key=lambda item: tuple(str(part) for part in item[0])):
+                labels = f'service="{_escape(service)}",method="{_escape(method)}",target="{_escape(target or "")}"'
+
+                for status, count in sorted(series.statuses.items(), key=lambda item: str(item[0])):
+                    samples["calls_total"].append(f'{{{labels},status="{status}"}} {count}')
+
+                cumulative = 0
+
+                for bound, count in zip((*series.latency.buckets, "+Inf"), series.latency.counts):
+                    cumulative += count
+                    samples["latency_seconds"].append(f'_bucket{{{labels},le="{bound}"}} {cumulative}')
+
+                samples["latency_seconds"].append(f"_sum{{{labels}}} {series.latency.sum}")
+                samples["latency_seconds"].append(f"_count{{{labels}}} {series.latency.count}")
+                samples["http_requests_total"].append(f"{{{labels}}} {series.requests}")
+                samples["request_bytes_total"].append(f"{{{labels}}} {series.request_bytes}")
+                samples["response_bytes_total"].append(f"{{{labels}}} {series.response_bytes}")
+                samples["retries_total"].append(f"{{{labels}}} {series.retries}")
+
+        lines = []
+
+        for family, kind in families.items():
+            lines.append(f"# TYPE {prefix}_{family} {kind}")
+            lines.extend(f"{prefix}_{family}{sample}" for sample in samples[family])
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.__lock:
+            self.__series.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+
+
+def _on_request(request):
+    calls = _active_calls.get()
+
+    if calls:
+        size = int(request.headers.get("content-length") or 0)
+
+        for call in calls:
+            call.requests += 1
+            call.request_bytes += size
+
+
+def _on_response(response):
+    calls = _active_calls.get()
+
+    if calls:
+        size = int(response.headers.get("content-length") or 0)
+
+        for call in calls:
+            call.response_bytes += size
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def count_retry():
+    """
+    Add a retried HTTP request to the calls being timed, called by the resilient transports.
+    :return: None
+    """
+    for call in _active_calls.get():
+        call.retries += 1
+
+
+def submit(executor, fn, *args):
+    """
+    executor.submit running fn in a copy of the caller's context, so the HTTP traffic of the worker is added to
+    the calls being timed by the caller.
+    :param executor: concurrent.futures.Executor
+    :param fn: Callable
+    :param args: arguments of fn
+    :return: Future
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def http_event_hooks(asynchronous: bool = False) -> dict:
+    """
+    :param asynchronous: bool, hooks for an httpx.AsyncClient
+    :return: dict, httpx event_hooks adding the traffic of a session to the calls being timed
+    """
+    if asynchronous:
+        return {"request": [_on_request_async], "response": [_on_response_async]}
+
+    return {"request": [_on_request], "response": [_on_response]}
+
+
+def _metered(metrics: Metrics, call: Call, data):
+    if inspect.isgenerator(data):
+        return _MeteredIterator(metrics, Call(call.service, f"{call.method}.iteration", call.target), data)
+
+    if inspect.isasyncgen(data):
+        return _MeteredAsyncIterator(metrics, Call(call.service, f"{call.method}.iteration", call.target), data)
+
+    return data
+
+
+def instrument(target: str = None):
+    """
+    Decorator timing a service method into self.metrics, the method name is the metric name.
+    The GenericResponse returned gets the elapsed seconds and the retried requests in its elapsed and retries
+    attributes. A generator in its data, e.g. the rows of select_iter, is wrapped so its consumption is timed too,
+    as <method>.iteration.
+    :param target: str, name of the parameter holding the table or bucket
+    """
+    def decorate(method):
+        parameters = list(inspect.signature(method).parameters)
+        position = parameters.index(target) if target else None
+
+        def target_of(args: tuple, kwargs: dict):
+            if target is None:
+                return None
+
+            if target in kwargs:
+                return kwargs[target]
+
+            return args[position - 1] if len(args) >= position else None
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                if self.metrics is None:
+                    return await method(self, *args, **kwargs)
+
+                with self.metrics.timer(type(self).__name__, method.__name__, target_of(args, kwargs)) as call:
+                    response = await method(self, *args, **kwargs)
+                    call.finish(response)
+
+                if isinstance(response, GenericResponse):
+                    response.elapsed = call.elapsed
+                    response.retries = call.retries
+                    response.data = _metered(self.metrics, call, response.data)
+
+                return response
+        else:
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                if self.metrics is None:
+                    return method(self, *args, **kwargs)
+
+                with self.metrics.timer(type(self).__name__, method.__name__, target_of(args, kwargs)) as call:
+                    response = method(self, *args, **kwargs)
+                    call.finish(response)
+
+                if isinstance(response, GenericResponse):
+                    response.elapsed = call.elapsed
+                    response.retries = call.retries
+                    response.data = _metered(self.metrics, call, response.data)
+
+                return response
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,40 @@
+import httpx
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_TIMEOUT
+from postgrest.utils import SyncClient as PostgrestHttpClient
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+
+    def __init__(self, base_url: str, pool_options, **kwargs):
+        self.__pool_options = pool_options
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return self.__pool_options.build_session(PostgrestHttpClient, timeout, verify, base_url=base_url,
+                                                 headers=headers)
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+
+    def __init__(self, base_url: str, pool_options, **kwargs):
+        self.__pool_options = pool_options
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return self.__pool_options.build_session(httpx.AsyncClient, timeout, verify, base_url=base_url,
+                                                 headers=headers)
+
+
+def build_client(supabase_url: str, headers: dict, pool_options, asynchronous: bool = False):
+    """
+    :param supabase_url: str
+    :param headers: dict, apikey and authorization headers
+    :param pool_options: PoolOptions
+    :param asynchronous: bool
+    :return: PooledPostgrestClient | PooledAsyncPostgrestClient
+    """
+    client_class = PooledAsyncPostgrestClient if asynchronous else PooledPostgrestClient
+
+    return client_class(f"{supabase_url}/rest/v1", pool_options, headers=headers, schema="public",
+                        timeout=DEFAULT_POSTGREST_CLIENT_TIMEOUT)
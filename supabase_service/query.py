@@ -0,0 +1,466 @@
+import functools
+import re
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, time
+
+# operator name -> PostgREST operator, is takes None/True/False, in a list
+OPERATORS = ("eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "in", "is")
+
+# PostgREST logic trees and in lists quote values holding any of these, like postgrest-py
+_RESERVED = re.compile(r"[,:()]")
+_PLAIN = re.compile(r"^\s*(\*|[A-Za-z_][A-Za-z0-9_$]*)\s*$")
+
+_Condition = namedtuple("_Condition", "column operator negated value")
+_Any = namedtuple("_Any", "resource alternatives negated")
+_Order = namedtuple("_Order", "resource column desc nulls_first")
+_Page = namedtuple("_Page", "resource limit offset")
+
+
+def _encode(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+
+    return str(value)
+
+
+def _quote(value) -> str:
+    value = _encode(value)
+
+    return f'"{value}"' if _RESERVED.search(value) else value
+
+
+def _in_list(values) -> str:
+    return "(" + ",".join(_quote(value) for value in values) + ")"
+
+
+def _is_literal(value) -> str:
+    return "null" if value is None else _encode(value)
+
+
+class Query:
+    """
+    Immutable filter, order and limit spec for SupabaseDatabase.select_all, update and delete, pushed down to
+    PostgREST (or to SQL with a direct connection) instead of filtering rows in Python. Every method returns a
+    new Query, so a base query can be shared and refined:
+
+        active = Query().is_("deleted_at", None)
+        recent = active.gte("created_at", since).order("created_at", desc=True).limit(50)
+        either = active.or_(Query().lt("age", 18), Query().gt("age", 65))
+
+    Columns may name embedded resources, e.g. gt("orders.total", 100). The text of a query depends on its
+    shape only (columns, operators, order, which limits are set), it is compiled once per shape and the values
+    are filled in on every call.
+    """
+
+    __slots__ = ("filters", "ordering", "pages", "_negate", "__shape")
+
+    def __init__(self, filters: tuple = (), ordering: tuple = (), pages: tuple = (), negate: bool = False):
+        self.filters = filters
+        self.ordering = ordering
+        self.pages = pages
+        self._negate = negate
+        self.__shape = None
+
+    @classmethod
+    def from_dict(cls, where: dict) -> "Query":
+        """
+        :param where: dict, equality filters
+        :return: Query
+        """
+        return cls(tuple(_Condition(column, "eq", False, value) for column, value in where.items()))
+
+    def eq(self, column: str, value) -> "Query":
+        return self.__filter(column, "eq", value)
+
+    def neq(self, column: str, value) -> "Query":
+        return self.__filter(column, "neq", value)
+
+    def gt(self, column: str, value) -> "Query":
+        return self.__filter(column, "gt", value)
+
+    def gte(self, column: str, value) -> "Query":
+        return self.__filter(column, "gte", value)
+
+    def lt(self, column: str, value) -> "Query":
+        return self.__filter(column, "lt", value)
+
+    def lte(self, column: str, value) -> "Query":
+        return self.__filter(column, "lte", value)
+
+    def like(self, column: str, pattern: str) -> "Query":
+        """
+        :param column: str
+        :param pattern: str, % or * match any characters
+        :return: Query
+        """
+        return self.__filter(column, "like", pattern)
+
+    def ilike(self, column: str, pattern: str) -> "Query":
+        return self.__filter(column, "ilike", pattern)
+
+    def in_(self, column: str, values) -> "Query":
+        """
+        :param column: str
+        :param values: Iterable, an empty one matches no row
+        :return: Query
+        """
+        if isinstance(values, (str, bytes)):
+            raise ValueError("In values must be a list")
+
+        return self.__filter(column, "in", tuple(values))
+
+    def is_(self, column: str, value) -> "Query":
+        """
+        :param column: str
+        :param value: None | bool, IS NULL, IS TRUE or IS FALSE
+        :return: Query
+        """
+        if value not in (None, True, False) or isinstance(value, int) and not isinstance(value, bool):
+            raise ValueError("Is value must be None, True or False")
+
+        return self.__filter(column, "is", value)
+
+    @property
+    def not_(self) -> "Query":
+        """
+        Negate the next filter or or_, e.g. Query().not_.is_("email", None).
+        """
+        return Query(self.filters, self.ordering, self.pages, negate=True)
+
+    def or_(self, *alternatives: "Query", resource: str = None) -> "Query":
+        """
+        Rows matching any of the alternatives, each one the AND of its own filters, or none of them after not_.
+        :param alternatives: Query, filters only
+        :param resource: str | None, embedded resource the alternatives apply to
+        :return: Query
+        """
+        if not alternatives:
+            raise ValueError("Or needs at least one alternative")
+
+        for alternative in alternatives:
+            if not isinstance(alternative, Query) or not alternative.filters:
+                raise ValueError("Or alternatives must be queries with filters")
+
+            if alternative.ordering or alternative.pages:
+                raise ValueError("Or alternatives cannot order or limit")
+
+        any_of = _Any(resource, tuple(alternative.filters for alternative in alternatives), self._negate)
+
+        return Query(self.filters + (any_of,), self.ordering, self.pages)
+
+    def order(self, column: str, desc: bool = False, nulls_first: bool = None, resource: str = None) -> "Query":
+        """
+        Add a sort key after the existing ones.
+        :param column: str
+        :param desc: bool
+        :param nulls_first: bool | None, the database default (nulls last ascending, first descending) when None
+        :param resource: str | None, orders the rows of this embedded resource
+        :return: Query
+        """
+        return Query(self.filters, self.ordering + (_Order(resource, column, desc, nulls_first),), self.pages)
+
+    def limit(self, count: int, resource: str = None) -> "Query":
+        """
+        :param count: int, max rows
+        :param resource: str | None, limits the rows of this embedded resource
+        :return: Query
+        """
+        if count < 0:
+            raise ValueError("Limit must not be negative")
+
+        return self.__page(_Page(resource, count, None))
+
+    def range(self, start: int, end: int, resource: str = None) -> "Query":
+        """
+        :param start: int, offset of the first row
+        :param end: int, offset of the last row, inclusive
+        :param resource: str | None
+        :return: Query
+        """
+        if start < 0 or end < start - 1:
+            raise ValueError("Range must satisfy 0 <= start <= end + 1")
+
+        return self.__page(_Page(resource, end - start + 1, start))
+
+    @property
+    def shape(self) -> tuple:
+        """
+        The query without its values, hashable, what the compiled templates are cached on.
+        """
+        if self.__shape is None:
+            self.__shape = (tuple(_node_shape(node) for node in self.filters), self.ordering,
+                            tuple((page.resource, page.limit is not None, page.offset is not None)
+                                  for page in self.pages))
+
+        return self.__shape
+
+    @property
+    def values(self) -> list:
+        """
+        Filter values in the order of the compiled placeholders, is_ values are part of the shape.
+        """
+        values = []
+
+        for node in self.filters:
+            _node_values(node, values)
+
+        return values
+
+    @property
+    def page_values(self) -> list:
+        """
+        limit and offset values in the order of the compiled placeholders.
+        """
+        return [value for page in self.pages for value in (page.limit, page.offset) if value is not None]
+
+    @property
+    def plain(self) -> bool:
+        """
+        True when every column is a plain column of the table, so the query also maps to SQL.
+        """
+        return all(_PLAIN.match(column) for column in _columns(self.filters)) and \
+            all(_PLAIN.match(order.column) and order.resource is None for order in self.ordering) and \
+            all(page.resource is None for page in self.pages) and \
+            all(node.resource is None for node in _nodes(self.filters) if isinstance(node, _Any))
+
+    def postgrest_params(self) -> list:
+        """
+        :return: list[tuple[str, str]], PostgREST query string parameters
+        """
+        values = iter(self.values + self.page_values)
+
+        return [(key, template.format(*(encode(next(values)) for encode in encoders)))
+                for key, template, encoders in _postgrest_template(self.shape)]
+
+    def __filter(self, column: str, operator: str, value) -> "Query":
+        if not column or not column.strip():
+            raise ValueError("Column is required")
+
+        return Query(self.filters + (_Condition(column, operator, self._negate, value),), self.ordering,
+                     self.pages)
+
+    def __page(self, page: _Page) -> "Query":
+        pages = tuple(existing for existing in self.pages if existing.resource != page.resource) + (page,)
+
+        return Query(self.filters, self.ordering, pages)
+
+    def __repr__(self):
+        return f"Query({self.shape!r}, {self.values!r}, {self.page_values!r})"
+
+
+def as_query(where) -> Query:
+    """
+    :param where: dict | Query | None
+    :return: Query, equality filters for a dict
+    """
+    if isinstance(where, Query):
+        return where
+
+    return Query.from_dict(where) if where else Query()
+
+
+def apply_filters(builder, where):
+    """
+    Add the compiled parameters of where to a postgrest request builder in one step instead of one
+    filter call, and one copy of the parameters, per condition.
+    :param builder: postgrest request builder
+    :param where: dict | Query | None
+    :return: the builder
+    """
+    if not where:
+        return builder
+
+    if isinstance(where, dict):
+        params = [(_quote(column), "eq." + _encode(value)) for column, value in where.items()]
+    else:
+        params = where.postgrest_params()
+
+    if params:
+        builder.params = type(builder.params)(builder.params.multi_items() + params)
+
+    return builder
+
+
+_select_builders = weakref.WeakKeyDictionary()
+_select_builders_lock = threading.Lock()
+
+
+def select_builder(client, table_name: str, columns: str, count=None, max_templates: int = 1024):
+    """
+    client.from_(table_name).select(columns, count=count), copied from a template kept per client and shape
+    instead of being rebuilt on every call.
+    :param client: SyncPostgrestClient | AsyncPostgrestClient
+    :param table_name: str
+    :param columns: str
+    :param count: CountMethod | None
+    :param max_templates: int, least recently used shapes are dropped past this
+    :return: select request builder, free to be refined
+    """
+    key = (table_name, columns, count)
+
+    with _select_builders_lock:
+        templates = _select_builders.get(client)
+
+        if templates is None:
+            templates = _select_builders[client] = OrderedDict()
+
+        template = templates.get(key)
+
+        if template is not None:
+            templates.move_to_end(key)
+
+    # a client whose session was replaced gets new templates
+    if template is None or template.session is not client.session:
+        template = client.from_(table_name).select(columns, count=count)
+
+        with _select_builders_lock:
+            templates[key] = template
+
+            while len(templates) > max_templates:
+                templates.popitem(last=False)
+
+    builder = object.__new__(type(template))
+    builder.__dict__.update(template.__dict__)
+    # csv() and single() change the headers in place
+    builder.headers = template.headers.copy()
+
+    return builder
+
+
+def plain_columns(table_columns: list) -> bool:
+    """
+    :param table_columns: list
+    :return: bool, False when a column embeds a resource, renames or casts, which only PostgREST understands
+    """
+    return all(_PLAIN.match(name) for columns in table_columns for name in columns.split(","))
+
+
+def embed(resource: str, columns: list = ("*",), alias: str = None, inner: bool = False, hint: str = None) -> str:
+    """
+    Projection of an embedded resource for table_columns, e.g. embed("orders", ["id", "total"], inner=True)
+    gives "orders!inner(id,total)".
+    :param resource: str, related table
+    :param columns: list, may hold embed() results for nested resources
+    :param alias: str | None, key of the resource in the returned rows
+    :param inner: bool, only rows with at least one related row, needed to filter parents on the resource
+    :param hint: str | None, foreign key or column disambiguating several relationships
+    :return: str
+    """
+    name = f"{alias}:{resource}" if alias else resource
+
+    if hint:
+        name += f"!{hint}"
+
+    if inner:
+        name += "!inner"
+
+    return f"{name}({','.join(columns)})"
+
+
+def _nodes(filters: tuple):
+    for node in filters:
+        yield node
+
+        if isinstance(node, _Any):
+            for alternative in node.alternatives:
+                yield from _nodes(alternative)
+
+
+def _columns(filters: tuple):
+    return (node.column for node in _nodes(filters) if isinstance(node, _Condition))
+
+
+def _node_shape(node) -> tuple:
+    if isinstance(node, _Any):
+        return "not.or" if node.negated else "or", node.resource, tuple(
+            tuple(_node_shape(child) for child in alternative) for alternative in node.alternatives)
+
+    return node.column, node.operator, node.negated, node.value if node.operator == "is" else None
+
+
+def _node_values(node, values: list):
+    if isinstance(node, _Any):
+        for alternative in node.alternatives:
+            for child in alternative:
+                _node_values(child, values)
+    elif node.operator != "is":
+        values.append(node.value)
+
+
+def _tree(shape: tuple, encoders: list) -> str:
+    """
+    One node of a PostgREST logic tree, column.operator.value, or(...), not.or(...) or and(...).
+    """
+    if shape[0] in ("or", "not.or") and len(shape) == 3:
+        alternatives = []
+
+        for alternative in shape[2]:
+            children = ",".join(_tree(child, encoders) for child in alternative)
+            alternatives.append(children if len(alternative) == 1 else f"and({children})")
+
+        return f"{shape[0]}({','.join(alternatives)})"
+
+    column, operator, negated, literal = shape
+    prefix = f"{column}.{'not.' if negated else ''}{operator}."
+
+    if operator == "is":
+        return prefix + _is_literal(literal)
+
+    encoders.append(_in_list if operator == "in" else _quote)
+
+    return prefix + "{}"
+
+
+@functools.lru_cache(maxsize=1024)
+def _postgrest_template(shape: tuple) -> tuple:
+    """
+    :return: tuple[tuple[str, str, tuple]], (parameter, value template, encoder of each placeholder)
+    """
+    filters, ordering, pages = shape
+    templates = []
+
+    for node in filters:
+        encoders = []
+
+        if node[0] in ("or", "not.or") and len(node) == 3:
+            key = f"{node[1]}.{node[0]}" if node[1] else node[0]
+            # the or(...) node without its name, as PostgREST expects it at the top level
+            template = _tree(node, encoders)[len(node[0]):]
+        else:
+            column, operator, negated, literal = node
+            key = _quote(column)
+            template = f"{'not.' if negated else ''}{operator}."
+
+            if operator == "is":
+                template += _is_literal(literal)
+            else:
+                template += "{}"
+                encoders.append(_in_list if operator == "in" else _encode)
+
+        templates.append((key, template, tuple(encoders)))
+
+    orders = {}
+
+    for resource, column, desc, nulls_first in ordering:
+        orders.setdefault(resource, []).append(
+            f"{column}{'.desc' if desc else ''}"
+            f"{'' if nulls_first is None else '.nullsfirst' if nulls_first else '.nullslast'}")
+
+    for resource, terms in orders.items():
+        templates.append((f"{resource}.order" if resource else "order", ",".join(terms), ()))
+
+    for resource, has_limit, has_offset in pages:
+        prefix = f"{resource}." if resource else ""
+
+        if has_limit:
+            templates.append((prefix + "limit", "{}", (str,)))
+
+        if has_offset:
+            templates.append((prefix + "offset", "{}", (str,)))
+
+    return tuple(templates)
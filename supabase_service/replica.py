@@ -0,0 +1,462 @@
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _index_key(value):
+    # json and array columns are indexed by their canonical encoding
+    return json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value
+
+
+def _commit_time(commit_timestamp: str) -> float:
+    """
+    :param commit_timestamp: str | None, e.g. "2024-05-01T10:00:00.123Z"
+    :return: float | None, epoch seconds
+    """
+    if not commit_timestamp:
+        return None
+
+    try:
+        return datetime.fromisoformat(commit_timestamp.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class TableReplica:
+    """
+    In-memory copy of a table, kept current by the INSERT/UPDATE/DELETE events of a realtime postgres_changes
+    channel, so reads are dictionary lookups instead of requests. Rows are indexed by primary_key and by each
+    column of indexes.
+    On every (re)connection the channel is subscribed first, then the table is loaded with select_iter while
+    the events received meanwhile are buffered and replayed on top of the load, so no change is missed.
+    The realtime client is asyncio only: start() runs it on a thread of its own for SupabaseDatabase, astart()
+    on the running loop for AsyncSupabaseDatabase.
+    The table must be in the supabase_realtime publication. Rows handed out are shared, do not mutate them.
+    """
+
+    def __init__(self, database, table_name: str, primary_key: str = "id", indexes: tuple = (),
+                 table_columns: list = ['*'], schema: str = "public", page_size: int = 1000,
+                 heartbeat: float = 25.0, reconnect_backoff: float = 1.0, max_backoff: float = 30.0):
+        """
+        :param database: SupabaseDatabase | AsyncSupabaseDatabase
+        :param table_name: str
+        :param primary_key: str, unique column the rows are keyed and loaded by
+        :param indexes: tuple[str], columns with a secondary index for find()
+        :param table_columns: list, columns kept, must contain primary_key and indexes
+        :param schema: str
+        :param page_size: int, rows per select_iter page while loading
+        :param heartbeat: float seconds between two realtime heartbeats
+        :param reconnect_backoff: float seconds before the first reconnection, doubled after each failure
+        :param max_backoff: float seconds
+        """
+        if "*" not in table_columns:
+            missing = [column for column in (primary_key, *indexes) if column not in table_columns]
+
+            if missing:
+                raise ValueError(f"Columns {', '.join(missing)} must be in table_columns")
+
+        self.database = database
+        self.table_name = table_name
+        self.primary_key = primary_key
+        self.indexes = tuple(indexes)
+        self.table_columns = table_columns
+        self.schema = schema
+        self.page_size = page_size
+        self.heartbeat = heartbeat
+        self.reconnect_backoff = reconnect_backoff
+        self.max_backoff = max_backoff
+        self.events = 0
+        self.resyncs = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.__rows = {}
+        self.__index = {column: {} for column in self.indexes}
+        self.__lock = threading.Lock()
+        self.__buffer = None
+        self.__synced = threading.Event()
+        self.__connected = False
+        self.__last_sync = None
+        self.__last_event = None
+        self.__lag = None
+        self.__stale_since = time.time()
+        self.__loop = None
+        self.__task = None
+        self.__thread = None
+        self.__client = None
+        self.__stopping = False
+
+    # reads
+
+    def get(self, key, default=None) -> dict:
+        """
+        :param key: primary key value
+        :param default: returned when no row has key
+        :return: dict
+        """
+        return self.__rows.get(key, default)
+
+    def find(self, column: str, value) -> list:
+        """
+        :param column: str, an indexed column, other columns are scanned
+        :param value: value the rows must have in column
+        :return: list[dict]
+        """
+        with self.__lock:
+            index = self.__index.get(column)
+
+            if index is not None:
+                return list(index.get(_index_key(value), {}).values())
+
+            return [row for row in self.__rows.values() if row.get(column) == value]
+
+    def select(self, where: dict = None) -> list:
+        """
+        Local counterpart of SupabaseDatabase.select_all(where=...), narrowed with an index when one matches.
+        :param where: dict, equality filters
+        :return: list[dict]
+        """
+        if not where:
+            return self.rows()
+
+        if self.primary_key in where:
+            row = self.get(where[self.primary_key])
+            rows = [row] if row is not None else []
+        else:
+            column = next((column for column in where if column in self.__index), None)
+            rows = self.find(column, where[column]) if column is not None else self.rows()
+
+        return [row for row in rows if all(row.get(k) == v for k, v in where.items())]
+
+    def rows(self) -> list:
+        with self.__lock:
+            return list(self.__rows.values())
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__rows
+
+    # state
+
+    @property
+    def synced(self) -> bool:
+        """
+        True while the replica is loaded and its channel connected.
+        """
+        return self.__synced.is_set() and self.__connected
+
+    @property
+    def staleness(self) -> float:
+        """
+        Seconds the replica may have missed changes for: 0.0 while synced, else time since the channel was lost
+        (or the replica created).
+        """
+        return 0.0 if self.synced else time.time() - self.__stale_since
+
+    def stats(self) -> dict:
+        """
+        :return: dict, rows, synced, connected, staleness seconds, lag seconds between the commit and the receipt
+        of the last event, last_sync and last_event epoch seconds, events, resyncs, reconnects and last_error
+        """
+        return {"table": self.table_name, "rows": len(self.__rows), "synced": self.synced,
+                "connected": self.__connected, "staleness": round(self.staleness, 3), "lag": self.__lag,
+                "last_sync": self.__last_sync, "last_event": self.__last_event, "events": self.events,
+                "resyncs": self.resyncs, "reconnects": self.reconnects, "last_error": self.last_error}
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the first load is done.
+        :param timeout: float seconds | None
+        :return: bool, False on timeout
+        """
+        return self.__synced.wait(timeout)
+
+    # lifecycle
+
+    def start(self, timeout: float = 10.0) -> "TableReplica":
+        """
+        Run the replica on a thread of its own, for SupabaseDatabase.
+        :param timeout: float seconds to wait for the first load, it goes on in the background past it
+        :return: TableReplica
+        """
+        if self.__thread is None:
+            self.__stopping = False
+            self.__thread = threading.Thread(target=self.__run_thread, name=f"supabase-replica-{self.table_name}",
+                                             daemon=True)
+            self.__thread.start()
+
+        self.wait(timeout)
+
+        return self
+
+    def stop(self):
+        """
+        Close the channel and stop the thread started by start().
+        :return: None
+        """
+        thread, loop = self.__thread, self.__loop
+
+        if thread is None:
+            return
+
+        self.__stopping = True
+
+        if loop is not None and self.__task is not None:
+            loop.call_soon_threadsafe(self.__task.cancel)
+
+        thread.join()
+        self.__thread = None
+
+    async def astart(self, timeout: float = 10.0) -> "TableReplica":
+        """
+        Run the replica as a task of the running loop, for AsyncSupabaseDatabase.
+        :param timeout: float seconds to wait for the first load, it goes on in the background past it
+        :return: TableReplica
+        """
+        if self.__task is None:
+            self.__stopping = False
+            self.__loop = asyncio.get_running_loop()
+            self.__task = asyncio.ensure_future(self.run())
+
+        deadline = time.monotonic() + timeout
+
+        while not self.__synced.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+        return self
+
+    async def astop(self):
+        """
+        Close the channel and cancel the task started by astart().
+        :return: None
+        """
+        task, self.__task = self.__task, None
+        self.__stopping = True
+
+        if task is not None:
+            task.cancel()
+
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def __run_thread(self):
+        self.__loop = asyncio.new_event_loop()
+        self.__task = self.__loop.create_task(self.run())
+
+        try:
+            self.__loop.run_until_complete(self.__task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.__loop.close()
+            self.__loop = None
+            self.__task = None
+
+    async def run(self):
+        """
+        Connect, load and apply changes until cancelled, reconnecting with exponential backoff and loading the
+        table again after every reconnection.
+        :return: None
+        """
+        backoff = self.reconnect_backoff
+
+        try:
+            while not self.__stopping:
+                try:
+                    await self.__session()
+                    backoff = self.reconnect_backoff
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning("Replica of %s lost its channel: %s", self.table_name, e)
+
+                self.__lost()
+
+                if self.__stopping:
+                    break
+
+                self.reconnects += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        finally:
+            self.__lost()
+            await self.__close_client()
+
+    async def __session(self):
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+        client = self.__client = AsyncRealtimeClient(f"{self.database._get_client.supabase_url}/realtime/v1",
+                                                     self.database._get_client.supabase_key,
+                                                     hb_interval=self.heartbeat)
+        await client.connect()
+
+        # listen() of realtime 2.0.2 only returns once a heartbeat fails, the listener alone returns when the
+        # socket closes, which is what triggers the reconnection here
+        listener = asyncio.ensure_future(client._listen())
+        heartbeat = asyncio.ensure_future(client._heartbeat())
+        subscribed = asyncio.get_running_loop().create_future()
+
+        def on_subscribe(status, error):
+            if subscribed.done():
+                return
+
+            if status == RealtimeSubscribeStates.SUBSCRIBED:
+                subscribed.set_result(None)
+            else:
+                subscribed.set_exception(error or ConnectionError(f"Channel {status}"))
+
+        try:
+            self.__buffer = []
+            channel = client.channel(f"replica:{self.schema}.{self.table_name}")
+            channel.on_postgres_changes("*", self.__on_change, table=self.table_name, schema=self.schema)
+            await channel.subscribe(on_subscribe)
+            await asyncio.wait_for(asyncio.shield(subscribed), client.timeout)
+            await self.__resync()
+            await listener
+        finally:
+            heartbeat.cancel()
+            listener.cancel()
+            await self.__close_client()
+
+    async def __close_client(self):
+        client, self.__client = self.__client, None
+
+        if client is not None and client.is_connected:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+    async def __resync(self):
+        rows, index = {}, {column: {} for column in self.indexes}
+
+        # built aside and swapped in, readers keep the previous copy until then
+        for row in await self.__load():
+            self.__put(row, rows, index)
+
+        with self.__lock:
+            self.__rows, self.__index = rows, index
+            buffered, self.__buffer = self.__buffer, None
+
+        # events received while loading are replayed in order on top of it, each carries the full new row
+        for payload in buffered:
+            self.__apply(payload)
+
+        self.resyncs += 1
+        self.__connected = True
+        self.__last_sync = time.time()
+        self.__synced.set()
+
+    async def __load(self) -> list:
+        options = dict(table_name=self.table_name, table_columns=self.table_columns, order_by=self.primary_key,
+                       page_size=self.page_size, pages=True)
+
+        if inspect.iscoroutinefunction(self.database.select_iter):
+            response = await self.database.select_iter(**options)
+
+            if response.status != 200:
+                raise ConnectionError(response.message)
+
+            return [row async for page in response.data for row in page]
+
+        def load() -> list:
+            response = self.database.select_iter(**options)
+
+            if response.status != 200:
+                raise ConnectionError(response.message)
+
+            return [row for page in response.data for row in page]
+
+        # the sync service blocks, the listener keeps buffering events meanwhile
+        return await asyncio.get_running_loop().run_in_executor(None, load)
+
+    def __lost(self):
+        if self.__connected or self.__stale_since is None:
+            self.__stale_since = time.time()
+
+        self.__connected = False
+
+    def __on_change(self, payload: dict):
+        if self.__buffer is not None:
+            self.__buffer.append(payload)
+        else:
+            self.__apply(payload)
+
+    def __apply(self, payload: dict):
+        data = payload.get("data", payload)
+        kind = (data.get("type") or data.get("eventType") or "").upper()
+        record, old_record = data.get("record") or {}, data.get("old_record") or {}
+
+        with self.__lock:
+            if kind in ("INSERT", "UPDATE"):
+                old_key = old_record.get(self.primary_key)
+
+                if old_key is not None and old_key != record.get(self.primary_key):
+                    self.__remove(old_key)
+
+                self.__put(record)
+            elif kind == "DELETE":
+                self.__remove(old_record.get(self.primary_key))
+            else:
+                return
+
+        self.events += 1
+        self.__last_event = time.time()
+        committed = _commit_time(data.get("commit_timestamp"))
+
+        if committed is not None:
+            self.__lag = round(max(self.__last_event - committed, 0.0), 6)
+
+    def __put(self, record: dict, rows: dict = None, indexes: dict = None):
+        rows = self.__rows if rows is None else rows
+        indexes = self.__index if indexes is None else indexes
+
+        if "*" not in self.table_columns:
+            record = {column: record.get(column) for column in self.table_columns}
+
+        key = record[self.primary_key]
+        self.__remove(key, rows, indexes)
+        rows[key] = record
+
+        for column, index in indexes.items():
+            index.setdefault(_index_key(record.get(column)), {})[key] = record
+
+    def __remove(self, key, rows: dict = None, indexes: dict = None):
+        rows = self.__rows if rows is None else rows
+        indexes = self.__index if indexes is None else indexes
+        row = rows.pop(key, None)
+
+        if row is None:
+            return
+
+        for column, index in indexes.items():
+            value = _index_key(row.get(column))
+            rows = index.get(value)
+
+            if rows is not None:
+                rows.pop(key, None)
+
+                if not rows:
+                    del index[value]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    async def __aenter__(self):
+        return await self.astart()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.astop()
@@ -0,0 +1,258 @@
+import contextlib
+import contextvars
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+
+from supabase_service.metrics import count_retry
+from supabase_service.transfer import backoff
+
+if TYPE_CHECKING:
+    import httpx
+
+# reads sent as POST, retried like GET. RPCs may write, they are only retried inside policy.idempotent_calls()
+IDEMPOTENT_PATHS = (r"/storage/v1/object/list/",)
+
+# set by ResiliencePolicy.idempotent_calls() for the current thread or task
+_idempotent_calls = contextvars.ContextVar("supabase_service_idempotent_calls", default=False)
+
+
+class CircuitBreaker:
+    """
+    Opens after failures consecutive 5xx responses or transport errors, rejects requests for reset_timeout seconds,
+    then lets a single probe through: its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failures: int = 5, reset_timeout: float = 30.0):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.__probing = False
+        self.__lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.__lock:
+            if self.state == "closed":
+                return True
+
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.__probing = False
+
+            if self.state == "half_open" and not self.__probing:
+                self.__probing = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def success(self):
+        with self.__lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.__probing = False
+
+    def abandon(self):
+        """
+        The request let through by allow() ended without a verdict (rate limited, cancelled), a half open breaker
+        lets the next request probe instead.
+        """
+        with self.__lock:
+            self.__probing = False
+
+    def failure(self):
+        with self.__lock:
+            self.consecutive_failures += 1
+            self.__probing = False
+
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, "rejected": self.rejected}
+
+
+class ResiliencePolicy:
+    """
+    Retry, hedging and circuit breaking applied by the pooled HTTP sessions to every request of the services.
+    - idempotent requests (GET, HEAD, OPTIONS, reads sent as POST and the calls made inside idempotent_calls())
+      are retried with jittered exponential backoff after a timeout, a transport error or a retry_statuses response
+    - 429 and 503 responses carrying Retry-After are retried after the delay the server asked for, whatever
+      the method, as long as the body can be sent again
+    - with hedge_delay, a GET still unanswered after hedge_delay seconds is sent a second time and the first
+      answer wins
+    - each endpoint (host and first four path segments, e.g. rest/v1/<table>) has a CircuitBreaker
+    Retries are added to the metrics of the running call, breaker states are returned by breakers().
+    """
+
+    def __init__(self, retries: int = 2, backoff_base: float = 0.1, retry_statuses: tuple = (502, 503, 504),
+                 max_retry_after: float = 30.0, hedge_delay: float = None, breaker_failures: int = 5,
+                 breaker_reset: float = 30.0, idempotent_paths: tuple = IDEMPOTENT_PATHS):
+        """
+        :param retries: int, attempts after the first one, 0 disables retries
+        :param backoff_base: float seconds, first retry delay before jitter, doubled on each attempt
+        :param retry_statuses: tuple[int], statuses retried for idempotent requests
+        :param max_retry_after: float seconds, longer Retry-After values are not waited for
+        :param hedge_delay: float | None seconds, hedging is off when None
+        :param breaker_failures: int, consecutive failures opening a breaker, 0 disables the breakers
+        :param breaker_reset: float seconds a breaker stays open before a probe
+        :param idempotent_paths: tuple[str], regular expressions of POST paths safe to retry
+        """
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.retry_statuses = tuple(retry_statuses)
+        self.max_retry_after = max_retry_after
+        self.hedge_delay = hedge_delay
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.idempotent_paths = tuple(idempotent_paths)
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.__idempotent_path = re.compile("|".join(self.idempotent_paths)) if self.idempotent_paths else None
+        self.__breakers = {}
+        self.__lock = threading.Lock()
+        self.__executor = None
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """
+        Read SUPABASE_RETRIES, SUPABASE_RETRY_BACKOFF, SUPABASE_HEDGE_DELAY, SUPABASE_BREAKER_FAILURES and
+        SUPABASE_BREAKER_RESET, falling back to the defaults.
+        :return: ResiliencePolicy
+        """
+        hedge_delay = os.environ.get("SUPABASE_HEDGE_DELAY")
+
+        return cls(retries=int(os.environ.get("SUPABASE_RETRIES", 2)),
+                   backoff_base=float(os.environ.get("SUPABASE_RETRY_BACKOFF", 0.1)),
+                   hedge_delay=float(hedge_delay) if hedge_delay else None,
+                   breaker_failures=int(os.environ.get("SUPABASE_BREAKER_FAILURES", 5)),
+                   breaker_reset=float(os.environ.get("SUPABASE_BREAKER_RESET", 30.0)))
+
+    @property
+    def key(self) -> tuple:
+        return (self.retries, self.backoff_base, self.retry_statuses, self.max_retry_after, self.hedge_delay,
+                self.breaker_failures, self.breaker_reset, self.idempotent_paths)
+
+    def breaker(self, request: "httpx.Request") -> CircuitBreaker:
+        """
+        :param request: httpx.Request
+        :return: CircuitBreaker | None, None when breakers are disabled
+        """
+        if not self.breaker_failures:
+            return None
+
+        endpoint = f"{request.url.host}/{'/'.join(request.url.path.strip('/').split('/')[:4])}"
+
+        with self.__lock:
+            breaker = self.__breakers.get(endpoint)
+
+            if breaker is None:
+                breaker = self.__breakers[endpoint] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+
+            return breaker
+
+    def breakers(self) -> dict:
+        """
+        :return: dict[str, dict], endpoint -> {"state", "consecutive_failures", "rejected"}
+        """
+        with self.__lock:
+            return {endpoint: breaker.as_dict() for endpoint, breaker in self.__breakers.items()}
+
+    def stats(self) -> dict:
+        return {"retried": self.retried, "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                "open_breakers": sum(1 for breaker in self.breakers().values() if breaker["state"] != "closed")}
+
+    @contextlib.contextmanager
+    def idempotent_calls(self):
+        """
+        Retry the requests made inside the block by the current thread or task like reads, whatever their method,
+        e.g. an RPC known to be free of side effects:
+        with database.policy.idempotent_calls(): database._get_client.rpc("search", params).execute()
+        """
+        token = _idempotent_calls.set(True)
+
+        try:
+            yield self
+        finally:
+            _idempotent_calls.reset(token)
+
+    def idempotent(self, request: "httpx.Request") -> bool:
+        if request.method in ("GET", "HEAD", "OPTIONS") or _idempotent_calls.get():
+            return True
+
+        return self.__idempotent_path is not None and self.__idempotent_path.search(request.url.path) is not None
+
+    def retry_delay(self, request: "httpx.Request", attempt: int, response: "httpx.Response" = None,
+                    error: Exception = None) -> float:
+        """
+        :param attempt: int, 0 after the first attempt
+        :return: float seconds to wait before sending request again, None when it must not be retried
+        """
+        import httpx
+
+        if attempt >= self.retries or not isinstance(request.stream, httpx.ByteStream):
+            return None
+
+        if response is not None and response.status_code in (429, 503) and "retry-after" in response.headers:
+            retry_after = _retry_after(response.headers["retry-after"])
+
+            return retry_after if retry_after is not None and retry_after <= self.max_retry_after else None
+
+        if error is not None and isinstance(error, httpx.ConnectError):
+            # nothing reached the server
+            return backoff(attempt, self.backoff_base)
+
+        if not self.idempotent(request):
+            return None
+
+        if error is not None or response.status_code in self.retry_statuses:
+            return backoff(attempt, self.backoff_base)
+
+        return None
+
+    def hedges(self, request: "httpx.Request") -> bool:
+        return self.hedge_delay is not None and request.method == "GET"
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self.__lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="supabase-hedge")
+
+            return self.__executor
+
+    def retried_once(self):
+        with self.__lock:
+            self.retried += 1
+
+        count_retry()
+
+
+def _retry_after(value: str) -> float:
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def __getattr__(name: str):
+    # the transports need httpx, they are imported when a session is built rather than with the policy
+    if name in ("CircuitOpenError", "RateLimitedError", "ResilientTransport", "AsyncResilientTransport"):
+        from supabase_service import transports
+
+        return getattr(transports, name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,390 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from supabase_service.cache import MemoryCache
+from supabase_service.types import GenericResponse
+
+
+def _session_state(data) -> dict:
+    """
+    :param data: dict, sign_in data, or AuthResponse returned by refresh_token
+    :return: dict, {"user_id", "access_token", "refresh_token", "expires_at", "error"}
+    """
+    if isinstance(data, dict):
+        user_id, session = data.get("user_id"), data
+        expires_in, expires_at = data.get("expires_in"), data.get("expires_at")
+    else:
+        user_id, session = data.user.id if data.user else None, data.session
+        session = {"access_token": session.access_token, "refresh_token": session.refresh_token}
+        expires_in, expires_at = data.session.expires_in, data.session.expires_at
+
+    return {"user_id": user_id, "access_token": session["access_token"], "refresh_token": session["refresh_token"],
+            "expires_at": float(expires_at) if expires_at else time.time() + float(expires_in or 3600),
+            "error": None}
+
+
+def _refreshed(response: GenericResponse) -> bool:
+    return response.status == 200 and getattr(response.data, "session", None) is not None
+
+
+class SessionManager:
+    """
+    Keeps signed in sessions fresh: each one is refreshed margin seconds before it expires by a background
+    thread, so access_token() is a dictionary read. Refreshes of the same refresh token are single-flight,
+    callers arriving while one is in flight wait for it, and callers arriving shortly after get its result,
+    so GoTrue never sees a refresh token twice. The auth client keeps no session of its own (see auth_clients), so
+    nothing else refreshes the tracked ones.
+    """
+
+    def __init__(self, auth, margin: float = 60.0, retry_interval: float = 5.0, workers: int = 4,
+                 reuse_window: float = 30.0):
+        """
+        :param auth: SupabaseAuth
+        :param margin: float seconds before expiry a session is refreshed
+        :param retry_interval: float seconds between attempts after a failed refresh, until the session expires
+        :param workers: int, refreshes running at once in the background
+        :param reuse_window: float seconds the result of a refresh is handed to late callers of the old token
+        """
+        self.auth = auth
+        self.margin = margin
+        self.retry_interval = retry_interval
+        self.workers = workers
+        self.reuse_window = reuse_window
+        self.refreshes = 0
+        self.failures = 0
+        self.__condition = threading.Condition()
+        self.__sessions = {}
+        self.__keys = {}
+        self.__schedule = []
+        self.__sequence = itertools.count()
+        self.__in_flight = {}
+        self.__recent = MemoryCache(max_entries=10_000)
+        self.__executor = None
+        self.__thread = None
+        self.__closed = False
+
+    def sign_in(self, email: str, password: str, options=None) -> GenericResponse:
+        """
+        SupabaseAuth.sign_in, the session is tracked under its user_id.
+        :return: GenericResponse of sign_in
+        """
+        response = self.auth.sign_in(email=email, password=password, options=options)
+
+        if response.status == 200:
+            self.track(response.data["user_id"], response.data)
+
+        return response
+
+    def track(self, key, session: dict):
+        """
+        :param key: hashable, e.g. the user id
+        :param session: dict with access_token, refresh_token and expires_in or expires_at, like sign_in data
+        :return: None
+        """
+        state = _session_state(session)
+
+        with self.__condition:
+            self.forget(key)
+            self.__sessions[key] = state
+            self.__keys[state["refresh_token"]] = key
+            self.__plan(key, state, state["expires_at"] - self.margin)
+            self.__start()
+
+    def forget(self, key):
+        """
+        Stop refreshing the session of key.
+        :param key: hashable
+        :return: None
+        """
+        with self.__condition:
+            state = self.__sessions.pop(key, None)
+
+            if state is not None:
+                self.__keys.pop(state["refresh_token"], None)
+
+    def access_token(self, key) -> str:
+        """
+        :param key: hashable
+        :return: str | None, the current access token of key, never waits for a refresh
+        """
+        state = self.__sessions.get(key)
+
+        return state["access_token"] if state else None
+
+    def session(self, key) -> dict:
+        """
+        :param key: hashable
+        :return: dict | None, copy of {"user_id", "access_token", "refresh_token", "expires_at", "error"}
+        """
+        state = self.__sessions.get(key)
+
+        return dict(state) if state else None
+
+    def refresh(self, refresh_token: str) -> GenericResponse:
+        """
+        SupabaseAuth.refresh_token, concurrent and repeated calls with the same token share one request.
+        A tracked session using refresh_token is updated with the new tokens.
+        :param refresh_token: str
+        :return: GenericResponse of refresh_token
+        """
+        if not refresh_token or not refresh_token.strip():
+            return GenericResponse(status=400, message="Refresh token is required")
+
+        recent = self.__recent.get(refresh_token)
+
+        if recent is not None:
+            return recent
+
+        with self.__condition:
+            # a refresh settled since the lookup above has already rotated the token, hand out its result
+            recent = self.__recent.get(refresh_token)
+
+            if recent is not None:
+                return recent
+
+            future = self.__in_flight.get(refresh_token)
+            owner = future is None
+
+            if owner:
+                future = Future()
+                self.__in_flight[refresh_token] = future
+
+        if not owner:
+            return future.result()
+
+        response = GenericResponse(status=500, message="Refresh was interrupted")
+
+        try:
+            response = self.auth.refresh_token(refresh_token=refresh_token)
+        except Exception as e:
+            response = GenericResponse(status=500, message=str(e))
+        finally:
+            try:
+                self.__settle(refresh_token, response)
+            finally:
+                # waiters never hang, even when the request was interrupted or the new session is malformed
+                future.set_result(response)
+
+        return response
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.__sessions), "in_flight": len(self.__in_flight), "refreshes": self.refreshes,
+                "failures": self.failures}
+
+    def close(self):
+        """
+        Stop the background refreshes, tracked sessions are kept.
+        :return: None
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __settle(self, refresh_token: str, response: GenericResponse):
+        with self.__condition:
+            self.__in_flight.pop(refresh_token, None)
+            self.refreshes += 1
+            key = self.__keys.get(refresh_token)
+            state = self.__sessions.get(key) if key is not None else None
+
+            if _refreshed(response):
+                self.__recent.set(refresh_token, response, ttl=self.reuse_window)
+
+                if state is not None:
+                    state = _session_state(response.data)
+                    self.__keys.pop(refresh_token)
+                    self.__keys[state["refresh_token"]] = key
+                    self.__sessions[key] = state
+                    self.__plan(key, state, state["expires_at"] - self.margin)
+            else:
+                self.failures += 1
+
+                if state is not None:
+                    state["error"] = response.message
+
+                    if time.time() < state["expires_at"]:
+                        self.__plan(key, state, time.time() + self.retry_interval)
+
+    def __plan(self, key, state: dict, due: float):
+        """
+        Entries whose refresh token is no longer the one of the session are skipped when due.
+        """
+        heapq.heappush(self.__schedule, (due, next(self.__sequence), key, state["refresh_token"]))
+        self.__condition.notify_all()
+
+    def __start(self):
+        if self.__thread is None and not self.__closed:
+            self.__executor = ThreadPoolExecutor(max_workers=self.workers)
+            self.__thread = threading.Thread(target=self.__run, name="supabase-session-refresh", daemon=True)
+            self.__thread.start()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__closed and (not self.__schedule or self.__schedule[0][0] > time.time()):
+                    self.__condition.wait(self.__schedule[0][0] - time.time() if self.__schedule else None)
+
+                if self.__closed:
+                    return
+
+                _, _, key, refresh_token = heapq.heappop(self.__schedule)
+                state = self.__sessions.get(key)
+
+                if state is None or state["refresh_token"] != refresh_token:
+                    continue
+
+            self.__executor.submit(self.refresh, refresh_token)
+
+
+class AsyncSessionManager:
+    """
+    asyncio counterpart of SessionManager, refreshes are scheduled on the running event loop, so track() must
+    be called from it.
+    """
+
+    def __init__(self, auth, margin: float = 60.0, retry_interval: float = 5.0, reuse_window: float = 30.0):
+        """
+        :param auth: AsyncSupabaseAuth
+        :param margin: float seconds before expiry a session is refreshed
+        :param retry_interval: float seconds between attempts after a failed refresh, until the session expires
+        :param reuse_window: float seconds the result of a refresh is handed to late callers of the old token
+        """
+        self.auth = auth
+        self.margin = margin
+        self.retry_interval = retry_interval
+        self.reuse_window = reuse_window
+        self.refreshes = 0
+        self.failures = 0
+        self.__sessions = {}
+        self.__keys = {}
+        self.__handles = {}
+        self.__in_flight = {}
+        self.__recent = MemoryCache(max_entries=10_000)
+
+    async def sign_in(self, email: str, password: str, options=None) -> GenericResponse:
+        response = await self.auth.sign_in(email=email, password=password, options=options)
+
+        if response.status == 200:
+            self.track(response.data["user_id"], response.data)
+
+        return response
+
+    def track(self, key, session: dict):
+        """
+        :param key: hashable, e.g. the user id
+        :param session: dict with access_token, refresh_token and expires_in or expires_at, like sign_in data
+        :return: None
+        """
+        state = _session_state(session)
+        self.forget(key)
+        self.__sessions[key] = state
+        self.__keys[state["refresh_token"]] = key
+        self.__plan(key, state["expires_at"] - self.margin)
+
+    def forget(self, key):
+        state = self.__sessions.pop(key, None)
+        handle = self.__handles.pop(key, None)
+
+        if state is not None:
+            self.__keys.pop(state["refresh_token"], None)
+
+        if handle is not None:
+            handle.cancel()
+
+    def access_token(self, key) -> str:
+        state = self.__sessions.get(key)
+
+        return state["access_token"] if state else None
+
+    def session(self, key) -> dict:
+        state = self.__sessions.get(key)
+
+        return dict(state) if state else None
+
+    async def refresh(self, refresh_token: str) -> GenericResponse:
+        if not refresh_token or not refresh_token.strip():
+            return GenericResponse(status=400, message="Refresh token is required")
+
+        recent = self.__recent.get(refresh_token)
+
+        if recent is not None:
+            return recent
+
+        future = self.__in_flight.get(refresh_token)
+
+        if future is None:
+            future = asyncio.ensure_future(self.__refresh(refresh_token))
+            self.__in_flight[refresh_token] = future
+
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.__sessions), "in_flight": len(self.__in_flight), "refreshes": self.refreshes,
+                "failures": self.failures}
+
+    def close(self):
+        for handle in self.__handles.values():
+            handle.cancel()
+
+        self.__handles.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    async def __refresh(self, refresh_token: str) -> GenericResponse:
+        try:
+            response = await self.auth.refresh_token(refresh_token=refresh_token)
+        except Exception as e:
+            response = GenericResponse(status=500, message=str(e))
+        finally:
+            self.__in_flight.pop(refresh_token, None)
+
+        self.refreshes += 1
+        key = self.__keys.get(refresh_token)
+        state = self.__sessions.get(key) if key is not None else None
+
+        if _refreshed(response):
+            self.__recent.set(refresh_token, response, ttl=self.reuse_window)
+
+            if state is not None:
+                state = _session_state(response.data)
+                self.__keys.pop(refresh_token)
+                self.__keys[state["refresh_token"]] = key
+                self.__sessions[key] = state
+                self.__plan(key, state["expires_at"] - self.margin)
+        else:
+            self.failures += 1
+
+            if state is not None:
+                state["error"] = response.message
+
+                if time.time() < state["expires_at"]:
+                    self.__plan(key, time.time() + self.retry_interval)
+
+        return response
+
+    def __plan(self, key, due: float):
+        handle = self.__handles.pop(key, None)
+
+        if handle is not None:
+            handle.cancel()
+
+        refresh_token = self.__sessions[key]["refresh_token"]
+        self.__handles[key] = asyncio.get_running_loop().call_later(
+            max(due - time.time(), 0), lambda: asyncio.ensure_future(self.refresh(refresh_token)))
@@ -0,0 +1,117 @@
+import time
+from typing import Iterator
+from urllib.parse import quote
+
+from supabase_service.cache import MemoryCache
+from supabase_service.types import GenericResponse
+
+# paths per POST /object/sign/{bucket} request
+SIGN_CHUNK_SIZE = 1000
+
+
+class SignedUrlBatch:
+    """
+    URLs of one signed_urls call. Paths still cached are answered locally, the others are signed in chunks
+    and cached until margin seconds before they expire.
+    """
+
+    def __init__(self, cache: MemoryCache, bucket_id: str, paths: list, expires_in: int, download=None,
+                 margin: float = 60.0):
+        """
+        :param cache: MemoryCache, see signed_url_cache
+        :param bucket_id: str
+        :param paths: list[str], duplicates are signed once
+        :param expires_in: int seconds
+        :param download: bool | str, the URLs download the file, under this name when a str
+        :param margin: float seconds, a cached URL is not handed out once it expires sooner than this
+        """
+        if not isinstance(paths, (list, tuple, set)) or \
+                not all(isinstance(path, str) and path.strip() for path in paths):
+            raise ValueError("Paths must be a list of non empty strings")
+
+        if not isinstance(expires_in, int) or expires_in < 1:
+            raise ValueError("Expires in must be a positive number of seconds")
+
+        self.cache = cache
+        self.bucket_id = bucket_id
+        self.expires_in = expires_in
+        self.download = download
+        self.margin = margin
+        self.urls = dict.fromkeys(paths)
+        self.errors = {}
+
+    def public(self, base_url) -> GenericResponse:
+        """
+        Public URLs, built without any request.
+        :param base_url: str | httpx.URL, storage URL
+        :return: GenericResponse
+        """
+        prefix = f"{str(base_url).rstrip('/')}/object/public/{self.bucket_id}/"
+        query = "?" + self.__download_query() if self.download else ""
+
+        for path in self.urls:
+            self.urls[path] = f"{prefix}{path.lstrip('/')}{query}"
+
+        return self.response()
+
+    def pending(self, chunk_size: int = SIGN_CHUNK_SIZE) -> Iterator[dict]:
+        """
+        Fill the URLs found in the cache.
+        :param chunk_size: int
+        :return: Iterator[dict], request bodies for the paths left to sign
+        """
+        paths = []
+
+        for path in self.urls:
+            url = self.cache.get(self.__key(path))
+
+            if url is None:
+                paths.append(path)
+            else:
+                self.urls[path] = url
+
+        for start in range(0, len(paths), chunk_size):
+            yield {"paths": paths[start:start + chunk_size], "expiresIn": self.expires_in}
+
+    def add(self, base_url, items: list, requested_at: float):
+        """
+        :param base_url: str | httpx.URL, storage URL the signed paths are relative to
+        :param items: list[dict], response of the sign request
+        :param requested_at: float, time.monotonic() before the request was sent
+        :return: None
+        """
+        base_url = str(base_url).rstrip("/") + "/"
+        query = "&" + self.__download_query() if self.download else ""
+        ttl = self.expires_in - self.margin - (time.monotonic() - requested_at)
+
+        for item in items:
+            path = item.get("path")
+
+            if path not in self.urls:
+                continue
+
+            if not item.get("signedURL"):
+                self.errors[path] = item.get("error") or "Not signed"
+                continue
+
+            url = f"{base_url}{item['signedURL'].lstrip('/')}{query}"
+            self.urls[path] = url
+
+            if ttl > 0:
+                self.cache.set(self.__key(path), url, ttl=ttl, size=len(url))
+
+    def response(self) -> GenericResponse:
+        if not self.errors:
+            return GenericResponse(status=200, message="Signed URLs created successfully", data=self.urls,
+                                   count=len(self.urls))
+
+        path, error = next(iter(self.errors.items()))
+
+        return GenericResponse(status=207, message=f"Signing failed for {len(self.errors)} files, {path}: {error}",
+                               data=self.urls, count=len(self.urls) - len(self.errors))
+
+    def __download_query(self) -> str:
+        return "download=" + ("" if self.download is True else quote(str(self.download)))
+
+    def __key(self, path: str) -> str:
+        return f"{self.bucket_id}\n{self.expires_in}\n{self.download}\n{path}"
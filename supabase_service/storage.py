@@ -1,15 +1,50 @@
+import mimetypes
 import os
-
-from supabase_service.config import SupabaseClient
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from supabase_service.cache import bucket_cache, signed_url_cache
+from supabase_service.config import SupabaseClient, PoolOptions, SupabaseClientRegistry
+from supabase_service.listing import file_filter, walk_bucket
+from supabase_service.metrics import instrument, submit
+from supabase_service.signing import SIGN_CHUNK_SIZE, SignedUrlBatch
+from supabase_service.transfer import TUS_CHUNK_SIZE, LocalManifest, TransferReport, TusUpload, backoff, \
+    remote_md5, remote_size, stream_download
 from supabase_service.types import GenericResponse
+from supabase_service.utils import storage_error_status
 
 
 class SupabaseStorage(SupabaseClient):
 
-    def __init__(self):
-        super().__init__()
-        self.__client_storage = self._get_client
+    def __init__(self, pool_options: PoolOptions = None, registry: SupabaseClientRegistry = None,
+                 bucket_ttl: float = 300.0, trust_bucket_id: bool = False, signed_url_margin: float = 60.0):
+        """
+        :param pool_options: PoolOptions
+        :param registry: SupabaseClientRegistry
+        :param bucket_ttl: float seconds get_bucket results are cached, 0 disables the cache
+        :param trust_bucket_id: bool, file operations skip the bucket lookup and address the bucket id directly
+        :param signed_url_margin: float seconds before its expiry a cached signed URL stops being reused
+        """
+        super().__init__(pool_options=pool_options, registry=registry)
+        self.bucket_ttl = bucket_ttl
+        self.trust_bucket_id = trust_bucket_id
+        self.signed_url_margin = signed_url_margin
+
+    @property
+    def __client_storage(self):
+        # built on first use
+        return self._get_client.storage
+
+    @property
+    def __buckets(self):
+        return bucket_cache(self.__client_storage)
+
+    @property
+    def __signed_urls(self):
+        return signed_url_cache(self.__client_storage)
 
+    @instrument()
     def list_buckets(self) -> GenericResponse:
         """
         :return: list[SyncBucket]
@@ -20,6 +55,7 @@ class SupabaseStorage(SupabaseClient):
         except Exception as e:
             return GenericResponse(status=500, message=str(e))
 
+    @instrument(target="bucket_id")
     def create_bucket(self, bucket_id: str, bucket_name: str, public: bool = False) -> GenericResponse:
         """
         :param bucket_id: str
@@ -32,22 +68,20 @@ class SupabaseStorage(SupabaseClient):
         if not bucket_name or not bucket_name.strip():
             return GenericResponse(status=400, message="Bucket name is required")
 
-        buckets = self.list_buckets()
-
-        if buckets.status not in [200]:
-            return GenericResponse(status=400, message="Buckets not found")
-
-        if bucket_id in [bucket.id for bucket in buckets.data]:
-            return GenericResponse(status=400, message="Bucket already exists")
-
         try:
             bucket_created = self.__client_storage.create_bucket(id=bucket_id, name=bucket_name,
                                                                  options={"public": public})
         except Exception as e:
-            return str(e)
+            if storage_error_status(e) == 409:
+                return GenericResponse(status=400, message="Bucket already exists")
+
+            return GenericResponse(status=500, message=str(e))
+        finally:
+            self.invalidate_bucket(bucket_id)
 
         return GenericResponse(status=201, message="Bucket created successfully", data=bucket_created)
 
+    @instrument(target="bucket_id")
     def delete_bucket(self, bucket_id: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -57,18 +91,18 @@ class SupabaseStorage(SupabaseClient):
             return GenericResponse(status=400, message="Bucket ID is required")
 
         try:
-            bucket = self.get_bucket(bucket_id=bucket_id)
-
-            if bucket.status not in [200]:
-                return GenericResponse(status=400, message="Bucket not found")
-
+            bucket_removed = self.__client_storage.delete_bucket(id=bucket_id)
         except Exception as e:
-            return GenericResponse(status=400, message="Bucket not found")
+            if storage_error_status(e) == 404:
+                return GenericResponse(status=400, message="Bucket not found")
 
-        bucket_removed = self.__client_storage.delete_bucket(id=bucket_id)
+            return GenericResponse(status=400, message=str(e))
+        finally:
+            self.invalidate_bucket(bucket_id)
 
         return GenericResponse(status=200, message="Bucket removed!", data=bucket_removed)
 
+    @instrument(target="bucket_id")
     def get_bucket(self, bucket_id: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -77,13 +111,33 @@ class SupabaseStorage(SupabaseClient):
         if not bucket_id or not bucket_id.strip():
             return None
 
+        bucket = self.__buckets.get(bucket_id) if self.bucket_ttl else None
+
+        if bucket is not None:
+            return GenericResponse(status=200, message="Bucket retrieved successfully", data=bucket)
+
         try:
             bucket = self.__client_storage.get_bucket(id=bucket_id)
 
+            if self.bucket_ttl:
+                self.__buckets.set(bucket_id, bucket, ttl=self.bucket_ttl)
+
             return GenericResponse(status=200, message="Bucket retrieved successfully", data=bucket)
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
 
+    def invalidate_bucket(self, bucket_id: str = None):
+        """
+        Forget the cached metadata of bucket_id, of every bucket when None.
+        :param bucket_id: str | None
+        :return: None
+        """
+        if bucket_id is None:
+            self.__buckets.clear()
+        else:
+            self.__buckets.delete(bucket_id)
+
+    @instrument(target="bucket_id")
     def list_files(self, bucket_id: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -92,13 +146,17 @@ class SupabaseStorage(SupabaseClient):
         if not bucket_id or not bucket_id.strip():
             return GenericResponse(status=400, message="Bucket ID is required")
 
-        bucket = self.get_bucket(bucket_id=bucket_id)
+        bucket = self.__bucket(bucket_id=bucket_id)
 
         if bucket.status not in [200]:
             return GenericResponse(status=400, message="Bucket not found")
 
-        return GenericResponse(status=200, message="Files retrieved successfully", data=bucket.data.list())
+        try:
+            return GenericResponse(status=200, message="Files retrieved successfully", data=bucket.data.list())
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
 
+    @instrument(target="bucket_id")
     def upload_file(self, bucket_id: str, bucket_path: str, local_file_path: str, file_name: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -107,8 +165,6 @@ class SupabaseStorage(SupabaseClient):
         :param file_name: str
         :return: Response | str
         """
-        global path
-
         if not bucket_id or not bucket_id.strip():
             return GenericResponse(status=400, message="Bucket ID is required")
 
@@ -121,7 +177,7 @@ class SupabaseStorage(SupabaseClient):
         if os.path.exists(local_file_path) and not os.path.isfile(local_file_path):
             return GenericResponse(status=400, message="Local file path is not a file")
 
-        if bucket_path > 0 and not bucket_path.endswith("/"):
+        if bucket_path and not bucket_path.endswith("/"):
             bucket_path += "/"
 
         if bucket_path:
@@ -129,18 +185,19 @@ class SupabaseStorage(SupabaseClient):
         else:
             path = file_name
 
-        bucket = self.get_bucket(bucket_id=bucket_id)
+        bucket = self.__bucket(bucket_id=bucket_id)
 
         if bucket.status not in [200]:
             return GenericResponse(status=400, message="Bucket not found")
 
         try:
-            file_uploaded = bucket.upload(path=path, file=local_file_path, file_options=None)
+            file_uploaded = bucket.data.upload(path=path, file=local_file_path, file_options=None)
 
             return GenericResponse(status=201, message="File uploaded successfully", data=file_uploaded)
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
 
+    @instrument(target="bucket_id")
     def download_file(self, bucket_id: str, bucket_path: str, file_name: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -148,8 +205,6 @@ class SupabaseStorage(SupabaseClient):
         :param file_name: str
         :return: Response | str
         """
-        global path
-
         if not bucket_id or not bucket_id.strip():
             return GenericResponse(status=400, message="Bucket ID is required")
 
@@ -164,18 +219,19 @@ class SupabaseStorage(SupabaseClient):
         else:
             path = file_name
 
-        bucket = self.get_bucket(bucket_id=bucket_id)
+        bucket = self.__bucket(bucket_id=bucket_id)
 
         if bucket.status not in [200]:
             return GenericResponse(status=400, message="Bucket not found")
 
         try:
-            file_downloader = bucket.download(path=path)
+            file_downloader = bucket.data.download(path=path)
 
             return GenericResponse(status=200, message="File downloaded successfully", data=file_downloader)
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
 
+    @instrument(target="bucket_id")
     def update_file(self, bucket_id: str, bucket_path: str, local_file_path: str, file_name: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -184,8 +240,6 @@ class SupabaseStorage(SupabaseClient):
         :param file_name: str
         :return: Response | str
         """
-        global path
-
         if not bucket_id or not bucket_id.strip():
             return GenericResponse(status=400, message="Bucket ID is required")
 
@@ -206,18 +260,19 @@ class SupabaseStorage(SupabaseClient):
         else:
             path = file_name
 
-        bucket = self.get_bucket(bucket_id=bucket_id)
+        bucket = self.__bucket(bucket_id=bucket_id)
 
         if bucket.status not in [200]:
-            return None
+            return GenericResponse(status=400, message="Bucket not found")
 
         try:
-            file_updated = bucket.update(path=path, file=local_file_path, file_options=None)
+            file_updated = bucket.data.update(path=path, file=local_file_path, file_options=None)
 
             return GenericResponse(status=200, message="File updated successfully", data=file_updated)
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
 
+    @instrument(target="bucket_id")
     def copy_file(self, bucket_id: str, from_path: str, to_path: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -225,8 +280,6 @@ class SupabaseStorage(SupabaseClient):
         :param to_path: str
         :return: dict[str, str] | str
         """
-        global path
-
         if not bucket_id or not bucket_id.strip():
             return GenericResponse(status=400, message="Bucket ID is required")
 
@@ -236,18 +289,19 @@ class SupabaseStorage(SupabaseClient):
         if not to_path or not to_path.strip():
             return GenericResponse(status=400, message="To path is required")
 
-        bucket = self.get_bucket(bucket_id=bucket_id)
+        bucket = self.__bucket(bucket_id=bucket_id)
 
         if bucket.status not in [200]:
             return GenericResponse(status=400, message="Bucket not found")
 
         try:
-            file_copied = bucket.copy(from_path=from_path, to_path=to_path)
+            file_copied = bucket.data.copy(from_path=from_path, to_path=to_path)
 
             return GenericResponse(status=200, message="File copied successfully", data=file_copied)
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
 
+    @instrument(target="bucket_id")
     def move_file(self, bucket_id: str, from_path: str, to_path: str) -> GenericResponse:
         """
         :param bucket_id: str
@@ -255,8 +309,6 @@ class SupabaseStorage(SupabaseClient):
         :param to_path: str
         :return: dict[str, str] | str
         """
-        global path
-
         if not bucket_id or not bucket_id.strip():
             return GenericResponse(status=400, message="Bucket ID is required")
 
@@ -266,14 +318,377 @@ class SupabaseStorage(SupabaseClient):
         if not to_path or not to_path.strip():
             return GenericResponse(status=400, message="To path is required")
 
-        bucket = self.get_bucket(bucket_id=bucket_id)
+        bucket = self.__bucket(bucket_id=bucket_id)
 
         if bucket.status not in [200]:
             return GenericResponse(status=400, message="Bucket not found")
 
         try:
-            file_moved = bucket.move(from_path=from_path, to_path=to_path)
+            file_moved = bucket.data.move(from_path=from_path, to_path=to_path)
 
             return GenericResponse(status=200, message="File moved successfully", data=file_moved)
         except Exception as e:
             return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    def signed_urls(self, bucket_id: str, paths: list, expires_in: int = 3600, download=None, public: bool = None,
+                    chunk_size: int = SIGN_CHUNK_SIZE) -> GenericResponse:
+        """
+        URLs of many files with at most one sign request per chunk_size paths. Signed URLs are reused until
+        signed_url_margin seconds before they expire, public bucket URLs are built without any request.
+        :param bucket_id: str
+        :param paths: list[str], object paths in the bucket
+        :param expires_in: int seconds the signed URLs stay valid
+        :param download: bool | str, the URLs download the file, under this name when a str
+        :param public: bool, True builds public URLs, False signs them, None follows the bucket (signs when the
+        bucket id is trusted)
+        :param chunk_size: int, paths per sign request
+        :return: GenericResponse, data maps every path to its URL, None for the paths that could not be signed
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if chunk_size < 1:
+            return GenericResponse(status=400, message="Chunk size must be positive")
+
+        try:
+            batch = SignedUrlBatch(self.__signed_urls, bucket_id, paths, expires_in, download=download,
+                                   margin=self.signed_url_margin)
+        except (TypeError, ValueError) as e:
+            return GenericResponse(status=400, message=str(e))
+
+        if public is None and not self.trust_bucket_id:
+            bucket = self.get_bucket(bucket_id=bucket_id)
+
+            if bucket.status not in [200]:
+                return GenericResponse(status=400, message="Bucket not found")
+
+            public = bucket.data.public
+
+        session = self.__client_storage.session
+
+        if public:
+            return batch.public(session.base_url)
+
+        try:
+            for body in batch.pending(chunk_size):
+                requested_at = time.monotonic()
+                response = session.post(f"object/sign/{bucket_id}", json=body)
+                response.raise_for_status()
+                batch.add(session.base_url, response.json(), requested_at)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+        return batch.response()
+
+    @instrument(target="bucket_id")
+    def walk_files(self, bucket_id: str, prefix: str = "", recursive: bool = True, page_size: int = 1000,
+                   workers: int = 4, extensions: list = None, min_size: int = None, max_size: int = None,
+                   modified_since=None) -> GenericResponse:
+        """
+        Enumerate the files under prefix page by page, descending into folders. Pages are only requested while
+        the iterator in data is consumed, errors raised by a later page propagate from the iterator.
+        :param bucket_id: str
+        :param prefix: str, folder to start from, the bucket root when empty
+        :param recursive: bool, descend into sub folders
+        :param page_size: int, entries per list request
+        :param workers: int, list requests in flight across folders
+        :param extensions: list[str], only files with one of these extensions
+        :param min_size: int bytes
+        :param max_size: int bytes
+        :param modified_since: datetime | str, only files updated at or after this time
+        :return: GenericResponse with an iterator of list entries as data, each with its full path under "path"
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if page_size < 1:
+            return GenericResponse(status=400, message="Page size must be positive")
+
+        if workers < 1:
+            return GenericResponse(status=400, message="Workers must be positive")
+
+        try:
+            accept = file_filter(extensions=extensions, min_size=min_size, max_size=max_size,
+                                 modified_since=modified_since)
+        except (TypeError, ValueError) as e:
+            return GenericResponse(status=400, message=str(e))
+
+        bucket = self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        files = walk_bucket(bucket.data, prefix=prefix, recursive=recursive, page_size=page_size, workers=workers,
+                            accept=accept)
+
+        return GenericResponse(status=200, message="File iterator ready", data=files)
+
+    @instrument(target="bucket_id")
+    def download_stream(self, bucket_id: str, path: str, sink, chunk_size: int = 1024 * 1024, retries: int = 3,
+                        resume: bool = True) -> GenericResponse:
+        """
+        Download an object in chunks of chunk_size instead of holding it in memory.
+        A local path is written through <path>.part, which a later call continues with a Range request as long as
+        the object keeps the ETag kept in <path>.part.etag.
+        :param bucket_id: str
+        :param path: str, object path in the bucket
+        :param sink: str | writable binary file-like object
+        :param chunk_size: int
+        :param retries: int, resumes after a dropped connection
+        :param resume: bool, continue an existing <path>.part, start over when False
+        :return: GenericResponse, data holds {"bytes", "size", "retries", "etag"}
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not path or not path.strip():
+            return GenericResponse(status=400, message="File name is required")
+
+        if not sink:
+            return GenericResponse(status=400, message="Sink is required")
+
+        bucket = self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            if isinstance(sink, (str, os.PathLike)):
+                transferred = self.__download_to_path(bucket_id, path, sink, chunk_size, retries, resume)
+            else:
+                transferred = stream_download(self.__client_storage.session, f"object/{bucket_id}/{path}", sink,
+                                              chunk_size=chunk_size, retries=retries)
+
+            return GenericResponse(status=200, message="File downloaded successfully", data=transferred)
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    @instrument(target="bucket_id")
+    def upload_resumable(self, bucket_id: str, path: str, local_file_path: str, content_type: str = None,
+                         upsert: bool = True, chunk_size: int = TUS_CHUNK_SIZE, retries: int = 3,
+                         state_path: str = None) -> GenericResponse:
+        """
+        Upload a file through the resumable (TUS) endpoint, reading it one chunk at a time.
+        :param bucket_id: str
+        :param path: str, object path in the bucket
+        :param local_file_path: str
+        :param content_type: str, guessed from path when None
+        :param upsert: bool
+        :param chunk_size: int, Supabase expects 6MB chunks
+        :param retries: int, consecutive failures allowed, each resumes from the offset the server confirmed
+        :param state_path: str, keeps the upload URL so a new process continues an interrupted upload
+        :return: GenericResponse, data holds {"bytes", "retries", "url"}
+        """
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        if not path or not path.strip():
+            return GenericResponse(status=400, message="File name is required")
+
+        if not local_file_path or not os.path.isfile(local_file_path):
+            return GenericResponse(status=400, message="Local file path is not a file")
+
+        bucket = self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        try:
+            upload = TusUpload(self.__client_storage.session, bucket_id, path, local_file_path,
+                               content_type=content_type or mimetypes.guess_type(path)[0] or "application/octet-stream",
+                               upsert=upsert, chunk_size=chunk_size, state_path=state_path)
+
+            return GenericResponse(status=201, message="File uploaded successfully", data=upload.upload(retries))
+        except Exception as e:
+            return GenericResponse(status=400, message=str(e))
+
+    def __download_to_path(self, bucket_id: str, path: str, local_file_path: str, chunk_size: int = 1024 * 1024,
+                           retries: int = 3, resume: bool = True) -> dict:
+        directory = os.path.dirname(os.path.abspath(local_file_path))
+        os.makedirs(directory, exist_ok=True)
+        part_path = f"{local_file_path}.part"
+        # ETag of the object the .part bytes came from, a resume without it starts over
+        etag_path = f"{part_path}.etag"
+        offset = os.path.getsize(part_path) if resume and os.path.isfile(part_path) else 0
+        etag = None
+
+        if offset and os.path.isfile(etag_path):
+            with open(etag_path) as etag_file:
+                etag = etag_file.read().strip() or None
+
+        def keep_etag(value: str):
+            with open(etag_path, "w") as etag_file:
+                etag_file.write(value or "")
+
+        with open(part_path, "ab" if offset else "wb") as file:
+            transferred = stream_download(self.__client_storage.session, f"object/{bucket_id}/{path}", file,
+                                          offset=offset, chunk_size=chunk_size, retries=retries, etag=etag,
+                                          on_etag=keep_etag)
+
+        os.replace(part_path, local_file_path)
+
+        if os.path.isfile(etag_path):
+            os.remove(etag_path)
+
+        return transferred
+
+    @instrument(target="bucket_id")
+    def sync_up(self, local_dir: str, bucket_id: str, prefix: str = "", workers: int = 8, retries: int = 3,
+                manifest_path: str = None) -> GenericResponse:
+        """
+        Upload the files of local_dir that are missing or different under prefix in the bucket.
+        Files are compared by size, then by md5 against the storage eTag.
+        :param local_dir: str
+        :param bucket_id: str
+        :param prefix: str, folder in the bucket mirroring local_dir
+        :param workers: int, transfers running at once
+        :param retries: int, attempts per file after the first failure
+        :param manifest_path: str, where local hashes are kept between runs, see LocalManifest
+        :return: GenericResponse, data holds counts and throughput (files_per_second, mb_per_second)
+        """
+        if not local_dir or not os.path.isdir(local_dir):
+            return GenericResponse(status=400, message="Local directory not found")
+
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        bucket = self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        prefix = (prefix or "").strip("/")
+        manifest = LocalManifest(local_dir, manifest_path)
+        report = TransferReport("Sync up")
+
+        try:
+            remote = dict(self.__walk_remote(bucket.data, prefix, workers))
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+        def upload(item: tuple):
+            relative_path, local_entry = item
+            entry = remote.get(relative_path)
+
+            if entry is not None and remote_size(entry) == local_entry["size"] and \
+                    remote_md5(entry) in (None, manifest.md5(relative_path)):
+                report.skip()
+                return
+
+            local_file_path = os.path.join(local_dir, *relative_path.split("/"))
+            file_options = {"upsert": "true",
+                            "content-type": mimetypes.guess_type(relative_path)[0] or "application/octet-stream"}
+
+            def send():
+                with open(local_file_path, "rb") as file:
+                    bucket.data.upload(path=self.__remote_path(prefix, relative_path), file=file,
+                                       file_options=dict(file_options))
+
+            self.__transfer(report, relative_path, send, local_entry["size"], retries)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [submit(executor, upload, item) for item in manifest.files().items()]:
+                future.result()
+
+        manifest.save()
+
+        return report.response()
+
+    @instrument(target="bucket_id")
+    def sync_down(self, local_dir: str, bucket_id: str, prefix: str = "", workers: int = 8, retries: int = 3,
+                  manifest_path: str = None) -> GenericResponse:
+        """
+        Download the files under prefix in the bucket that are missing or different in local_dir.
+        :param local_dir: str, created when missing
+        :param bucket_id: str
+        :param prefix: str, folder in the bucket mirrored into local_dir
+        :param workers: int, transfers running at once
+        :param retries: int, attempts per file after the first failure
+        :param manifest_path: str, where local hashes are kept between runs, see LocalManifest
+        :return: GenericResponse, data holds counts and throughput (files_per_second, mb_per_second)
+        """
+        if not local_dir or not local_dir.strip():
+            return GenericResponse(status=400, message="Local directory is required")
+
+        if not bucket_id or not bucket_id.strip():
+            return GenericResponse(status=400, message="Bucket ID is required")
+
+        bucket = self.__bucket(bucket_id=bucket_id)
+
+        if bucket.status not in [200]:
+            return GenericResponse(status=400, message="Bucket not found")
+
+        os.makedirs(local_dir, exist_ok=True)
+        prefix = (prefix or "").strip("/")
+        manifest = LocalManifest(local_dir, manifest_path)
+        local = manifest.files()
+        report = TransferReport("Sync down")
+
+        try:
+            remote = list(self.__walk_remote(bucket.data, prefix, workers))
+        except Exception as e:
+            return GenericResponse(status=500, message=str(e))
+
+        def download(item: tuple):
+            relative_path, entry = item
+            local_entry = local.get(relative_path)
+
+            if local_entry is not None and remote_size(entry) == local_entry["size"] and \
+                    remote_md5(entry) in (None, manifest.md5(relative_path)):
+                report.skip()
+                return
+
+            local_file_path = os.path.join(local_dir, *relative_path.split("/"))
+
+            def receive():
+                self.__download_to_path(bucket_id, self.__remote_path(prefix, relative_path), local_file_path,
+                                        retries=0)
+
+            self.__transfer(report, relative_path, receive, remote_size(entry) or 0, retries)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [submit(executor, download, entry) for entry in remote]:
+                future.result()
+
+        manifest.save()
+
+        return report.response()
+
+    @staticmethod
+    def __walk_remote(bucket, prefix: str, workers: int) -> Iterator[tuple]:
+        """
+        :return: Iterator[tuple[str, dict]], (path relative to prefix, list entry) of every file under prefix
+        """
+        for entry in walk_bucket(bucket, prefix=prefix, workers=workers):
+            yield entry["path"][len(prefix) + 1:] if prefix else entry["path"], entry
+
+    @staticmethod
+    def __remote_path(prefix: str, relative_path: str) -> str:
+        return f"{prefix}/{relative_path}" if prefix else relative_path
+
+    @staticmethod
+    def __transfer(report: TransferReport, relative_path: str, operation, size: int, retries: int):
+        for attempt in range(retries + 1):
+            try:
+                operation()
+                report.success(size, retries=attempt)
+                return
+            except Exception as e:
+                if attempt == retries:
+                    report.failure(relative_path, str(e), retries=attempt)
+                    return
+
+                time.sleep(backoff(attempt))
+
+    def __bucket(self, bucket_id: str) -> GenericResponse:
+        """
+        Bucket handle for file operations, from_(bucket_id) without any request when the id is trusted.
+        :param bucket_id: str
+        :return: GenericResponse
+        """
+        if self.trust_bucket_id:
+            return GenericResponse(status=200, message="Bucket retrieved successfully",
+                                   data=self.__client_storage.from_(bucket_id))
+
+        return self.get_bucket(bucket_id=bucket_id)
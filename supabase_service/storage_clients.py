@@ -0,0 +1,39 @@
+import httpx
+from storage3 import AsyncStorageClient, SyncStorageClient
+from storage3.constants import DEFAULT_TIMEOUT
+from storage3.utils import SyncClient as StorageHttpClient
+
+
+class PooledStorageClient(SyncStorageClient):
+
+    def __init__(self, url: str, headers: dict, pool_options, **kwargs):
+        self.__pool_options = pool_options
+        super().__init__(url, headers, **kwargs)
+
+    def _create_session(self, base_url, headers, timeout, verify=True):
+        return self.__pool_options.build_session(StorageHttpClient, timeout, verify, base_url=base_url,
+                                                 headers=headers)
+
+
+class PooledAsyncStorageClient(AsyncStorageClient):
+
+    def __init__(self, url: str, headers: dict, pool_options, **kwargs):
+        self.__pool_options = pool_options
+        super().__init__(url, headers, **kwargs)
+
+    def _create_session(self, base_url, headers, timeout, verify=True):
+        return self.__pool_options.build_session(httpx.AsyncClient, timeout, verify, base_url=base_url,
+                                                 headers=headers)
+
+
+def build_client(supabase_url: str, headers: dict, pool_options, asynchronous: bool = False):
+    """
+    :param supabase_url: str
+    :param headers: dict, apikey and authorization headers
+    :param pool_options: PoolOptions
+    :param asynchronous: bool
+    :return: PooledStorageClient | PooledAsyncStorageClient
+    """
+    client_class = PooledAsyncStorageClient if asynchronous else PooledStorageClient
+
+    return client_class(f"{supabase_url}/storage/v1", headers, pool_options, timeout=DEFAULT_TIMEOUT)
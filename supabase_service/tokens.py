@@ -0,0 +1,356 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+from supabase_service.cache import MemoryCache
+
+_HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+_ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "PS256", "PS384", "PS512", "ES256", "ES384", "ES512")
+
+# seconds between two JWKS requests triggered by a kid missing from the cached key set
+JWKS_MIN_REFRESH = 30.0
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class TokenError(ValueError):
+    """
+    The token is malformed, its signature does not match or one of its claims is rejected.
+    """
+
+
+class TokenUnverifiable(TokenError):
+    """
+    The token cannot be checked locally (no secret for HS tokens, no key for its kid, missing crypto library);
+    only the auth server can tell whether it is valid.
+    """
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _decode(token: str) -> tuple:
+    """
+    :return: tuple[dict, dict, bytes, bytes], header, claims, signing input and signature
+    """
+    try:
+        header_segment, claims_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        claims = json.loads(_b64decode(claims_segment))
+        signature = _b64decode(signature_segment)
+    except (ValueError, TypeError) as e:
+        raise TokenError(f"Malformed token: {e}")
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenError("Malformed token")
+
+    return header, claims, f"{header_segment}.{claims_segment}".encode(), signature
+
+
+def unverified_claims(token: str) -> dict:
+    """
+    :param token: str
+    :return: dict, the claims of token without any check, only trust them once the auth server accepted the token
+    """
+    return _decode(token)[1]
+
+
+def _public_key(jwk: dict):
+    """
+    :param jwk: dict, an RSA or EC key of a JWKS document
+    :return: cryptography public key
+    """
+    try:
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    except ImportError:
+        raise TokenUnverifiable("The cryptography package is required to verify asymmetric tokens")
+
+    def number(name: str) -> int:
+        return int.from_bytes(_b64decode(jwk[name]), "big")
+
+    curves = {"P-256": ec.SECP256R1, "P-384": ec.SECP384R1, "P-521": ec.SECP521R1}
+
+    try:
+        if jwk.get("kty") == "RSA":
+            return rsa.RSAPublicNumbers(number("e"), number("n")).public_key()
+
+        if jwk.get("kty") == "EC" and jwk.get("crv") in curves:
+            return ec.EllipticCurvePublicNumbers(number("x"), number("y"), curves[jwk["crv"]]()).public_key()
+    except (KeyError, ValueError, TypeError) as e:
+        raise TokenUnverifiable(f"Malformed key {jwk.get('kid')}: {e}")
+
+    raise TokenUnverifiable(f"Unsupported key type {jwk.get('kty')} {jwk.get('crv') or ''}".rstrip())
+
+
+def _numeric(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _verify_asymmetric(algorithm: str, key, signing_input: bytes, signature: bytes) -> bool:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, utils
+
+    digest = {"256": hashes.SHA256, "384": hashes.SHA384, "512": hashes.SHA512}[algorithm[2:]]()
+
+    try:
+        if algorithm.startswith("ES"):
+            half = len(signature) // 2
+            signature = utils.encode_dss_signature(int.from_bytes(signature[:half], "big"),
+                                                   int.from_bytes(signature[half:], "big"))
+            key.verify(signature, signing_input, ec.ECDSA(digest))
+        elif algorithm.startswith("PS"):
+            key.verify(signature, signing_input, padding.PSS(mgf=padding.MGF1(digest),
+                                                             salt_length=padding.PSS.DIGEST_LENGTH), digest)
+        else:
+            key.verify(signature, signing_input, padding.PKCS1v15(), digest)
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+
+    return True
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens in-process: signature (project JWT secret for HS tokens, the project JWKS for
+    asymmetric ones), expiry, audience and issuer. Decoded claims are cached by token until they expire, so a
+    token seen before costs one dictionary lookup. Revocation (sign out, deleted user) is only visible to the
+    auth server, use the network check where it matters.
+    """
+
+    def __init__(self, jwt_secret: str = None, jwks_url: str = None, audience: str = "authenticated",
+                 issuer: str = None, leeway: float = 0.0, jwks_ttl: float = 600.0, max_entries: int = 10_000,
+                 headers: dict = None):
+        """
+        :param jwt_secret: str, the project JWT secret, HS tokens are unverifiable without it
+        :param jwks_url: str, <SUPABASE_URL>/auth/v1/.well-known/jwks.json, needed for asymmetric tokens
+        :param audience: str | None, expected aud claim, not checked when None
+        :param issuer: str | None, expected iss claim, not checked when None
+        :param leeway: float seconds of clock skew tolerated on exp and nbf
+        :param jwks_ttl: float seconds the key set is kept before it is fetched again
+        :param max_entries: int, decoded tokens kept in the claims cache
+        :param headers: dict, sent with the JWKS request, e.g. the apikey
+        """
+        self.jwt_secret = jwt_secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.jwks_ttl = jwks_ttl
+        self.max_entries = max_entries
+        self.headers = headers or {}
+        self.claims_cache = MemoryCache(max_entries=max_entries)
+        self.__keys = {}
+        self.__keys_fetched_at = None
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TokenVerifier":
+        """
+        SUPABASE_JWT_SECRET, SUPABASE_JWT_AUDIENCE and SUPABASE_JWT_ISSUER, the JWKS url and the issuer default
+        to the auth endpoints of SUPABASE_URL. Verifiers built from the same settings are one shared instance, so
+        every SupabaseAuth of the process shares its claims cache and key set.
+        :return: TokenVerifier
+        """
+        url = (os.environ.get("SUPABASE_URL") or "").rstrip("/")
+        key = os.environ.get("SUPABASE_KEY")
+
+        verifier = cls(jwt_secret=os.environ.get("SUPABASE_JWT_SECRET") or None,
+                       jwks_url=f"{url}/auth/v1/.well-known/jwks.json" if url else None,
+                       audience=os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated") or None,
+                       issuer=os.environ.get("SUPABASE_JWT_ISSUER") or (f"{url}/auth/v1" if url else None),
+                       headers={"apikey": key} if key else None)
+
+        with _shared_lock:
+            return _shared.setdefault(verifier.key, verifier)
+
+    @property
+    def key(self) -> tuple:
+        return (self.jwt_secret, self.jwks_url, self.audience, self.issuer, self.leeway, self.jwks_ttl,
+                self.max_entries, tuple(sorted(self.headers.items())))
+
+    def verify(self, token: str) -> dict:
+        """
+        :param token: str
+        :return: dict, the claims of a valid token
+        :raise TokenError: the token is invalid or expired
+        :raise TokenUnverifiable: the token cannot be checked locally
+        """
+        claims = self.claims_cache.get(token)
+
+        if claims is not None:
+            return self.__check_expiry(claims)
+
+        header, claims, signing_input, signature = _decode(token)
+        algorithm = header.get("alg")
+
+        if algorithm in _ASYMMETRIC_ALGORITHMS:
+            key, fetch = self.__cached_key(header.get("kid"))
+
+            if key is None:
+                if fetch:
+                    self.__store_keys(self.__fetch_keys())
+
+                key = self.__stored_key(header.get("kid"))
+
+            valid = _verify_asymmetric(algorithm, key, signing_input, signature)
+        else:
+            valid = self.__verify_hmac(algorithm, signing_input, signature)
+
+        return self.__accept(token, claims, valid)
+
+    async def averify(self, token: str) -> dict:
+        """
+        verify() fetching the JWKS without blocking the event loop.
+        """
+        claims = self.claims_cache.get(token)
+
+        if claims is not None:
+            return self.__check_expiry(claims)
+
+        header, claims, signing_input, signature = _decode(token)
+        algorithm = header.get("alg")
+
+        if algorithm in _ASYMMETRIC_ALGORITHMS:
+            key, fetch = self.__cached_key(header.get("kid"))
+
+            if key is None:
+                if fetch:
+                    self.__store_keys(await self.__afetch_keys())
+
+                key = self.__stored_key(header.get("kid"))
+
+            valid = _verify_asymmetric(algorithm, key, signing_input, signature)
+        else:
+            valid = self.__verify_hmac(algorithm, signing_input, signature)
+
+        return self.__accept(token, claims, valid)
+
+    def invalidate(self, token: str = None):
+        """
+        Forget the cached claims of token, of every token when None, e.g. after a sign out.
+        :param token: str | None
+        :return: None
+        """
+        if token is None:
+            self.claims_cache.clear()
+        else:
+            self.claims_cache.delete(token)
+
+    def __verify_hmac(self, algorithm: str, signing_input: bytes, signature: bytes) -> bool:
+        if algorithm not in _HMAC_ALGORITHMS:
+            raise TokenError(f"Unsupported algorithm {algorithm}")
+
+        if not self.jwt_secret:
+            raise TokenUnverifiable("JWT secret is not configured")
+
+        expected = hmac.new(self.jwt_secret.encode(), signing_input, _HMAC_ALGORITHMS[algorithm]).digest()
+
+        return hmac.compare_digest(expected, signature)
+
+    def __accept(self, token: str, claims: dict, valid: bool) -> dict:
+        if not valid:
+            raise TokenError("Invalid token signature")
+
+        now = time.time()
+
+        if "exp" not in claims:
+            raise TokenError("Token has no expiry")
+
+        if not _numeric(claims["exp"]) or not _numeric(claims.get("nbf", 0)):
+            raise TokenError("Token expiry must be a number")
+
+        if claims.get("nbf") is not None and claims["nbf"] > now + self.leeway:
+            raise TokenError("Token is not valid yet")
+
+        if self.audience is not None:
+            audience = claims.get("aud")
+
+            if self.audience not in (audience if isinstance(audience, list) else [audience]):
+                raise TokenError("Invalid token audience")
+
+        if self.issuer is not None and claims.get("iss") != self.issuer:
+            raise TokenError("Invalid token issuer")
+
+        self.__check_expiry(claims)
+        self.claims_cache.set(token, claims, ttl=claims["exp"] + self.leeway - now, size=len(token))
+
+        return claims
+
+    def __check_expiry(self, claims: dict) -> dict:
+        if claims["exp"] + self.leeway <= time.time():
+            raise TokenError("Token has expired")
+
+        return claims
+
+    def __cached_key(self, kid: str) -> tuple:
+        """
+        :return: tuple[key | None, bool], the key of kid when the key set is fresh, and whether the key set may be
+        fetched again, at most every JWKS_MIN_REFRESH seconds so unknown kids cannot flood the auth server
+        """
+        with self.__lock:
+            age = time.monotonic() - self.__keys_fetched_at if self.__keys_fetched_at is not None else None
+
+            if age is not None and age < self.jwks_ttl and kid in self.__keys:
+                return self.__keys[kid], False
+
+            return None, age is None or age >= JWKS_MIN_REFRESH
+
+    def __stored_key(self, kid: str):
+        with self.__lock:
+            key = self.__keys.get(kid)
+
+        if key is None:
+            raise TokenUnverifiable(f"No signing key found for kid {kid}")
+
+        return key
+
+    def __store_keys(self, jwks: dict):
+        keys = {}
+
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kty") in ("RSA", "EC") and jwk.get("use", "sig") == "sig":
+                try:
+                    keys[jwk.get("kid")] = _public_key(jwk)
+                except TokenUnverifiable:
+                    # tokens signed with a key that cannot be loaded go to the auth server
+                    continue
+
+        with self.__lock:
+            self.__keys = keys
+            self.__keys_fetched_at = time.monotonic()
+
+    def __fetch_keys(self) -> dict:
+        if not self.jwks_url:
+            raise TokenUnverifiable("JWKS url is not configured")
+
+        import httpx
+
+        try:
+            response = httpx.get(self.jwks_url, headers=self.headers, timeout=10.0)
+            response.raise_for_status()
+
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise TokenUnverifiable(f"JWKS could not be fetched: {e}")
+
+    async def __afetch_keys(self) -> dict:
+        if not self.jwks_url:
+            raise TokenUnverifiable("JWKS url is not configured")
+
+        import httpx
+
+        try:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                response = await client.get(self.jwks_url, headers=self.headers)
+                response.raise_for_status()
+
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise TokenUnverifiable(f"JWKS could not be fetched: {e}")
@@ -0,0 +1,395 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from supabase_service.types import GenericResponse
+
+if TYPE_CHECKING:
+    import httpx
+
+MANIFEST_FILE_NAME = ".supabase-sync.json"
+
+# Supabase accepts resumable upload chunks of exactly 6MB, only the last one may be shorter
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+
+
+def file_md5(local_file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    :param local_file_path: str
+    :param chunk_size: int, bytes read at once
+    :return: str, hex md5 of the content, the value storage reports as eTag
+    """
+    digest = hashlib.md5()
+
+    with open(local_file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class LocalManifest:
+    """
+    size, mtime and md5 of the files under a directory. Hashes are persisted next to the files and only
+    recomputed when size or mtime change, so unchanged trees are diffed without reading them.
+    """
+
+    def __init__(self, local_dir: str, manifest_path: str = None):
+        """
+        :param local_dir: str
+        :param manifest_path: str, <local_dir>/.supabase-sync.json when None
+        """
+        self.local_dir = local_dir
+        self.manifest_path = manifest_path or os.path.join(local_dir, MANIFEST_FILE_NAME)
+        self.__lock = threading.Lock()
+        self.__entries = {}
+
+        if os.path.isfile(self.manifest_path):
+            try:
+                with open(self.manifest_path) as file:
+                    self.__entries = json.load(file)
+            except (OSError, ValueError):
+                self.__entries = {}
+
+    def files(self) -> dict:
+        """
+        :return: dict[str, dict], relative posix path -> {"size", "mtime"} of every file under local_dir
+        """
+        files = {}
+
+        for root, _, names in os.walk(self.local_dir):
+            for name in names:
+                local_file_path = os.path.join(root, name)
+
+                if os.path.abspath(local_file_path) == os.path.abspath(self.manifest_path):
+                    continue
+
+                stat = os.stat(local_file_path)
+                relative_path = os.path.relpath(local_file_path, self.local_dir).replace(os.sep, "/")
+                files[relative_path] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+        return files
+
+    def md5(self, relative_path: str) -> str:
+        """
+        :param relative_path: str
+        :return: str, from the manifest when size and mtime still match
+        """
+        local_file_path = os.path.join(self.local_dir, *relative_path.split("/"))
+        stat = os.stat(local_file_path)
+
+        with self.__lock:
+            entry = self.__entries.get(relative_path)
+
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["md5"]
+
+        md5 = file_md5(local_file_path)
+
+        with self.__lock:
+            self.__entries[relative_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "md5": md5}
+
+        return md5
+
+    def save(self):
+        """
+        Write the manifest, entries of files that no longer exist are dropped.
+        :return: None
+        """
+        files = self.files()
+
+        with self.__lock:
+            entries = {path: entry for path, entry in self.__entries.items() if path in files}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        temporary_path = self.manifest_path + ".tmp"
+
+        with open(temporary_path, "w") as file:
+            json.dump(entries, file)
+
+        os.replace(temporary_path, self.manifest_path)
+
+
+def remote_md5(entry: dict) -> str:
+    """
+    :param entry: dict, an item of bucket.list()
+    :return: str | None, the md5 of a single part upload, None when the eTag is not a plain md5
+    """
+    etag = ((entry.get("metadata") or {}).get("eTag") or "").strip('"')
+
+    return etag if len(etag) == 32 and "-" not in etag else None
+
+
+def remote_size(entry: dict) -> int:
+    return (entry.get("metadata") or {}).get("size")
+
+
+class TransferReport:
+    """
+    Thread-safe tally of a batch of transfers, rendered as a GenericResponse with throughput figures.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.transferred = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.retries = 0
+        self.failed = []
+        self.__started = time.perf_counter()
+        self.__lock = threading.Lock()
+
+    def success(self, size: int, retries: int = 0):
+        with self.__lock:
+            self.transferred += 1
+            self.bytes += size
+            self.retries += retries
+
+    def failure(self, path: str, error: str, retries: int = 0):
+        with self.__lock:
+            self.failed.append({"path": path, "error": error})
+            self.retries += retries
+
+    def skip(self, count: int = 1):
+        with self.__lock:
+            self.skipped += count
+
+    def response(self) -> GenericResponse:
+        seconds = time.perf_counter() - self.__started
+        data = {"transferred": self.transferred, "skipped": self.skipped, "failed": self.failed,
+                "bytes": self.bytes, "retries": self.retries, "seconds": round(seconds, 3),
+                "files_per_second": round(self.transferred / seconds, 2) if seconds else 0.0,
+                "mb_per_second": round(self.bytes / 1024 / 1024 / seconds, 2) if seconds else 0.0}
+
+        if not self.failed:
+            return GenericResponse(status=200, message=f"{self.operation} successful", data=data,
+                                   count=self.transferred)
+
+        return GenericResponse(status=207, message=f"{self.operation} failed for {len(self.failed)} files", data=data,
+                               count=self.transferred)
+
+
+def backoff(attempt: int, base: float = 0.5) -> float:
+    """
+    :param attempt: int, 0 for the first retry
+    :param base: float seconds
+    :return: float seconds to sleep, exponential with jitter
+    """
+    return base * 2 ** attempt * (0.5 + random.random())
+
+
+def stream_download(session: "httpx.Client", url: str, sink, offset: int = 0, chunk_size: int = 1024 * 1024,
+                    retries: int = 3, etag: str = None, on_etag=None) -> dict:
+    """
+    Copy an object into sink chunk by chunk, a dropped connection resumes with a Range request from the
+    last byte written. Resumes send the ETag of the bytes already written as If-Range, so an object replaced in
+    the meantime is downloaded again from the start instead of being spliced onto the old bytes.
+    :param session: httpx.Client, the storage session
+    :param url: str, object/<bucket>/<path>
+    :param sink: writable binary file-like object, positioned at offset
+    :param offset: int, bytes already in sink
+    :param chunk_size: int
+    :param retries: int, resumes allowed after a failure
+    :param etag: str | None, ETag of the object the offset bytes came from, they are discarded when None
+    :param on_etag: callable | None, called with the ETag of the object being written, e.g. to keep it next to a
+    partial file for a later resume
+    :return: dict, {"bytes": written in this call, "size": object size, "retries": int, "etag": str | None}
+    """
+    import httpx
+
+    if offset and not etag:
+        sink.seek(0)
+        sink.truncate()
+        offset = 0
+
+    written = 0
+    size = None
+
+    for attempt in range(retries + 1):
+        position = offset + written
+        headers = {"Range": f"bytes={position}-", "If-Range": etag} if position and etag else {}
+
+        try:
+            with session.stream("GET", url, headers=headers) as response:
+                if response.status_code == 416 and headers:
+                    total = response.headers.get("content-range", "").rsplit("/", 1)[-1]
+
+                    if total.isdigit() and int(total) == position:
+                        return {"bytes": written, "size": position, "retries": attempt, "etag": etag}
+
+                response.raise_for_status()
+                response_etag = response.headers.get("etag")
+
+                if response.status_code == 206 and response_etag == etag:
+                    size = int(response.headers.get("content-range", "/0").rsplit("/", 1)[-1] or 0) or None
+                elif response.status_code == 206:
+                    # partial content of another version of the object, start over
+                    sink.seek(0)
+                    sink.truncate()
+                    offset = written = 0
+                    etag = None
+                    raise httpx.RemoteProtocolError("Object changed during the download", request=response.request)
+                else:
+                    if position:
+                        # the object changed, or the server ignored the Range header, start over
+                        sink.seek(0)
+                        sink.truncate()
+                        offset = written = 0
+
+                    size = int(response.headers["content-length"]) if "content-length" in response.headers else None
+
+                if response_etag != etag or attempt == 0:
+                    etag = response_etag
+
+                    if on_etag is not None:
+                        on_etag(etag)
+
+                for chunk in response.iter_bytes(chunk_size):
+                    sink.write(chunk)
+                    written += len(chunk)
+
+            return {"bytes": written, "size": size or offset + written, "retries": attempt, "etag": etag}
+        except (httpx.TransportError, httpx.RemoteProtocolError):
+            if attempt == retries:
+                raise
+
+            time.sleep(backoff(attempt))
+
+
+class TusUpload:
+    """
+    Resumable upload through the storage TUS endpoint. The file is read one chunk at a time, so memory stays at
+    chunk_size whatever the file size. With a state_path the upload URL survives the process and a later run
+    continues from the offset the server confirmed.
+    """
+
+    def __init__(self, session: "httpx.Client", bucket_id: str, path: str, local_file_path: str,
+                 content_type: str = "application/octet-stream", upsert: bool = True,
+                 chunk_size: int = TUS_CHUNK_SIZE, state_path: str = None):
+        """
+        :param session: httpx.Client, the storage session
+        :param bucket_id: str
+        :param path: str, object path in the bucket
+        :param local_file_path: str
+        :param content_type: str
+        :param upsert: bool
+        :param chunk_size: int
+        :param state_path: str | None, file keeping the upload URL between runs
+        """
+        self.session = session
+        self.bucket_id = bucket_id
+        self.path = path
+        self.local_file_path = local_file_path
+        self.content_type = content_type
+        self.upsert = upsert
+        self.chunk_size = chunk_size
+        self.state_path = state_path
+        self.size = os.path.getsize(local_file_path)
+        self.retries = 0
+        self.url = self.__load_state()
+
+    def upload(self, retries: int = 3) -> dict:
+        """
+        :param retries: int, consecutive failures allowed before giving up
+        :return: dict, {"bytes": size, "retries": int, "url": upload url}
+        """
+        import httpx
+
+        failures = 0
+
+        while True:
+            try:
+                offset = self.__offset()
+
+                with open(self.local_file_path, "rb") as file:
+                    while offset < self.size or not self.size:
+                        file.seek(offset)
+                        offset = self.__send(offset, file.read(self.chunk_size))
+                        failures = 0
+
+                        if not self.size:
+                            break
+
+                self.__clear_state()
+
+                return {"bytes": self.size, "retries": self.retries, "url": self.url}
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500 and \
+                        e.response.status_code not in (409, 423, 429):
+                    raise
+
+                if failures == retries:
+                    raise
+
+                failures += 1
+                self.retries += 1
+                time.sleep(backoff(failures - 1))
+
+    def __offset(self) -> int:
+        if self.url:
+            response = self.session.head(self.url, headers={"Tus-Resumable": "1.0.0"})
+
+            if response.status_code in (404, 410):
+                self.url = None
+            else:
+                response.raise_for_status()
+                return int(response.headers.get("upload-offset", 0))
+
+        response = self.session.post("upload/resumable", headers={
+            "Tus-Resumable": "1.0.0",
+            "Upload-Length": str(self.size),
+            "Upload-Metadata": self.__metadata(),
+            "x-upsert": "true" if self.upsert else "false",
+        })
+        response.raise_for_status()
+        self.url = str(response.url.join(response.headers["location"]))
+        self.__save_state()
+
+        return 0
+
+    def __send(self, offset: int, chunk: bytes) -> int:
+        response = self.session.patch(self.url, content=chunk, headers={
+            "Tus-Resumable": "1.0.0",
+            "Upload-Offset": str(offset),
+            "Content-Type": "application/offset+octet-stream",
+        })
+        response.raise_for_status()
+
+        return int(response.headers.get("upload-offset", offset + len(chunk)))
+
+    def __metadata(self) -> str:
+        metadata = {"bucketName": self.bucket_id, "objectName": self.path, "contentType": self.content_type,
+                    "cacheControl": "3600"}
+
+        return ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items())
+
+    def __fingerprint(self) -> str:
+        stat = os.stat(self.local_file_path)
+
+        return f"{self.bucket_id}/{self.path}:{stat.st_size}:{stat.st_mtime}"
+
+    def __load_state(self):
+        if not self.state_path or not os.path.isfile(self.state_path):
+            return None
+
+        try:
+            with open(self.state_path) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        return state.get("url") if state.get("fingerprint") == self.__fingerprint() else None
+
+    def __save_state(self):
+        if self.state_path:
+            with open(self.state_path, "w") as file:
+                json.dump({"url": self.url, "fingerprint": self.__fingerprint()}, file)
+
+    def __clear_state(self):
+        if self.state_path and os.path.isfile(self.state_path):
+            os.remove(self.state_path)
@@ -0,0 +1,242 @@
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import httpx
+
+from supabase_service.limits import Limiter
+from supabase_service.resilience import ResiliencePolicy
+
+
+class CircuitOpenError(httpx.TransportError):
+    """
+    Raised instead of sending a request while the circuit breaker of its endpoint is open.
+    """
+
+
+class RateLimitedError(httpx.TransportError):
+    """
+    Raised instead of sending a request the Limiter rejected, at once in fail mode, after max_wait in queue mode.
+    """
+
+
+def _failed(response: httpx.Response) -> bool:
+    return response.status_code >= 500
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """
+    Transport applying a ResiliencePolicy and a Limiter around the pooled HTTP transport, each attempt takes its
+    own Limiter permit.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: ResiliencePolicy, limiter: Limiter = None):
+        self.transport = transport
+        self.policy = policy
+        self.limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = self.policy.breaker(request)
+        attempt = 0
+
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {request.url.host}{request.url.path}", request=request)
+
+            permit = None
+
+            if self.limiter is not None:
+                try:
+                    permit = self.limiter.acquire(request.url.path)
+                finally:
+                    # rejected or cancelled while queued, a half open breaker must not wait for this probe forever
+                    if permit is None and breaker is not None:
+                        breaker.abandon()
+
+                if permit is None:
+                    raise RateLimitedError(f"Rate limited: {request.url.host}{request.url.path}", request=request)
+
+            try:
+                response = self.__send(request)
+            except httpx.TransportError as e:
+                if permit is not None:
+                    permit.release(timeout=isinstance(e, httpx.TimeoutException))
+
+                if breaker is not None:
+                    breaker.failure()
+
+                delay = self.policy.retry_delay(request, attempt, error=e)
+
+                if delay is None:
+                    raise
+            except BaseException:
+                if permit is not None:
+                    permit.release()
+
+                if breaker is not None:
+                    breaker.abandon()
+
+                raise
+            else:
+                if permit is not None:
+                    permit.release(status=response.status_code)
+
+                if breaker is not None:
+                    breaker.failure() if _failed(response) else breaker.success()
+
+                delay = self.policy.retry_delay(request, attempt, response=response)
+
+                if delay is None:
+                    return response
+
+                response.close()
+
+            self.policy.retried_once()
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.transport.close()
+
+    def __send(self, request: httpx.Request) -> httpx.Response:
+        if not self.policy.hedges(request):
+            return self.transport.handle_request(request)
+
+        executor = self.policy.executor()
+        first = executor.submit(self.transport.handle_request, request)
+        done, _ = wait([first], timeout=self.policy.hedge_delay)
+
+        if done:
+            return first.result()
+
+        self.policy.hedged += 1
+        second = executor.submit(self.transport.handle_request, request)
+        done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+        # both may be done by now, a response beats an error whichever came first
+        winner = next((future for future in (first, second) if future in done and future.exception() is None), None)
+
+        if winner is None:
+            winner = pending.pop() if pending else first
+            wait([winner])
+
+        for future in (first, second):
+            if future is not winner:
+                future.add_done_callback(_close_result)
+
+        if winner is second:
+            self.policy.hedge_wins += 1
+
+        return winner.result()
+
+
+def _close_result(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    """
+    asyncio counterpart of ResilientTransport.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: ResiliencePolicy, limiter: Limiter = None):
+        self.transport = transport
+        self.policy = policy
+        self.limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = self.policy.breaker(request)
+        attempt = 0
+
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {request.url.host}{request.url.path}", request=request)
+
+            permit = None
+
+            if self.limiter is not None:
+                try:
+                    permit = await self.limiter.aacquire(request.url.path)
+                finally:
+                    # rejected or cancelled while queued, a half open breaker must not wait for this probe forever
+                    if permit is None and breaker is not None:
+                        breaker.abandon()
+
+                if permit is None:
+                    raise RateLimitedError(f"Rate limited: {request.url.host}{request.url.path}", request=request)
+
+            try:
+                response = await self.__send(request)
+            except httpx.TransportError as e:
+                if permit is not None:
+                    permit.release(timeout=isinstance(e, httpx.TimeoutException))
+
+                if breaker is not None:
+                    breaker.failure()
+
+                delay = self.policy.retry_delay(request, attempt, error=e)
+
+                if delay is None:
+                    raise
+            except BaseException:
+                if permit is not None:
+                    permit.release()
+
+                if breaker is not None:
+                    breaker.abandon()
+
+                raise
+            else:
+                if permit is not None:
+                    permit.release(status=response.status_code)
+
+                if breaker is not None:
+                    breaker.failure() if _failed(response) else breaker.success()
+
+                delay = self.policy.retry_delay(request, attempt, response=response)
+
+                if delay is None:
+                    return response
+
+                await response.aclose()
+
+            self.policy.retried_once()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    async def __send(self, request: httpx.Request) -> httpx.Response:
+        if not self.policy.hedges(request):
+            return await self.transport.handle_async_request(request)
+
+        first = asyncio.ensure_future(self.transport.handle_async_request(request))
+        done, _ = await asyncio.wait([first], timeout=self.policy.hedge_delay)
+
+        if done:
+            return first.result()
+
+        self.policy.hedged += 1
+        second = asyncio.ensure_future(self.transport.handle_async_request(request))
+        done, pending = await asyncio.wait([first, second], return_when=asyncio.FIRST_COMPLETED)
+        # both may be done by now, a response beats an error whichever came first
+        winner = next((task for task in (first, second) if task in done and task.exception() is None), None)
+
+        if winner is None:
+            winner = pending.pop() if pending else first
+            await asyncio.wait([winner])
+
+        for task in (first, second):
+            if task is not winner:
+                task.add_done_callback(_aclose_result)
+
+        if winner is second:
+            self.policy.hedge_wins += 1
+
+        return winner.result()
+
+
+def _aclose_result(task):
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().aclose())
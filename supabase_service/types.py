@@ -1,9 +1,14 @@
 class GenericResponse:
-    def __init__(self, status: int, message: str, data: object = None, count: int = None):
+    __slots__ = ("status", "message", "data", "count", "elapsed", "retries")
+
+    def __init__(self, status: int, message: str, data: object = None, count: int = None, elapsed: float = None,
+                 retries: int = None):
         self.status = status
         self.message = message
         self.data = data
         self.count = count
+        self.elapsed = elapsed
+        self.retries = retries
 
     def __str__(self):
         return f"{self.status} - {self.message} - {self.data} - {self.count}"
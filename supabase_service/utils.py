@@ -1,2 +1,138 @@
+import asyncio
+import json
+from typing import Awaitable, Iterable, Iterator
+
+import httpx
+
+from supabase_service.types import GenericResponse
+
+
 def join_strings(strings: list, delimiter: str = ", ") -> str:
     return delimiter.join(strings)
+
+
+def storage_error_status(error: Exception) -> int:
+    """
+    The storage API reports conflicts and missing resources with HTTP 400 and the real status in the body.
+    :param error: Exception, usually a storage3 StorageException
+    :return: int, 409 for duplicates, 404 for missing resources, the HTTP status otherwise, 500 when unknown
+    """
+    body = error.args[0] if error.args and isinstance(error.args[0], dict) else {}
+    text = f"{body.get('error', '')} {body.get('message', '')} {error}".lower()
+
+    if str(body.get("statusCode", "")) == "409" or "duplicate" in text or "already exists" in text:
+        return 409
+
+    if str(body.get("statusCode", "")) == "404" or "not found" in text:
+        return 404
+
+    try:
+        return int(body.get("statusCode", 500))
+    except (TypeError, ValueError):
+        return 500
+
+
+# SQLSTATE classes of connection loss, transaction rollbacks (serialization failures, deadlocks), exhausted
+# resources, operator intervention (shutdown) and system errors, with the PostgREST codes of an unreachable database
+_RETRYABLE_SQLSTATES = ("08", "40", "53", "57", "58")
+_RETRYABLE_POSTGREST_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+
+def database_error_status(error: Exception) -> int:
+    """
+    Tell the database errors worth retrying later from the requests the database rejects.
+    :param error: Exception, usually a postgrest APIError, a psycopg error or a transport error
+    :return: int, 503 for lost connections, an unavailable or overloaded database and rolled back transactions,
+    the HTTP status of an error response without JSON body, 400 for the other database errors, 500 when unknown
+    """
+    if isinstance(error, (OSError, httpx.TransportError)):
+        return 503
+
+    code = getattr(error, "sqlstate", None) or getattr(error, "code", None)
+
+    if isinstance(code, int):
+        return code
+
+    if code is None:
+        # a psycopg OperationalError without SQLSTATE never reached the server, e.g. a refused connection
+        return 503 if type(error).__name__ in ("OperationalError", "PoolTimeout") else 500
+
+    code = str(code)
+
+    if code[:2] in _RETRYABLE_SQLSTATES or code in _RETRYABLE_POSTGREST_CODES:
+        return 503
+
+    return 400
+
+
+def batch_rows(rows: Iterable[dict], max_rows: int = 1000, max_bytes: int = 1024 * 1024) -> Iterator[list]:
+    """
+    Split rows into lists of at most max_rows rows whose JSON encoding stays under max_bytes.
+    A single row larger than max_bytes is sent alone.
+    :param rows: Iterable[dict], consumed lazily
+    :param max_rows: int
+    :param max_bytes: int
+    :return: Iterator[list]
+    """
+    batch = []
+    batch_bytes = 2
+
+    for row in rows:
+        row_bytes = len(json.dumps(row, default=str).encode()) + 1
+
+        if batch and (len(batch) >= max_rows or batch_bytes + row_bytes > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 2
+
+        batch.append(row)
+        batch_bytes += row_bytes
+
+    if batch:
+        yield batch
+
+
+def aggregate_batches(results: list, operation: str) -> GenericResponse:
+    """
+    Fold per-batch results ({"batch", "rows", "status", "data", "error"}) into one response:
+    201 when every batch succeeded, 207 when some failed, 500 when all failed.
+    :param results: list[dict]
+    :param operation: str
+    :return: GenericResponse, count is the number of rows written
+    """
+    if not results:
+        return GenericResponse(status=400, message="Values are required")
+
+    operation = operation.capitalize()
+    results.sort(key=lambda result: result["batch"])
+    failed = [result for result in results if result["error"]]
+    written = sum(result["rows"] for result in results if not result["error"])
+
+    if not failed:
+        return GenericResponse(status=201, message=f"{operation} successful", data=results, count=written)
+
+    if len(failed) == len(results):
+        return GenericResponse(status=500, message=f"{operation} failed for every batch", data=results, count=0)
+
+    return GenericResponse(status=207, message=f"{operation} failed for {len(failed)} of {len(results)} batches",
+                           data=results, count=written)
+
+
+async def gather_limited(aws: Iterable[Awaitable], limit: int = 100, return_exceptions: bool = False) -> list:
+    """
+    Like asyncio.gather, but never more than limit awaitables are running at the same time.
+    :param aws: Iterable[Awaitable]
+    :param limit: int
+    :param return_exceptions: bool
+    :return: list of results in the order of aws
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=return_exceptions)
@@ -0,0 +1,609 @@
+import asyncio
+import atexit
+import json
+import logging
+import threading
+import time
+
+from supabase_service.metrics import Histogram
+from supabase_service.types import GenericResponse
+
+logger = logging.getLogger(__name__)
+
+
+def _validate(table_name: str, set: dict, where: dict) -> GenericResponse:
+    if not table_name or not table_name.strip():
+        return GenericResponse(status=400, message="Table name is required")
+
+    if not set:
+        return GenericResponse(status=400, message="Set is required")
+
+    if not where:
+        return GenericResponse(status=400, message="Where is required")
+
+    if not isinstance(where, dict):
+        return GenericResponse(status=400, message="Where must be a dict of equality filters")
+
+    return None
+
+
+class _WriteQueue:
+    """
+    Pending updates keyed by (table, where), the sets of one key merged so only the last value of each column is
+    written. Not thread-safe, the buffers guard it.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.bytes = 0
+        self.in_flight_bytes = 0
+        self.queued = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.requeued = 0
+        self.blocked = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.latency = Histogram()
+        self.last_error = None
+
+    def add(self, table_name: str, set: dict, where: dict):
+        key = (table_name, json.dumps(where, sort_keys=True, default=str))
+        entry = self.entries.get(key)
+        self.queued += 1
+
+        if entry is None:
+            entry = self.entries[key] = {"key": key, "table": table_name, "where": dict(where), "set": {},
+                                         "bytes": 0, "attempts": 0}
+        else:
+            self.coalesced += 1
+
+        entry["set"].update(set)
+        self.__measure(entry)
+
+    def requeue(self, entries: list):
+        """
+        Queue again the entries a flush did not write, under the sets queued for the same (table, where) since.
+        """
+        for entry in entries:
+            newer = self.entries.pop(entry["key"], None)
+
+            if newer is not None:
+                entry["set"].update(newer["set"])
+                # the newer values may be the ones the database accepts
+                entry["attempts"] = 0
+                self.bytes -= newer["bytes"]
+
+            self.entries[entry["key"]] = entry
+            entry["bytes"] = 0
+            self.__measure(entry)
+
+    def take(self) -> list:
+        """
+        :return: list[dict], the pending entries, counted as in flight until done() is called
+        """
+        entries = list(self.entries.values())
+        self.entries = {}
+        self.in_flight_bytes, self.bytes = self.bytes, 0
+
+        return entries
+
+    def done(self, results: list, seconds: float, backoff: float = 0.0):
+        """
+        :param results: list[dict], see _result
+        :param seconds: float
+        :param backoff: float seconds before the next timed flush, 0 once the database is reachable again
+        """
+        self.in_flight_bytes = 0
+        self.flushes += 1
+        self.flushed_rows += sum(r["rows"] - r["failed"] - r["requeued"] for r in results)
+        self.failed_rows += sum(r["failed"] for r in results)
+        self.requeued += sum(r["requeued"] for r in results)
+        self.latency.observe(seconds)
+        self.last_error = next((r["error"] for r in results if r["error"]), self.last_error)
+
+        if backoff:
+            self.failures += 1
+            self.retry_at = time.monotonic() + backoff
+        else:
+            self.failures = 0
+            self.retry_at = 0.0
+
+    def pending(self) -> list:
+        """
+        :return: list[dict], {"table", "where", "set"} of every pending update
+        """
+        return [{"table": entry["table"], "where": entry["where"], "set": entry["set"]}
+                for entry in self.entries.values()]
+
+    @property
+    def backing_off(self) -> bool:
+        return time.monotonic() < self.retry_at
+
+    @property
+    def full_bytes(self) -> int:
+        return self.bytes + self.in_flight_bytes
+
+    def stats(self) -> dict:
+        return {"queue_depth": len(self.entries), "queued_bytes": self.bytes, "in_flight_bytes": self.in_flight_bytes,
+                "queued": self.queued, "coalesced": self.coalesced, "flushes": self.flushes,
+                "flushed_rows": self.flushed_rows, "failed_rows": self.failed_rows, "requeued": self.requeued,
+                "blocked": self.blocked, "retry_in": max(0.0, self.retry_at - time.monotonic()),
+                "flush_p50": self.latency.percentile(0.5), "flush_p99": self.latency.percentile(0.99),
+                "flush_max": self.latency.max, "last_error": self.last_error}
+
+    def __measure(self, entry: dict):
+        self.bytes -= entry["bytes"]
+        entry["bytes"] = len(json.dumps(entry["set"], default=str)) + len(entry["key"][1])
+        self.bytes += entry["bytes"]
+
+
+def _jobs(entries: list) -> list:
+    """
+    :return: list[tuple], (table, on_conflict, entries) sent as one upsert, or with update() when on_conflict is None
+    """
+    groups = {}
+    jobs = []
+
+    for entry in entries:
+        where, set = entry["where"], entry["set"]
+
+        # a set that changes its own where columns is not an upsert on those columns, and an entry the database
+        # rejected before would fail the batch of the others again
+        if where.keys() & set.keys() or entry["attempts"]:
+            jobs.append((entry["table"], None, [entry]))
+            continue
+
+        key = (entry["table"], tuple(sorted(where)), tuple(sorted(set)))
+        groups.setdefault(key, []).append(entry)
+
+    return [(table_name, ",".join(where_columns), group)
+            for (table_name, where_columns, _), group in groups.items()] + jobs
+
+
+def _unavailable(response: GenericResponse) -> bool:
+    """
+    :return: bool, whether a failed write is worth sending again later as is (connection lost, database down or
+    overloaded) rather than rejected for its rows
+    """
+    if isinstance(response.data, list):
+        return any(batch["status"] >= 500 for batch in response.data if batch["error"])
+
+    return response.status >= 500
+
+
+def _result(table_name: str, rows: int) -> dict:
+    return {"table": table_name, "rows": rows, "failed": 0, "requeued": 0, "error": None}
+
+
+def _give_back(entry: dict, result: dict, retry: list, unavailable: bool, max_attempts: int):
+    """
+    Queue a failed entry again, or drop it once the database rejected it max_attempts times.
+    """
+    if not unavailable:
+        entry["attempts"] += 1
+
+    if unavailable or max_attempts is None or entry["attempts"] < max_attempts:
+        result["requeued"] += 1
+        retry.append(entry)
+    else:
+        result["failed"] += 1
+
+
+def _flush_response(results: list, seconds: float) -> GenericResponse:
+    rows = sum(result["rows"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    requeued = sum(result["requeued"] for result in results)
+    unwritten = failed + requeued
+
+    if not unwritten:
+        return GenericResponse(status=200, message="Flush successful", data=results, count=rows,
+                               elapsed=seconds)
+
+    if unwritten < rows:
+        status = 207
+    else:
+        status = 503 if requeued else 500
+
+    return GenericResponse(status=status, message=f"Flush failed for {unwritten} of {rows} rows, {requeued} queued "
+                           "again", data=results, count=rows - unwritten, elapsed=seconds)
+
+
+def _close_response(flushed: GenericResponse, pending: list) -> GenericResponse:
+    if not pending:
+        return flushed
+
+    logger.warning("Write-behind buffer closed with %d updates still pending: %s", len(pending), flushed.message)
+
+    return GenericResponse(status=503, message=f"Closed with {len(pending)} updates still pending", data=pending,
+                           count=len(pending))
+
+
+class WriteBehindBuffer:
+    """
+    Write-behind mode of SupabaseDatabase.update: updates are queued, the sets of one (table, where) merged, and
+    a background thread sends them as batched upserts on where's columns every interval seconds, as soon as
+    max_rows rows are pending, or on flush(). close(), also run at exit, flushes what is left.
+    Flushed rows that do not exist yet are inserted, so where must be a unique key, e.g. {"id": ...}. A batch
+    the upsert rejects, e.g. a NOT NULL column missing from set, is retried row by row with update(), the rows
+    still rejected are queued again until they failed max_attempts times. When the database is unreachable or
+    overloaded (5xx, connection errors) the updates are queued again as they are and the timed flushes back off.
+    Selects do not see the pending updates.
+    """
+
+    def __init__(self, database, interval: float = 1.0, max_rows: int = 1000, max_bytes: int = 8 * 1024 * 1024,
+                 batch_size: int = 1000, block_timeout: float = 30.0, max_attempts: int = 3,
+                 max_backoff: float = 30.0):
+        """
+        :param database: SupabaseDatabase
+        :param interval: float seconds between two flushes
+        :param max_rows: int, pending rows that trigger a flush without waiting for the interval
+        :param max_bytes: int, JSON bytes of the pending and in flight rows above which update() blocks
+        :param batch_size: int, max rows per upsert request
+        :param block_timeout: float seconds update() waits for room before failing with 503
+        :param max_attempts: int | None, flushes the database may reject a row in before it is dropped, None to
+        keep it queued
+        :param max_backoff: float, max seconds between two timed flushes while the database is unavailable
+        """
+        self.database = database
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.block_timeout = block_timeout
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.__queue = _WriteQueue()
+        self.__condition = threading.Condition()
+        self.__flush_lock = threading.Lock()
+        self.__thread = None
+        self.__closed = False
+        atexit.register(self.close)
+
+    def update(self, table_name: str, set: dict, where: dict) -> GenericResponse:
+        """
+        Queue an update, blocking while the buffer holds more than max_bytes.
+        :param table_name: str
+        :param set: dict
+        :param where: dict, equality filters on a unique key
+        :return: GenericResponse, 202 once queued, 503 when closed or still full after block_timeout
+        """
+        invalid = _validate(table_name, set, where)
+
+        if invalid is not None:
+            return invalid
+
+        with self.__condition:
+            if self.__queue.full_bytes >= self.max_bytes:
+                self.__queue.blocked += 1
+                self.__condition.notify_all()
+
+                if not self.__condition.wait_for(lambda: self.__closed or self.__queue.full_bytes < self.max_bytes,
+                                                 timeout=self.block_timeout):
+                    return GenericResponse(status=503, message="Write-behind buffer is full")
+
+            if self.__closed:
+                return GenericResponse(status=503, message="Write-behind buffer is closed")
+
+            self.__queue.add(table_name, set, where)
+
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="supabase-write-behind", daemon=True)
+                self.__thread.start()
+
+            if len(self.__queue.entries) >= self.max_rows or self.__queue.full_bytes >= self.max_bytes:
+                self.__condition.notify_all()
+
+        return GenericResponse(status=202, message="Update queued")
+
+    def flush(self) -> GenericResponse:
+        """
+        Send every pending update now, even while backing off.
+        :return: GenericResponse, data holds one result per upsert group, count the rows written
+        """
+        with self.__flush_lock:
+            with self.__condition:
+                entries = self.__queue.take()
+
+            started = time.perf_counter()
+            results, retry, unavailable = self.__send(entries)
+            seconds = time.perf_counter() - started
+
+            with self.__condition:
+                self.__queue.requeue(retry)
+                self.__queue.done(results, seconds, self.__backoff() if unavailable else 0.0)
+                self.__condition.notify_all()
+
+        return _flush_response(results, seconds)
+
+    def stats(self) -> dict:
+        """
+        :return: dict, queue_depth (pending rows, the ones queued again included), queued_bytes, in_flight_bytes,
+        queued, coalesced, flushes, flushed_rows, failed_rows (dropped), requeued, blocked, retry_in (seconds left
+        of the backoff), flush_p50/p99/max seconds and last_error
+        """
+        with self.__condition:
+            return self.__queue.stats()
+
+    def close(self) -> GenericResponse:
+        """
+        Stop the flushing thread and flush what is left, later updates get 503. The updates that could not be
+        written stay queued for another flush().
+        :return: GenericResponse, the last flush, or 503 with the pending updates in data
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+            thread = self.__thread
+
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+        flushed = self.flush()
+        atexit.unregister(self.close)
+
+        with self.__condition:
+            return _close_response(flushed, self.__queue.pending())
+
+    def __backoff(self) -> float:
+        return min(self.max_backoff, self.interval * 2 ** (self.__queue.failures + 1))
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__closed or not self.__queue.backing_off and (
+                    len(self.__queue.entries) >= self.max_rows or self.__queue.full_bytes >= self.max_bytes),
+                    timeout=max(self.interval, self.__queue.retry_at - time.monotonic()))
+
+                if self.__closed:
+                    return
+
+                pending = bool(self.__queue.entries) and not self.__queue.backing_off
+
+            if pending:
+                self.flush()
+
+    def __send(self, entries: list) -> tuple:
+        """
+        :return: tuple, (results, entries to queue again, whether the database was unavailable)
+        """
+        results = []
+        retry = []
+        unavailable = False
+
+        for table_name, on_conflict, group in _jobs(entries):
+            result = _result(table_name, len(group))
+            results.append(result)
+
+            if on_conflict is not None and not unavailable:
+                rows = [{**entry["set"], **entry["where"]} for entry in group]
+                response = self.database.upsert_many(table_name, rows, on_conflict=on_conflict,
+                                                     batch_size=self.batch_size)
+
+                if response.status == 201:
+                    continue
+
+                unavailable = _unavailable(response)
+                result["error"] = response.message
+
+            # rows of the batches that went through are written again with the same values
+            for entry in group:
+                if not unavailable:
+                    response = self.database.update(table_name, entry["set"], entry["where"])
+
+                    if response.status < 300:
+                        continue
+
+                    unavailable = _unavailable(response)
+                    result["error"] = response.message
+
+                _give_back(entry, result, retry, unavailable, self.max_attempts)
+
+            if not result["failed"] and not result["requeued"]:
+                result["error"] = None
+
+        return results, retry, unavailable
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AsyncWriteBehindBuffer:
+    """
+    asyncio counterpart of WriteBehindBuffer, flushed by a task of the loop of the first update. Nothing is
+    flushed at exit, await aclose() (or use async with) before the loop stops.
+    """
+
+    def __init__(self, database, interval: float = 1.0, max_rows: int = 1000, max_bytes: int = 8 * 1024 * 1024,
+                 batch_size: int = 1000, block_timeout: float = 30.0, max_attempts: int = 3,
+                 max_backoff: float = 30.0):
+        """
+        :param database: AsyncSupabaseDatabase
+        :param interval: float seconds between two flushes
+        :param max_rows: int, pending rows that trigger a flush without waiting for the interval
+        :param max_bytes: int, JSON bytes of the pending and in flight rows above which update() waits
+        :param batch_size: int, max rows per upsert request
+        :param block_timeout: float seconds update() waits for room before failing with 503
+        :param max_attempts: int | None, see WriteBehindBuffer
+        :param max_backoff: float, see WriteBehindBuffer
+        """
+        self.database = database
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.block_timeout = block_timeout
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.__queue = _WriteQueue()
+        self.__condition = None
+        self.__flush_lock = None
+        self.__task = None
+        self.__closed = False
+
+    async def update(self, table_name: str, set: dict, where: dict) -> GenericResponse:
+        """
+        Queue an update, waiting while the buffer holds more than max_bytes.
+        :param table_name: str
+        :param set: dict
+        :param where: dict, equality filters on a unique key
+        :return: GenericResponse, 202 once queued, 503 when closed or still full after block_timeout
+        """
+        invalid = _validate(table_name, set, where)
+
+        if invalid is not None:
+            return invalid
+
+        condition = self.__get_condition()
+
+        async with condition:
+            if self.__queue.full_bytes >= self.max_bytes:
+                self.__queue.blocked += 1
+                condition.notify_all()
+
+                try:
+                    await asyncio.wait_for(condition.wait_for(
+                        lambda: self.__closed or self.__queue.full_bytes < self.max_bytes), self.block_timeout)
+                except asyncio.TimeoutError:
+                    return GenericResponse(status=503, message="Write-behind buffer is full")
+
+            if self.__closed:
+                return GenericResponse(status=503, message="Write-behind buffer is closed")
+
+            self.__queue.add(table_name, set, where)
+
+            if self.__task is None:
+                self.__task = asyncio.ensure_future(self.__run())
+
+            if len(self.__queue.entries) >= self.max_rows or self.__queue.full_bytes >= self.max_bytes:
+                condition.notify_all()
+
+        return GenericResponse(status=202, message="Update queued")
+
+    async def flush(self) -> GenericResponse:
+        """
+        Send every pending update now, even while backing off.
+        :return: GenericResponse, data holds one result per upsert group, count the rows written
+        """
+        condition = self.__get_condition()
+
+        async with self.__flush_lock:
+            entries = self.__queue.take()
+            started = time.perf_counter()
+            results, retry, unavailable = await self.__send(entries)
+            seconds = time.perf_counter() - started
+
+            self.__queue.requeue(retry)
+            self.__queue.done(results, seconds, self.__backoff() if unavailable else 0.0)
+
+            async with condition:
+                condition.notify_all()
+
+        return _flush_response(results, seconds)
+
+    def stats(self) -> dict:
+        """
+        :return: dict, see WriteBehindBuffer.stats
+        """
+        return self.__queue.stats()
+
+    async def aclose(self) -> GenericResponse:
+        """
+        Stop the flushing task and flush what is left, later updates get 503. The updates that could not be
+        written stay queued for another flush().
+        :return: GenericResponse, see WriteBehindBuffer.close
+        """
+        condition = self.__get_condition()
+
+        async with condition:
+            self.__closed = True
+            condition.notify_all()
+
+        if self.__task is not None:
+            await self.__task
+
+        return _close_response(await self.flush(), self.__queue.pending())
+
+    def __backoff(self) -> float:
+        return min(self.max_backoff, self.interval * 2 ** (self.__queue.failures + 1))
+
+    def __get_condition(self) -> asyncio.Condition:
+        # built on first use so the buffer can be created outside the event loop
+        if self.__condition is None:
+            self.__condition = asyncio.Condition()
+            self.__flush_lock = asyncio.Lock()
+
+        return self.__condition
+
+    async def __run(self):
+        condition = self.__get_condition()
+
+        while True:
+            async with condition:
+                try:
+                    await asyncio.wait_for(condition.wait_for(
+                        lambda: self.__closed or not self.__queue.backing_off and (
+                            len(self.__queue.entries) >= self.max_rows or self.__queue.full_bytes >= self.max_bytes)),
+                        max(self.interval, self.__queue.retry_at - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+
+                if self.__closed:
+                    return
+
+                pending = bool(self.__queue.entries) and not self.__queue.backing_off
+
+            if pending:
+                await self.flush()
+
+    async def __send(self, entries: list) -> tuple:
+        """
+        :return: tuple, see WriteBehindBuffer.__send
+        """
+        results = []
+        retry = []
+        unavailable = False
+
+        for table_name, on_conflict, group in _jobs(entries):
+            result = _result(table_name, len(group))
+            results.append(result)
+
+            if on_conflict is not None and not unavailable:
+                rows = [{**entry["set"], **entry["where"]} for entry in group]
+                response = await self.database.upsert_many(table_name, rows, on_conflict=on_conflict,
+                                                           batch_size=self.batch_size)
+
+                if response.status == 201:
+                    continue
+
+                unavailable = _unavailable(response)
+                result["error"] = response.message
+
+            # rows of the batches that went through are written again with the same values
+            for entry in group:
+                if not unavailable:
+                    response = await self.database.update(table_name, entry["set"], entry["where"])
+
+                    if response.status < 300:
+                        continue
+
+                    unavailable = _unavailable(response)
+                    result["error"] = response.message
+
+                _give_back(entry, result, retry, unavailable, self.max_attempts)
+
+            if not result["failed"] and not result["requeued"]:
+                result["error"] = None
+
+        return results, retry, unavailable
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()